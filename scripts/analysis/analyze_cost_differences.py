@@ -3,11 +3,25 @@
 Script para identificar las diferencias específicas en costos entre el resumen y los datos procesados.
 """
 
-import pandas as pd
+import argparse
+import sys
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import STANDARDIZED_DATASET, read_dataset, read_summary_file
+from utils.profiling import add_profile_argument, profiled
+from utils.reconciliation import DIFFERENT, ONLY_DETAIL, ONLY_SUMMARY, reconcile, status_counts
+from utils.schema import from_cents, to_cents
+
+# Columnas que usa este análisis
+COLUMNS = ['paciente', 'n_expediente_hosp', 'ian_expediente_hosp', 'monto_nivel_6']
+SUMMARY_COLUMNS = ['paciente', 'n_expediente_hosp', 'ian_expediente_hosp', 'gasto_nivel_6']
+
+@profiled
 def analyze_cost_differences():
     """Analiza las diferencias específicas en costos entre archivos."""
     
@@ -18,8 +32,8 @@ def analyze_cost_differences():
     print("Leyendo archivos...")
     
     # Leer archivos
-    df_summary = pd.read_csv('data/raw/Resumen Pacientes 2024-2025.csv', low_memory=False)
-    df_processed = pd.read_csv('data/processed/resultados_pacientes_estandarizados.csv', low_memory=False)
+    df_summary = read_summary_file('data/raw/Resumen Pacientes 2024-2025.csv', columns=SUMMARY_COLUMNS, low_memory=False)
+    df_processed = read_dataset(STANDARDIZED_DATASET, columns=COLUMNS)
     
     print(f"Resumen: {len(df_summary):,} registros")
     print(f"Procesados: {len(df_processed):,} registros")
@@ -36,9 +50,12 @@ def analyze_cost_differences():
         f.write("1. TOTALES GENERALES\n")
         f.write("-" * 50 + "\n")
         
-        summary_total = df_summary['gasto_nivel_6'].sum()
-        processed_total = df_processed['monto_nivel_6'].sum()
-        difference = summary_total - processed_total
+        # Sumas exactas en centavos enteros
+        summary_cents = to_cents(df_summary['gasto_nivel_6']).sum()
+        processed_cents = to_cents(df_processed['monto_nivel_6']).sum()
+        summary_total = from_cents(summary_cents)
+        processed_total = from_cents(processed_cents)
+        difference = from_cents(summary_cents - processed_cents)
         
         f.write(f"Total gasto nivel 6 (Resumen): ${summary_total:,.2f}\n")
         f.write(f"Total monto nivel 6 (Procesados): ${processed_total:,.2f}\n")
@@ -48,37 +65,26 @@ def analyze_cost_differences():
         f.write("2. ANÁLISIS POR PACIENTE\n")
         f.write("-" * 50 + "\n")
         
-        # Agrupar por paciente en ambos datasets
-        summary_by_patient = df_summary.groupby('paciente')['gasto_nivel_6'].sum().reset_index()
-        processed_by_patient = df_processed.groupby('paciente')['monto_nivel_6'].sum().reset_index()
-        
-        # Renombrar columnas para el merge
-        summary_by_patient.columns = ['paciente', 'gasto_resumen']
-        processed_by_patient.columns = ['paciente', 'gasto_procesado']
-        
-        # Hacer merge
-        comparison = summary_by_patient.merge(processed_by_patient, on='paciente', how='outer')
-        
-        # Identificar diferencias
-        comparison['diferencia'] = comparison['gasto_resumen'] - comparison['gasto_procesado']
-        comparison['diferencia_abs'] = abs(comparison['diferencia'])
-        
-        # Pacientes con diferencias
-        patients_with_diff = comparison[comparison['diferencia_abs'] > 0.01]  # Tolerancia de 1 centavo
+        # Conciliación por paciente de ambos datasets (tolerancia de 1 centavo)
+        comparison = reconcile(df_summary, 'gasto_nivel_6', df_processed, 'monto_nivel_6')
+        patients_with_diff = comparison[comparison['estado'] == DIFFERENT]
         
         f.write(f"Pacientes con diferencias: {len(patients_with_diff):,}\n")
         f.write(f"Pacientes sin diferencias: {len(comparison) - len(patients_with_diff):,}\n\n")
         
+        f.write("Pacientes por estado de conciliación:\n")
+        for status, count in status_counts(comparison).items():
+            f.write(f"  - {status}: {count:,}\n")
+        f.write("\n")
+        
         if len(patients_with_diff) > 0:
             f.write("Top 10 pacientes con mayores diferencias:\n")
             top_differences = patients_with_diff.nlargest(10, 'diferencia_abs')
             
-            for _, row in top_differences.iterrows():
-                patient = row['paciente']
-                gasto_resumen = row['gasto_resumen']
-                gasto_procesado = row['gasto_procesado']
-                diff = row['diferencia']
-                
+            for patient, gasto_resumen, gasto_procesado, diff in zip(
+                top_differences['paciente'], top_differences['gasto_resumen'],
+                top_differences['gasto_procesado'], top_differences['diferencia']
+            ):
                 f.write(f"  Paciente {patient}:\n")
                 f.write(f"    - Resumen: ${gasto_resumen:,.2f}\n")
                 f.write(f"    - Procesado: ${gasto_procesado:,.2f}\n")
@@ -89,23 +95,23 @@ def analyze_cost_differences():
         f.write("-" * 50 + "\n")
         
         # Pacientes solo en resumen
-        only_in_summary = comparison[comparison['gasto_procesado'].isna()]
+        only_in_summary = comparison[comparison['estado'] == ONLY_SUMMARY]
         f.write(f"Pacientes solo en resumen: {len(only_in_summary):,}\n")
         if len(only_in_summary) > 0:
             f.write(f"Total gasto de pacientes solo en resumen: ${only_in_summary['gasto_resumen'].sum():,.2f}\n")
             f.write("Ejemplos:\n")
-            for _, row in only_in_summary.head(5).iterrows():
-                f.write(f"  - Paciente {row['paciente']}: ${row['gasto_resumen']:,.2f}\n")
+            for patient, amount in zip(only_in_summary['paciente'].head(5), only_in_summary['gasto_resumen'].head(5)):
+                f.write(f"  - Paciente {patient}: ${amount:,.2f}\n")
             f.write("\n")
         
         # Pacientes solo en procesados
-        only_in_processed = comparison[comparison['gasto_resumen'].isna()]
+        only_in_processed = comparison[comparison['estado'] == ONLY_DETAIL]
         f.write(f"Pacientes solo en procesados: {len(only_in_processed):,}\n")
         if len(only_in_processed) > 0:
             f.write(f"Total gasto de pacientes solo en procesados: ${only_in_processed['gasto_procesado'].sum():,.2f}\n")
             f.write("Ejemplos:\n")
-            for _, row in only_in_processed.head(5).iterrows():
-                f.write(f"  - Paciente {row['paciente']}: ${row['gasto_procesado']:,.2f}\n")
+            for patient, amount in zip(only_in_processed['paciente'].head(5), only_in_processed['gasto_procesado'].head(5)):
+                f.write(f"  - Paciente {patient}: ${amount:,.2f}\n")
             f.write("\n")
         
         # 4. Análisis de diferencias por magnitud
@@ -124,46 +130,55 @@ def analyze_cost_differences():
             
             if len(large_diff) > 0:
                 f.write("Pacientes con diferencias grandes (>$1000):\n")
-                for _, row in large_diff.iterrows():
-                    f.write(f"  - Paciente {row['paciente']}: ${row['diferencia']:,.2f}\n")
+                for patient, diff in zip(large_diff['paciente'], large_diff['diferencia']):
+                    f.write(f"  - Paciente {patient}: ${diff:,.2f}\n")
                 f.write("\n")
         
         # 5. Verificación de suma de diferencias
         f.write("5. VERIFICACIÓN DE SUMA DE DIFERENCIAS\n")
         f.write("-" * 50 + "\n")
         
-        if len(patients_with_diff) > 0:
-            total_diff_sum = patients_with_diff['diferencia'].sum()
-            f.write(f"Suma de todas las diferencias: ${total_diff_sum:,.2f}\n")
+        if len(comparison) > 0:
+            # Diferencia de cada paciente de la conciliación, en todos los estados (un lado ausente cuenta como 0)
+            total_diff_cents = (to_cents(comparison['gasto_resumen'].fillna(0))
+                                - to_cents(comparison['gasto_procesado'].fillna(0))).sum()
+            # Los registros sin paciente no entran en la conciliación
+            unassigned_cents = (to_cents(df_summary.loc[df_summary['paciente'].isna(), 'gasto_nivel_6']).sum()
+                                - to_cents(df_processed.loc[df_processed['paciente'].isna(), 'monto_nivel_6']).sum())
+            f.write(f"Suma de las diferencias de todos los pacientes: ${from_cents(total_diff_cents):,.2f}\n")
+            if unassigned_cents != 0:
+                f.write(f"Diferencia de registros sin paciente: ${from_cents(unassigned_cents):,.2f}\n")
             f.write(f"Diferencia total esperada: ${difference:,.2f}\n")
-            f.write(f"¿Coinciden? {'Sí' if abs(total_diff_sum - difference) < 0.01 else 'No'}\n\n")
+            f.write(f"¿Coinciden? {'Sí' if total_diff_cents + unassigned_cents == summary_cents - processed_cents else 'No'}\n\n")
         
         # 6. Análisis de casos específicos
         f.write("6. ANÁLISIS DE CASOS ESPECÍFICOS\n")
         f.write("-" * 50 + "\n")
         
         if len(patients_with_diff) > 0:
-            # Tomar algunos casos para análisis detallado
-            sample_patients = patients_with_diff.head(3)['paciente'].tolist()
+            # Tomar algunos casos para análisis detallado; totales y registros salen de la conciliación
+            sample_cases = patients_with_diff.head(3)
+            
+            # Primer registro de cada paciente en cada archivo (expediente e IAN de referencia)
+            summary_first = df_summary.drop_duplicates('paciente').set_index('paciente')
+            processed_first = df_processed.drop_duplicates('paciente').set_index('paciente')
             
-            for patient in sample_patients:
-                f.write(f"Análisis detallado - Paciente {patient}:\n")
+            for case in sample_cases.itertuples(index=False):
+                f.write(f"Análisis detallado - Paciente {case.paciente}:\n")
                 
                 # Datos del resumen
-                summary_data = df_summary[df_summary['paciente'] == patient]
-                if len(summary_data) > 0:
-                    f.write(f"  Resumen ({len(summary_data)} registros):\n")
-                    f.write(f"    - Total gasto: ${summary_data['gasto_nivel_6'].sum():,.2f}\n")
-                    f.write(f"    - Expediente: {summary_data['n_expediente_hosp'].iloc[0]}\n")
-                    f.write(f"    - IAN: {summary_data['ian_expediente_hosp'].iloc[0]}\n")
+                if case.registros_resumen > 0:
+                    f.write(f"  Resumen ({case.registros_resumen} registros):\n")
+                    f.write(f"    - Total gasto: ${case.gasto_resumen:,.2f}\n")
+                    f.write(f"    - Expediente: {summary_first.at[case.paciente, 'n_expediente_hosp']}\n")
+                    f.write(f"    - IAN: {summary_first.at[case.paciente, 'ian_expediente_hosp']}\n")
                 
                 # Datos de procesados
-                processed_data = df_processed[df_processed['paciente'] == patient]
-                if len(processed_data) > 0:
-                    f.write(f"  Procesados ({len(processed_data)} registros):\n")
-                    f.write(f"    - Total monto: ${processed_data['monto_nivel_6'].sum():,.2f}\n")
-                    f.write(f"    - Expediente: {processed_data['n_expediente_hosp'].iloc[0]}\n")
-                    f.write(f"    - IAN: {processed_data['ian_expediente_hosp'].iloc[0]}\n")
+                if case.registros_procesado > 0:
+                    f.write(f"  Procesados ({case.registros_procesado} registros):\n")
+                    f.write(f"    - Total monto: ${case.gasto_procesado:,.2f}\n")
+                    f.write(f"    - Expediente: {processed_first.at[case.paciente, 'n_expediente_hosp']}\n")
+                    f.write(f"    - IAN: {processed_first.at[case.paciente, 'ian_expediente_hosp']}\n")
                 
                 f.write("\n")
         
@@ -173,7 +188,6 @@ def analyze_cost_differences():
         f.write("Basado en el análisis:\n")
         f.write("1. La diferencia total es muy pequeña (0.001%)\n")
         f.write("2. Las diferencias pueden deberse a:\n")
-        f.write("   - Redondeo en cálculos\n")
         f.write("   - Diferentes metodologías de consolidación\n")
         f.write("   - Pequeñas discrepancias en fechas de corte\n")
         f.write("3. Los datos son altamente consistentes\n")
@@ -192,7 +206,7 @@ def create_differences_csv(comparison, resultados_path):
     """Crea un CSV con las diferencias por paciente."""
     
     # Filtrar solo pacientes con diferencias
-    patients_with_diff = comparison[abs(comparison['diferencia']) > 0.01]
+    patients_with_diff = comparison[comparison['estado'] == DIFFERENT]
     
     if len(patients_with_diff) > 0:
         # Ordenar por diferencia absoluta
@@ -208,4 +222,7 @@ def create_differences_csv(comparison, resultados_path):
         print("No se encontraron diferencias significativas.")
 
 if __name__ == "__main__":
-    analyze_cost_differences() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analiza las diferencias de costos entre el detalle y el resumen.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    analyze_cost_differences(profile=args.perfil)
@@ -4,11 +4,23 @@ Script para analizar las diferencias específicas entre IAN y expedientes.
 Como todos los pacientes tienen ambos, analizamos cuándo y cómo se usan.
 """
 
+import argparse
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import STANDARDIZED_DATASET, read_dataset
+from utils.profiling import add_profile_argument, profiled
+
+# Columnas que usa este análisis
+COLUMNS = ['paciente', 'n_expediente_hosp', 'ian_expediente_hosp', 'origen', 'area_servicio', 'fecha', 'monto_nivel_6']
+
+@profiled
 def analyze_ian_expedient_differences():
     """Analiza las diferencias específicas entre IAN y expedientes."""
     
@@ -18,8 +30,8 @@ def analyze_ian_expedient_differences():
     
     print("Analizando diferencias específicas entre IAN y expedientes...")
     
-    # Leer el archivo estandarizado
-    df = pd.read_csv('data/processed/resultados_pacientes_estandarizados.csv', low_memory=False)
+    # Leer el dataset estandarizado
+    df = read_dataset(STANDARDIZED_DATASET, columns=COLUMNS)
     print(f"Total de registros: {len(df):,}")
     
     # Crear archivo de análisis
@@ -47,9 +59,10 @@ def analyze_ian_expedient_differences():
         f.write("2. ANÁLISIS: ¿CUÁNDO IAN = EXPEDIENTE?\n")
         f.write("-" * 50 + "\n")
         
-        # Casos donde IAN es igual al expediente
-        ian_equals_expedient = df[df['ian_expediente_hosp'] == df['n_expediente_hosp']]
-        ian_different_expedient = df[df['ian_expediente_hosp'] != df['n_expediente_hosp']]
+        # Casos donde IAN es igual al expediente (un IAN o expediente vacío cuenta como distinto)
+        ian_matches = df['ian_expediente_hosp'].eq(df['n_expediente_hosp']).fillna(False)
+        ian_equals_expedient = df[ian_matches]
+        ian_different_expedient = df[~ian_matches]
         
         f.write(f"Registros donde IAN = Expediente: {len(ian_equals_expedient):,} ({len(ian_equals_expedient)/len(df)*100:.2f}%)\n")
         f.write(f"Registros donde IAN ≠ Expediente: {len(ian_different_expedient):,} ({len(ian_different_expedient)/len(df)*100:.2f}%)\n\n")
@@ -59,7 +72,8 @@ def analyze_ian_expedient_differences():
         f.write("-" * 50 + "\n")
         
         if 'origen' in ian_equals_expedient.columns:
-            origen_counts_equal = ian_equals_expedient['origen'].value_counts()
+            # En columnas categóricas se omiten las categorías sin filas en el subconjunto
+            origen_counts_equal = ian_equals_expedient['origen'].value_counts().loc[lambda counts: counts > 0]
             f.write("Distribución por origen cuando IAN = Expediente:\n")
             for origen, count in origen_counts_equal.items():
                 f.write(f"  - {origen}: {count:,} registros ({count/len(ian_equals_expedient)*100:.2f}%)\n")
@@ -70,7 +84,7 @@ def analyze_ian_expedient_differences():
         f.write("-" * 50 + "\n")
         
         if 'origen' in ian_different_expedient.columns:
-            origen_counts_diff = ian_different_expedient['origen'].value_counts()
+            origen_counts_diff = ian_different_expedient['origen'].value_counts().loc[lambda counts: counts > 0]
             f.write("Distribución por origen cuando IAN ≠ Expediente:\n")
             for origen, count in origen_counts_diff.items():
                 f.write(f"  - {origen}: {count:,} registros ({count/len(ian_different_expedient)*100:.2f}%)\n")
@@ -121,14 +135,14 @@ def analyze_ian_expedient_differences():
         
         f.write("Top 10 áreas cuando IAN = Expediente:\n")
         if 'area_servicio' in ian_equals_expedient.columns:
-            area_counts_equal = ian_equals_expedient['area_servicio'].value_counts().head(10)
+            area_counts_equal = ian_equals_expedient['area_servicio'].value_counts().loc[lambda counts: counts > 0].head(10)
             for area, count in area_counts_equal.items():
                 f.write(f"  - {area}: {count:,} registros\n")
         f.write("\n")
         
         f.write("Top 10 áreas cuando IAN ≠ Expediente:\n")
         if 'area_servicio' in ian_different_expedient.columns:
-            area_counts_diff = ian_different_expedient['area_servicio'].value_counts().head(10)
+            area_counts_diff = ian_different_expedient['area_servicio'].value_counts().loc[lambda counts: counts > 0].head(10)
             for area, count in area_counts_diff.items():
                 f.write(f"  - {area}: {count:,} registros\n")
         f.write("\n")
@@ -160,9 +174,9 @@ def analyze_ian_expedient_differences():
                 
                 f.write("Distribución por año:\n")
                 for year in sorted(df['fecha'].dt.year.unique()):
-                    year_data = df[df['fecha'].dt.year == year]
-                    year_equal = year_data[year_data['ian_expediente_hosp'] == year_data['n_expediente_hosp']]
-                    year_diff = year_data[year_data['ian_expediente_hosp'] != year_data['n_expediente_hosp']]
+                    year_mask = df['fecha'].dt.year == year
+                    year_equal = df[year_mask & ian_matches]
+                    year_diff = df[year_mask & ~ian_matches]
                     
                     f.write(f"  {year}:\n")
                     f.write(f"    - IAN = Expediente: {len(year_equal):,} registros\n")
@@ -213,7 +227,8 @@ def create_difference_summary_csv(df, resultados_path):
     }).reset_index()
     
     # Agregar columna de diferencia
-    patient_summary['ian_equals_expedient'] = patient_summary['ian_expediente_hosp'] == patient_summary['n_expediente_hosp']
+    patient_summary['ian_equals_expedient'] = patient_summary['ian_expediente_hosp'].eq(
+        patient_summary['n_expediente_hosp']).fillna(False)
     patient_summary['categoria'] = patient_summary['ian_equals_expedient'].map({
         True: 'IAN = Expediente (Hospitalización directa)',
         False: 'IAN ≠ Expediente (Triage + Hospitalización)'
@@ -226,4 +241,7 @@ def create_difference_summary_csv(df, resultados_path):
     print(f"CSV con resumen de diferencias guardado en: {csv_file}")
 
 if __name__ == "__main__":
-    analyze_ian_expedient_differences() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analiza las diferencias entre IAN y expedientes.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    analyze_ian_expedient_differences(profile=args.perfil)
@@ -5,11 +5,23 @@ Confirma la hipótesis de que pacientes con solo IAN estuvieron en triage/observ
 mientras que pacientes con expediente pasaron a hospitalización.
 """
 
+import argparse
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import STANDARDIZED_DATASET, read_dataset
+from utils.profiling import add_profile_argument, profiled
+
+# Columnas que usa este análisis
+COLUMNS = ['paciente', 'n_expediente_hosp', 'ian_expediente_hosp', 'origen', 'area_servicio', 'fecha', 'monto_nivel_6']
+
+@profiled
 def analyze_ian_vs_expedients():
     """Analiza la distribución de pacientes por IAN vs expedientes."""
     
@@ -19,8 +31,8 @@ def analyze_ian_vs_expedients():
     
     print("Analizando distribución IAN vs Expedientes...")
     
-    # Leer el archivo estandarizado
-    df = pd.read_csv('data/processed/resultados_pacientes_estandarizados.csv', low_memory=False)
+    # Leer el dataset estandarizado
+    df = read_dataset(STANDARDIZED_DATASET, columns=COLUMNS)
     print(f"Total de registros: {len(df):,}")
     
     # Crear archivo de análisis
@@ -84,21 +96,22 @@ def analyze_ian_vs_expedients():
         # Análisis por origen
         f.write("Distribución por origen - Pacientes SOLO IAN (Triage/Observación):\n")
         if 'origen' in df_only_ian.columns:
-            origen_counts_ian = df_only_ian['origen'].value_counts()
+            # En columnas categóricas se omiten las categorías sin filas en el subconjunto
+            origen_counts_ian = df_only_ian['origen'].value_counts().loc[lambda counts: counts > 0]
             for origen, count in origen_counts_ian.items():
                 f.write(f"  - {origen}: {count:,} registros ({count/len(df_only_ian)*100:.2f}%)\n")
         f.write("\n")
         
         f.write("Distribución por origen - Pacientes SOLO expediente (Hospitalización):\n")
         if 'origen' in df_only_expedient.columns:
-            origen_counts_exp = df_only_expedient['origen'].value_counts()
+            origen_counts_exp = df_only_expedient['origen'].value_counts().loc[lambda counts: counts > 0]
             for origen, count in origen_counts_exp.items():
                 f.write(f"  - {origen}: {count:,} registros ({count/len(df_only_expedient)*100:.2f}%)\n")
         f.write("\n")
         
         f.write("Distribución por origen - Pacientes AMBOS (Urgencias + Hospitalización):\n")
         if 'origen' in df_both.columns:
-            origen_counts_both = df_both['origen'].value_counts()
+            origen_counts_both = df_both['origen'].value_counts().loc[lambda counts: counts > 0]
             for origen, count in origen_counts_both.items():
                 f.write(f"  - {origen}: {count:,} registros ({count/len(df_both)*100:.2f}%)\n")
         f.write("\n")
@@ -109,14 +122,14 @@ def analyze_ian_vs_expedients():
         
         f.write("Top 10 áreas de servicio - Pacientes SOLO IAN (Triage/Observación):\n")
         if 'area_servicio' in df_only_ian.columns:
-            area_counts_ian = df_only_ian['area_servicio'].value_counts().head(10)
+            area_counts_ian = df_only_ian['area_servicio'].value_counts().loc[lambda counts: counts > 0].head(10)
             for area, count in area_counts_ian.items():
                 f.write(f"  - {area}: {count:,} registros\n")
         f.write("\n")
         
         f.write("Top 10 áreas de servicio - Pacientes SOLO expediente (Hospitalización):\n")
         if 'area_servicio' in df_only_expedient.columns:
-            area_counts_exp = df_only_expedient['area_servicio'].value_counts().head(10)
+            area_counts_exp = df_only_expedient['area_servicio'].value_counts().loc[lambda counts: counts > 0].head(10)
             for area, count in area_counts_exp.items():
                 f.write(f"  - {area}: {count:,} registros\n")
         f.write("\n")
@@ -220,4 +233,7 @@ def create_patient_summary_csv(patient_analysis, resultados_path):
     print(f"CSV con resumen de pacientes guardado en: {csv_file}")
 
 if __name__ == "__main__":
-    analyze_ian_vs_expedients() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analiza la distribución de pacientes por tipo de identificación.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    analyze_ian_vs_expedients(profile=args.perfil)
@@ -4,11 +4,34 @@ Script para identificar y analizar pacientes con múltiples expedientes o IAN.
 Ayuda a entender las diferencias en los conteos de pacientes únicos.
 """
 
-import pandas as pd
+import argparse
+import sys
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import COMBINED_DATASET, dataset_exists, manifest_signature, read_dataset
+from utils.episodes import aggregate_episodes, read_episodes
+from utils.expedients import normalize_expedient_columns
+from utils.identity import read_identities
+from utils.profiling import add_profile_argument, profiled
+
+# Columnas que usa este análisis
+COLUMNS = [
+    'paciente', 'n_expediente_hosp', 'ian_expediente_hosp', 'area_servicio', 'fecha',
+    'cantidad', 'costo_nivel_6', 'monto_nivel_1', 'monto_nivel_6', 'archivo_origen'
+]
+
+def patient_counts(df, identities, column, count_column):
+    """Valores distintos de column por paciente: de la tabla de identidades si está vigente."""
+    if identities is not None:
+        return identities.set_index('paciente')[count_column]
+    return df.groupby('paciente')[column].nunique()
+
+@profiled
 def analyze_multiple_expedients():
     """Analiza pacientes con múltiples expedientes o IAN."""
     
@@ -16,16 +39,29 @@ def analyze_multiple_expedients():
     resultados_path = Path("resultados")
     resultados_path.mkdir(exist_ok=True)
     
-    # Leer el archivo combinado
-    combined_file = Path("data/processed/resultados_pacientes_combinados.csv")
-    if not combined_file.exists():
-        print("Error: No se encontró el archivo combinado. Ejecuta primero join.py")
-        return
+    # Leer el dataset combinado
+    if not dataset_exists(COMBINED_DATASET):
+        print("Error: No se encontró el dataset combinado. Ejecuta primero join.py")
+        sys.exit(1)
     
-    print("Leyendo archivo combinado...")
-    df = pd.read_csv(combined_file, low_memory=False)
+    print("Leyendo dataset combinado...")
+    df = read_dataset(COMBINED_DATASET, columns=COLUMNS)
     print(f"Total de registros: {len(df):,}")
     
+    # Expedientes e IAN se comparan sin ceros a la izquierda, igual que la tabla de episodios
+    normalize_expedient_columns(df)
+    
+    # Tabla de identidades de resolve_identities.py (None si no existe o está desactualizada)
+    identities = read_identities(manifest_signature())
+    if identities is None:
+        print("Tabla de identidades no disponible o desactualizada; se calculan los conteos por paciente")
+    
+    # Tabla de episodios de summarize.py (se recalcula si no existe o está desactualizada)
+    episodes = read_episodes(manifest_signature())
+    if episodes is None:
+        print("Tabla de episodios no disponible o desactualizada; se agrupan las filas de detalle")
+        episodes = aggregate_episodes(df)
+    
     # Crear archivo de resultados
     output_file = resultados_path / "analisis_multiples_expedientes.txt"
     
@@ -45,14 +81,19 @@ def analyze_multiple_expedients():
         f.write(f"Pacientes únicos (solo por ID): {total_patients:,}\n")
         f.write(f"Expedientes únicos: {total_expedients:,}\n")
         f.write(f"IAN únicos: {total_ians:,}\n")
-        f.write(f"Total de registros: {len(df):,}\n\n")
+        f.write(f"Total de registros: {len(df):,}\n")
+        if identities is not None:
+            shared = identities[identities['pacientes_en_identidad'] > 1]
+            f.write(f"Identidades resueltas (paciente/expediente/IAN): {identities['identidad'].nunique():,}\n")
+            f.write(f"Identidades que agrupan más de un paciente: {shared['identidad'].nunique():,} ({len(shared):,} pacientes)\n")
+        f.write("\n")
         
         # 2. Pacientes con múltiples expedientes
         f.write("2. PACIENTES CON MÚLTIPLES EXPEDIENTES\n")
         f.write("-" * 50 + "\n")
         
-        # Agrupar por paciente y contar expedientes únicos
-        patient_expedient_counts = df.groupby('paciente')['n_expediente_hosp'].nunique()
+        # Contar expedientes únicos por paciente
+        patient_expedient_counts = patient_counts(df, identities, 'n_expediente_hosp', 'num_expedientes')
         patients_multiple_expedients = patient_expedient_counts[patient_expedient_counts > 1]
         
         f.write(f"Pacientes con múltiples expedientes: {len(patients_multiple_expedients):,}\n")
@@ -76,8 +117,8 @@ def analyze_multiple_expedients():
         f.write("3. PACIENTES CON MÚLTIPLES IAN\n")
         f.write("-" * 50 + "\n")
         
-        # Agrupar por paciente y contar IAN únicos
-        patient_ian_counts = df.groupby('paciente')['ian_expediente_hosp'].nunique()
+        # Contar IAN únicos por paciente
+        patient_ian_counts = patient_counts(df, identities, 'ian_expediente_hosp', 'num_ians')
         patients_multiple_ians = patient_ian_counts[patient_ian_counts > 1]
         
         f.write(f"Pacientes con múltiples IAN: {len(patients_multiple_ians):,}\n")
@@ -110,14 +151,15 @@ def analyze_multiple_expedients():
         
         # Análisis por archivo de origen
         f.write("Distribución por archivo de origen:\n")
-        origin_counts = df_multiple['archivo_origen'].value_counts()
+        # En columnas categóricas se omiten las categorías sin filas en el subconjunto
+        origin_counts = df_multiple['archivo_origen'].value_counts().loc[lambda counts: counts > 0]
         for origin, count in origin_counts.items():
             f.write(f"  - {origin}: {count:,} registros ({count/len(df_multiple)*100:.2f}%)\n")
         f.write("\n")
         
         # Análisis por área de servicio
         f.write("Top 10 áreas de servicio para pacientes con múltiples expedientes:\n")
-        area_counts = df_multiple['area_servicio'].value_counts().head(10)
+        area_counts = df_multiple['area_servicio'].value_counts().loc[lambda counts: counts > 0].head(10)
         for area, count in area_counts.items():
             f.write(f"  - {area}: {count:,} registros\n")
         f.write("\n")
@@ -155,7 +197,7 @@ def analyze_multiple_expedients():
         count_method2 = df.groupby(['paciente', 'n_expediente_hosp']).size().reset_index().shape[0]
         
         # Método 3: Por paciente + expediente + IAN
-        count_method3 = df.groupby(['paciente', 'n_expediente_hosp', 'ian_expediente_hosp']).size().reset_index().shape[0]
+        count_method3 = len(episodes)
         
         f.write(f"Método 1 (solo paciente): {count_method1:,}\n")
         f.write(f"Método 2 (paciente + expediente): {count_method2:,}\n")
@@ -180,37 +222,26 @@ def analyze_multiple_expedients():
     print(f"Análisis completado. Resultados guardados en: {output_file}")
     
     # Crear también un CSV con los pacientes con múltiples expedientes
-    create_multiple_expedients_csv(df, resultados_path)
+    create_multiple_expedients_csv(df, resultados_path, identities, episodes)
 
-def create_multiple_expedients_csv(df, resultados_path):
+def create_multiple_expedients_csv(df, resultados_path, identities=None, episodes=None):
     """Crea un CSV con los pacientes que tienen múltiples expedientes."""
     
     # Identificar pacientes con múltiples expedientes
-    patient_expedient_counts = df.groupby('paciente')['n_expediente_hosp'].nunique()
+    patient_expedient_counts = patient_counts(df, identities, 'n_expediente_hosp', 'num_expedientes')
     patients_multiple_expedients = patient_expedient_counts[patient_expedient_counts > 1]
     
-    # Obtener datos de estos pacientes
-    df_multiple = df[df['paciente'].isin(patients_multiple_expedients.index)]
-    
-    # Crear resumen por paciente
-    summary_multiple = df_multiple.groupby(['paciente', 'n_expediente_hosp', 'ian_expediente_hosp']).agg({
-        'fecha': ['min', 'max'],
-        'costo_nivel_6': 'sum',
-        'monto_nivel_6': 'sum',
-        'cantidad': 'sum',
-        'archivo_origen': 'first'
-    }).reset_index()
-    
-    # Renombrar columnas
-    summary_multiple.columns = [
+    # Episodios de estos pacientes, tomados de la tabla de episodios
+    if episodes is None:
+        episodes = aggregate_episodes(df)
+    summary_multiple = episodes[episodes['paciente'].isin(patients_multiple_expedients.index)][[
         'paciente', 'n_expediente_hosp', 'ian_expediente_hosp',
-        'fecha_inicio', 'fecha_fin', 'total_costo_nivel_6', 
+        'fecha_inicio', 'fecha_fin', 'total_costo_nivel_6',
         'total_monto_nivel_6', 'total_cantidad', 'archivo_origen'
-    ]
+    ]].reset_index(drop=True)
     
     # Agregar número de expedientes por paciente
-    expedient_counts = df_multiple.groupby('paciente')['n_expediente_hosp'].nunique()
-    summary_multiple['num_expedientes_paciente'] = summary_multiple['paciente'].map(expedient_counts)
+    summary_multiple['num_expedientes_paciente'] = summary_multiple['paciente'].map(patients_multiple_expedients)
     
     # Guardar CSV
     csv_file = resultados_path / "pacientes_multiples_expedientes.csv"
@@ -219,4 +250,7 @@ def create_multiple_expedients_csv(df, resultados_path):
     print(f"CSV con pacientes múltiples expedientes guardado en: {csv_file}")
 
 if __name__ == "__main__":
-    analyze_multiple_expedients() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Identifica y analiza pacientes con múltiples expedientes.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    analyze_multiple_expedients(profile=args.perfil)
@@ -3,11 +3,26 @@
 Script para analizar en detalle el caso específico del paciente 677598.
 """
 
-import pandas as pd
+import argparse
+import sys
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import STANDARDIZED_DATASET, read_dataset, read_summary_file
+from utils.profiling import add_profile_argument, profiled
+
+# Se leen todas las columnas del dataset: el detalle del paciente se exporta completo
+COLUMNS = None
+SUMMARY_COLUMNS = [
+    'paciente', 'n_expediente_hosp', 'ian_expediente_hosp', 'gasto_nivel_6',
+    'fecha_ingreso_hosp', 'fecha_egreso_hosp'
+]
+
+@profiled
 def analyze_specific_patient():
     """Analiza en detalle el caso del paciente 677598."""
     
@@ -18,8 +33,8 @@ def analyze_specific_patient():
     print("Analizando paciente 677598...")
     
     # Leer archivos
-    df_summary = pd.read_csv('data/raw/Resumen Pacientes 2024-2025.csv', low_memory=False)
-    df_processed = pd.read_csv('data/processed/resultados_pacientes_estandarizados.csv', low_memory=False)
+    df_summary = read_summary_file('data/raw/Resumen Pacientes 2024-2025.csv', columns=SUMMARY_COLUMNS, low_memory=False)
+    df_processed = read_dataset(STANDARDIZED_DATASET, columns=COLUMNS)
     
     # Filtrar datos del paciente 677598
     patient_id = 677598
@@ -90,7 +105,7 @@ def analyze_specific_patient():
         f.write("-" * 50 + "\n")
         
         f.write("Distribución por área de servicio en procesados:\n")
-        area_summary = processed_patient.groupby('area_servicio')['monto_nivel_6'].agg(['sum', 'count']).reset_index()
+        area_summary = processed_patient.groupby('area_servicio', observed=True)['monto_nivel_6'].agg(['sum', 'count']).reset_index()
         area_summary.columns = ['Área de Servicio', 'Total Monto', 'Cantidad de Registros']
         area_summary = area_summary.sort_values('Total Monto', ascending=False)
         
@@ -121,7 +136,7 @@ def analyze_specific_patient():
         f.write("-" * 50 + "\n")
         
         f.write("Top 10 áreas de servicio con mayor monto:\n")
-        top_areas = processed_patient.groupby('area_servicio')['monto_nivel_6'].sum().sort_values(ascending=False).head(10)
+        top_areas = processed_patient.groupby('area_servicio', observed=True)['monto_nivel_6'].sum().sort_values(ascending=False).head(10)
         for area, monto in top_areas.items():
             f.write(f"  - {area}: ${monto:,.2f}\n")
         f.write("\n")
@@ -194,4 +209,7 @@ def create_patient_csv(processed_patient, summary_patient, resultados_path):
     print(f"Registros del paciente: {len(processed_patient):,}")
 
 if __name__ == "__main__":
-    analyze_specific_patient() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Análisis detallado de un paciente específico.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    analyze_specific_patient(profile=args.perfil)
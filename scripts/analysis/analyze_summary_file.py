@@ -3,11 +3,24 @@
 Script para analizar el archivo de resumen original y compararlo con los datos procesados.
 """
 
+import argparse
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import STANDARDIZED_DATASET, dataset_exists, read_dataset, read_summary_file
+from utils.profiling import add_profile_argument, profiled
+from utils.reconciliation import TOLERANCE, reconcile, status_counts
+
+# Columnas del dataset estandarizado que usa la comparación (el resumen se lee completo)
+COLUMNS = ['paciente', 'monto_nivel_6', 'dias_estancia']
+
+@profiled
 def analyze_summary_file():
     """Analiza el archivo de resumen original."""
     
@@ -19,10 +32,10 @@ def analyze_summary_file():
     summary_file = Path("data/raw/Resumen Pacientes 2024-2025.csv")
     if not summary_file.exists():
         print("Error: No se encontró el archivo de resumen original")
-        return
+        sys.exit(1)
     
     print("Leyendo archivo de resumen original...")
-    df_summary = pd.read_csv(summary_file, low_memory=False)
+    df_summary = read_summary_file(summary_file, low_memory=False)
     print(f"Total de registros: {len(df_summary):,}")
     
     # Crear archivo de análisis
@@ -170,9 +183,8 @@ def analyze_summary_file():
         f.write("-" * 50 + "\n")
         
         # Leer datos procesados
-        processed_file = Path("data/processed/resultados_pacientes_estandarizados.csv")
-        if processed_file.exists():
-            df_processed = pd.read_csv(processed_file, low_memory=False)
+        if dataset_exists(STANDARDIZED_DATASET):
+            df_processed = read_dataset(STANDARDIZED_DATASET, columns=COLUMNS)
             
             f.write("Comparación de métricas principales:\n\n")
             
@@ -192,6 +204,13 @@ def analyze_summary_file():
                 f.write(f"  - Resumen original: ${summary_gasto:,.2f}\n")
                 f.write(f"  - Datos procesados: ${processed_gasto:,.2f}\n")
                 f.write(f"  - Diferencia: ${summary_gasto - processed_gasto:,.2f} ({((summary_gasto-processed_gasto)/summary_gasto)*100:+.2f}%)\n\n")
+                
+                # Conciliación por paciente
+                reconciliation = reconcile(df_summary, 'gasto_nivel_6', df_processed, 'monto_nivel_6')
+                f.write(f"Conciliación por paciente (tolerancia ${TOLERANCE}):\n")
+                for status, count in status_counts(reconciliation).items():
+                    f.write(f"  - {status}: {count:,} pacientes\n")
+                f.write("\n")
             
             # Días de estancia
             if dias_col and 'dias_estancia' in df_processed.columns:
@@ -285,4 +304,7 @@ def create_summary_executive_summary(df_summary, resultados_path):
     print(f"Resumen ejecutivo guardado en: {summary_file}")
 
 if __name__ == "__main__":
-    analyze_summary_file() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Analiza el archivo de resumen original y lo compara con el generado.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    analyze_summary_file(profile=args.perfil)
@@ -2,8 +2,16 @@
 """
 Script de Análisis Exploratorio de Datos (EDA) para los datasets de resultados de pacientes.
 Analiza cada archivo individual y el combinado, guardando resultados en archivos de texto.
+Cada dataset se recorre una sola vez por bloques, acumulando resúmenes combinables
+(utils.sketches), sin cargarlo completo en memoria. Los resúmenes se guardan por archivo de
+origen: los archivos ya ingeridos se analizan desde su resumen guardado, el dataset combinado
+es la combinación de todos, y solo se recorren las particiones nuevas o modificadas.
+Con --aproximado el análisis se hace sobre una muestra estratificada del dataset combinado
+(utils.sampling) e informa intervalos de confianza del 95% junto a cada estimación.
 """
 
+import argparse
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -11,34 +19,113 @@ from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
-def analyze_dataset(df, dataset_name, output_file):
-    """Analiza un dataset y escribe los resultados en un archivo de texto."""
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import COMBINED_DATASET, PARTITION_COLUMN, dataset_exists, iter_dataset, read_csv_file, read_manifest
+from utils.encoding import detect_encoding
+from utils.profiling import add_profile_argument, profiled
+from utils.sampling import DEFAULT_SAMPLE_SIZE, SAMPLE_SEED, STRATUM_COLUMN, StratifiedEstimator, stratified_sample
+from utils.sketches import DatasetSketch, merge_sketches, update_partition_sketches
+
+RAW_PATH = Path("data/raw")
+PERIOD_PREFIX = "Resultados Pacientes "
+
+# Filas por bloque al recorrer cada dataset
+DEFAULT_CHUNKSIZE = 250_000
+
+def source_exists(file_path):
+    """Indica si existe un archivo raw o un dataset procesado."""
+    return dataset_exists(file_path) if file_path == COMBINED_DATASET else file_path.exists()
+
+def data_sources(manifest):
+    """
+    Archivos de período (los de data/raw y los ya ingeridos, por nombre) y el dataset combinado,
+    con el nombre con que aparecen en los reportes.
+    """
+    names = {f.name for f in RAW_PATH.glob(f"{PERIOD_PREFIX}*.csv")}
+    names |= {name for name in manifest if name.startswith(PERIOD_PREFIX)}
+    sources = [(RAW_PATH / name, Path(name).stem[len(PERIOD_PREFIX):]) for name in sorted(names)]
+    return sources + [(COMBINED_DATASET, "DATASET COMBINADO")]
+
+def iter_source(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    """Recorre un archivo raw (CSV) o el dataset combinado (Parquet) por bloques tipados."""
+    if file_path == COMBINED_DATASET:
+        return iter_dataset(file_path, chunksize=chunksize)
+    return read_csv_file(file_path, encoding=detect_encoding(file_path), chunksize=chunksize)
+
+def sketch_source(file_path, chunksize=DEFAULT_CHUNKSIZE):
+    """Resumen del dataset calculado en una sola pasada por bloques."""
+    sketch = DatasetSketch()
+    for chunk in iter_source(file_path, chunksize):
+        sketch.update(chunk)
+    return sketch
+
+def stored_sketches(manifest, chunksize=DEFAULT_CHUNKSIZE):
+    """Resúmenes guardados por archivo de origen, actualizando los de particiones nuevas o modificadas."""
+    stored, refreshed = update_partition_sketches(manifest, chunksize=chunksize)
+    if stored:
+        print(f"Resúmenes por archivo de origen: {len(refreshed)} recalculados, "
+              f"{len(stored) - len(refreshed)} reutilizados")
+    return stored
+
+def source_sketch(file_path, manifest, stored, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Resumen de una fuente a partir de los resúmenes guardados por archivo de origen o, si no
+    están, recorriéndola por bloques. Devuelve None si la fuente no existe.
+    """
+    if file_path == COMBINED_DATASET:
+        # El dataset combinado es la unión de las particiones del manifiesto
+        if stored and len(stored) == len(manifest):
+            return merge_sketches(stored.values())
+    elif file_path.name in stored:
+        # La partición es el archivo de período con la columna del archivo de origen agregada
+        return stored[file_path.name].without([PARTITION_COLUMN])
+    if not source_exists(file_path):
+        return None
+    return sketch_source(file_path, chunksize)
+
+def write_frequencies(output_file, frequent, n, rows, template):
+    """Valores más frecuentes; si los conteos son aproximados, indica cuánto pueden faltarles."""
+    for value, count in frequent.most_common(n):
+        output_file.write(template.format(value=value, count=count, percent=count / rows * 100))
+    if frequent.error:
+        output_file.write(f"    (conteos aproximados: a cada uno le pueden faltar hasta {frequent.error:,})\n")
+
+def analyze_dataset(sketch, dataset_name, output_file):
+    """Escribe el análisis de un dataset a partir de su resumen (ver utils.sketches)."""
     
     output_file.write(f"\n{'='*80}\n")
     output_file.write(f"ANÁLISIS EXPLORATORIO DE DATOS - {dataset_name.upper()}\n")
     output_file.write(f"{'='*80}\n")
-    output_file.write(f"Fecha de análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+    output_file.write(f"Fecha de análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    output_file.write("Estadísticas calculadas en una sola pasada por bloques: cuantiles y medianas aproximados "
+                      "(t-digest) en columnas con muchos valores distintos; valores únicos aproximados "
+                      "(HyperLogLog) cuando se indica.\n\n")
+    
+    rows = sketch.rows
+    columns = list(sketch.dtypes)
     
     # Información básica del dataset
     output_file.write("1. INFORMACIÓN BÁSICA DEL DATASET\n")
     output_file.write("-" * 50 + "\n")
-    output_file.write(f"Dimensiones: {df.shape[0]:,} filas x {df.shape[1]} columnas\n")
-    output_file.write(f"Tamaño en memoria: {df.memory_usage(deep=True).sum() / 1024**2:.2f} MB\n")
+    output_file.write(f"Dimensiones: {rows:,} filas x {len(columns)} columnas\n")
+    output_file.write(f"Tamaño en memoria: {sketch.memory_bytes / 1024**2:.2f} MB\n")
     output_file.write(f"Tipos de datos:\n")
-    for col, dtype in df.dtypes.items():
+    for col, dtype in sketch.dtypes.items():
         output_file.write(f"  - {col}: {dtype}\n")
     output_file.write("\n")
     
     # Información de columnas
     output_file.write("2. INFORMACIÓN DE COLUMNAS\n")
     output_file.write("-" * 50 + "\n")
-    output_file.write(f"Columnas: {list(df.columns)}\n\n")
+    output_file.write(f"Columnas: {columns}\n\n")
     
     # Valores faltantes
     output_file.write("3. VALORES FALTANTES\n")
     output_file.write("-" * 50 + "\n")
-    missing_data = df.isnull().sum()
-    missing_percent = (missing_data / len(df)) * 100
+    missing_data = pd.Series(sketch.nulls, dtype='int64')
+    missing_percent = (missing_data / rows) * 100
     missing_df = pd.DataFrame({
         'Valores_Faltantes': missing_data,
         'Porcentaje': missing_percent
@@ -57,42 +144,41 @@ def analyze_dataset(df, dataset_name, output_file):
     output_file.write("-" * 50 + "\n")
     
     # Columnas numéricas
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
+    numeric_cols = [col for col in columns if col in sketch.numeric]
     if len(numeric_cols) > 0:
         output_file.write("Columnas numéricas:\n")
-        desc_stats = df[numeric_cols].describe()
+        desc_stats = pd.DataFrame({col: sketch.numeric[col].describe() for col in numeric_cols})
         output_file.write(desc_stats.to_string())
         output_file.write("\n\n")
     
     # Columnas categóricas
-    categorical_cols = df.select_dtypes(include=['object']).columns
+    categorical_cols = [col for col in columns if col in sketch.categorical and col not in sketch.numeric]
     if len(categorical_cols) > 0:
         output_file.write("Columnas categóricas:\n")
         for col in categorical_cols:
+            values = sketch.categorical[col]
             output_file.write(f"\n{col}:\n")
-            value_counts = df[col].value_counts()
-            output_file.write(f"  Valores únicos: {df[col].nunique()}\n")
+            output_file.write(f"  Valores únicos: {values.nunique()}{'' if values.exact else ' (aprox.)'}\n")
             output_file.write(f"  Top 5 valores más frecuentes:\n")
-            for val, count in value_counts.head().items():
-                output_file.write(f"    - {val}: {count:,} ({count/len(df)*100:.2f}%)\n")
+            write_frequencies(output_file, values.frequent, 5, rows,
+                              "    - {value}: {count:,} ({percent:.2f}%)\n")
         output_file.write("\n")
     
     # Análisis de fechas
     date_cols = ['fecha', 'fecha_egreso_general']
     for col in date_cols:
-        if col in df.columns:
+        if col in columns:
             output_file.write(f"5. ANÁLISIS DE {col.upper()}\n")
             output_file.write("-" * 50 + "\n")
-            try:
-                df[col] = pd.to_datetime(df[col])
-                output_file.write(f"Rango de fechas: {df[col].min()} a {df[col].max()}\n")
-                output_file.write(f"Duración total: {(df[col].max() - df[col].min()).days} días\n")
+            if col in sketch.dates:
+                dates = sketch.dates[col]
+                output_file.write(f"Rango de fechas: {dates.min} a {dates.max}\n")
+                output_file.write(f"Duración total: {(dates.max - dates.min).days} días\n")
                 output_file.write(f"Distribución por año:\n")
-                year_counts = df[col].dt.year.value_counts().sort_index()
-                for year, count in year_counts.items():
+                for year, count in sorted(dates.years.counts.items()):
                     output_file.write(f"  - {year}: {count:,} registros\n")
                 output_file.write("\n")
-            except:
+            else:
                 output_file.write(f"No se pudo analizar la columna {col}\n\n")
     
     # Análisis de costos y montos
@@ -100,96 +186,263 @@ def analyze_dataset(df, dataset_name, output_file):
     output_file.write("6. ANÁLISIS DE COSTOS Y MONTOS\n")
     output_file.write("-" * 50 + "\n")
     for col in cost_cols:
-        if col in df.columns:
+        if col in sketch.numeric:
+            moments = sketch.numeric[col].moments
             output_file.write(f"\n{col}:\n")
-            output_file.write(f"  Total: ${df[col].sum():,.2f}\n")
-            output_file.write(f"  Promedio: ${df[col].mean():,.2f}\n")
-            output_file.write(f"  Mediana: ${df[col].median():,.2f}\n")
-            output_file.write(f"  Mínimo: ${df[col].min():,.2f}\n")
-            output_file.write(f"  Máximo: ${df[col].max():,.2f}\n")
-            output_file.write(f"  Desviación estándar: ${df[col].std():,.2f}\n")
+            output_file.write(f"  Total: ${moments.total:,.2f}\n")
+            output_file.write(f"  Promedio: ${moments.total / moments.count:,.2f}\n")
+            output_file.write(f"  Mediana: ${sketch.numeric[col].quantile(0.5):,.2f}\n")
+            output_file.write(f"  Mínimo: ${moments.min:,.2f}\n")
+            output_file.write(f"  Máximo: ${moments.max:,.2f}\n")
+            output_file.write(f"  Desviación estándar: ${moments.std():,.2f}\n")
     
     output_file.write("\n")
     
     # Análisis por área de servicio
-    if 'area_servicio' in df.columns:
+    if 'area_servicio' in sketch.categorical:
         output_file.write("7. ANÁLISIS POR ÁREA DE SERVICIO\n")
         output_file.write("-" * 50 + "\n")
-        area_counts = df['area_servicio'].value_counts()
         output_file.write("Distribución por área de servicio:\n")
-        for area, count in area_counts.head(10).items():
-            output_file.write(f"  - {area}: {count:,} registros ({count/len(df)*100:.2f}%)\n")
+        write_frequencies(output_file, sketch.categorical['area_servicio'].frequent, 10, rows,
+                          "  - {value}: {count:,} registros ({percent:.2f}%)\n")
         output_file.write("\n")
     
     # Análisis por origen
-    if 'origen' in df.columns:
+    if 'origen' in sketch.categorical:
         output_file.write("8. ANÁLISIS POR ORIGEN\n")
         output_file.write("-" * 50 + "\n")
-        origen_counts = df['origen'].value_counts()
         output_file.write("Distribución por origen:\n")
-        for origen, count in origen_counts.items():
-            output_file.write(f"  - {origen}: {count:,} registros ({count/len(df)*100:.2f}%)\n")
+        write_frequencies(output_file, sketch.categorical['origen'].frequent, None, rows,
+                          "  - {value}: {count:,} registros ({percent:.2f}%)\n")
         output_file.write("\n")
     
     # Análisis de pacientes únicos
-    if 'paciente' in df.columns:
+    if 'paciente' in sketch.categorical:
         output_file.write("9. ANÁLISIS DE PACIENTES\n")
         output_file.write("-" * 50 + "\n")
-        unique_patients = df['paciente'].nunique()
-        output_file.write(f"Pacientes únicos: {unique_patients:,}\n")
-        output_file.write(f"Promedio de registros por paciente: {len(df)/unique_patients:.2f}\n")
+        patients = sketch.categorical['paciente']
+        unique_patients = patients.nunique()
+        output_file.write(f"Pacientes únicos: {unique_patients:,}{'' if patients.exact else ' (aprox.)'}\n")
+        output_file.write(f"Promedio de registros por paciente: {rows/unique_patients:.2f}\n")
         
         # Top pacientes con más registros
-        patient_counts = df['paciente'].value_counts()
         output_file.write(f"\nTop 10 pacientes con más registros:\n")
-        for patient, count in patient_counts.head(10).items():
-            output_file.write(f"  - Paciente {patient}: {count:,} registros\n")
+        write_frequencies(output_file, patients.frequent, 10, rows, "  - Paciente {value}: {count:,} registros\n")
+        output_file.write("\n")
+    
+    output_file.write("\n" + "="*80 + "\n\n")
+
+def interval(estimate, half_width, template="{:,.0f}"):
+    """Estimación con la semiamplitud de su intervalo de confianza del 95%."""
+    return f"{template.format(estimate)} ± {template.format(half_width)}"
+
+def write_estimated_frequencies(output_file, estimator, values, n, template):
+    """Valores más frecuentes en la muestra, con su conteo y porcentaje estimados en la población."""
+    for value in values.value_counts().index[:n]:
+        mask = values.eq(value).fillna(False).to_numpy(dtype=bool)
+        count, count_error = estimator.count(mask)
+        percent, percent_error = estimator.proportion(mask)
+        output_file.write(template.format(value=value, count=interval(count, count_error),
+                                          percent=interval(percent * 100, percent_error * 100, "{:.2f}")))
+
+def analyze_sample(estimator, dataset_name, output_file):
+    """Escribe el análisis aproximado de un dataset a partir de una muestra estratificada."""
+    
+    sample = estimator.sample.drop(columns=[STRATUM_COLUMN])
+    rows = estimator.population
+    columns = list(sample.columns)
+    
+    output_file.write(f"\n{'='*80}\n")
+    output_file.write(f"ANÁLISIS EXPLORATORIO APROXIMADO - {dataset_name.upper()}\n")
+    output_file.write(f"{'='*80}\n")
+    output_file.write(f"Fecha de análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    output_file.write(f"Estimaciones a partir de una muestra estratificada de {len(sample):,} filas "
+                      f"({len(estimator.sizes)} estratos archivo de origen x origen); "
+                      "los valores ± son la semiamplitud del intervalo de confianza del 95%.\n\n")
+    
+    # Información básica del dataset
+    output_file.write("1. INFORMACIÓN BÁSICA DEL DATASET\n")
+    output_file.write("-" * 50 + "\n")
+    output_file.write(f"Dimensiones: {rows:,} filas x {len(columns)} columnas\n")
+    output_file.write(f"Filas en la muestra: {len(sample):,}\n")
+    memory = sample.memory_usage(deep=True).sum() * rows / max(len(sample), 1)
+    output_file.write(f"Tamaño en memoria estimado: {memory / 1024**2:.2f} MB\n")
+    output_file.write(f"Tipos de datos:\n")
+    for col, dtype in sample.dtypes.items():
+        output_file.write(f"  - {col}: {dtype}\n")
+    output_file.write("\n")
+    
+    # Información de columnas
+    output_file.write("2. INFORMACIÓN DE COLUMNAS\n")
+    output_file.write("-" * 50 + "\n")
+    output_file.write(f"Columnas: {columns}\n\n")
+    
+    # Valores faltantes
+    output_file.write("3. VALORES FALTANTES\n")
+    output_file.write("-" * 50 + "\n")
+    missing = {col: sample[col].isna().to_numpy() for col in columns if sample[col].isna().any()}
+    if missing:
+        estimates = {col: estimator.count(mask) for col, mask in missing.items()}
+        for col in sorted(estimates, key=lambda col: estimates[col][0], reverse=True):
+            count, count_error = estimates[col]
+            percent, percent_error = estimator.proportion(missing[col])
+            output_file.write(f"  - {col}: {interval(count, count_error)} "
+                              f"({interval(percent * 100, percent_error * 100, '{:.2f}')}%)\n")
+    else:
+        output_file.write("  No hay valores faltantes en la muestra\n")
+    output_file.write("\n")
+    
+    # Estadísticas descriptivas
+    output_file.write("4. ESTADÍSTICAS DESCRIPTIVAS\n")
+    output_file.write("-" * 50 + "\n")
+    
+    # Columnas numéricas: cuantiles y desviación ponderados por los pesos de expansión
+    numeric_cols = list(sample.select_dtypes(include=[np.number]).columns)
+    if len(numeric_cols) > 0:
+        output_file.write("Columnas numéricas:\n")
+        desc_stats = pd.DataFrame({col: {
+            'count': estimator.total(sample[col].notna())[0],
+            'mean': estimator.mean(sample[col])[0],
+            'std': estimator.std(sample[col]),
+            'min': sample[col].min(),
+            '25%': estimator.quantile(sample[col], 0.25),
+            '50%': estimator.quantile(sample[col], 0.5),
+            '75%': estimator.quantile(sample[col], 0.75),
+            'max': sample[col].max()
+        } for col in numeric_cols})
+        output_file.write(desc_stats.to_string())
+        output_file.write("\n\nMedias (IC 95%):\n")
+        for col in numeric_cols:
+            output_file.write(f"  - {col}: {interval(*estimator.mean(sample[col]), '{:,.2f}')}\n")
+        output_file.write("\n")
+    
+    # Columnas categóricas
+    categorical_cols = list(sample.select_dtypes(include=['object', 'category', 'string']).columns)
+    if len(categorical_cols) > 0:
+        output_file.write("Columnas categóricas:\n")
+        for col in categorical_cols:
+            output_file.write(f"\n{col}:\n")
+            output_file.write(f"  Valores únicos en la muestra: {sample[col].nunique()}\n")
+            output_file.write(f"  Top 5 valores más frecuentes:\n")
+            write_estimated_frequencies(output_file, estimator, sample[col], 5,
+                                        "    - {value}: {count} ({percent}%)\n")
+        output_file.write("\n")
+    
+    # Análisis de fechas
+    date_cols = ['fecha', 'fecha_egreso_general']
+    for col in date_cols:
+        if col in columns:
+            output_file.write(f"5. ANÁLISIS DE {col.upper()}\n")
+            output_file.write("-" * 50 + "\n")
+            if pd.api.types.is_datetime64_any_dtype(sample[col]) and sample[col].notna().any():
+                dates = sample[col]
+                output_file.write(f"Rango de fechas en la muestra: {dates.min()} a {dates.max()}\n")
+                output_file.write(f"Duración: {(dates.max() - dates.min()).days} días\n")
+                output_file.write(f"Distribución por año:\n")
+                years = dates.dt.year
+                for year in sorted(years.dropna().unique()):
+                    count, count_error = estimator.count(years.eq(year).fillna(False).to_numpy(dtype=bool))
+                    output_file.write(f"  - {int(year)}: {interval(count, count_error)} registros\n")
+                output_file.write("\n")
+            else:
+                output_file.write(f"No se pudo analizar la columna {col}\n\n")
+    
+    # Análisis de costos y montos
+    cost_cols = ['costo_nivel_6', 'monto_nivel_1', 'monto_nivel_6']
+    output_file.write("6. ANÁLISIS DE COSTOS Y MONTOS\n")
+    output_file.write("-" * 50 + "\n")
+    for col in cost_cols:
+        if col in numeric_cols:
+            output_file.write(f"\n{col}:\n")
+            output_file.write(f"  Total: ${interval(*estimator.total(sample[col]), '{:,.2f}')}\n")
+            output_file.write(f"  Promedio: ${interval(*estimator.mean(sample[col]), '{:,.2f}')}\n")
+            output_file.write(f"  Mediana: ${estimator.quantile(sample[col], 0.5):,.2f}\n")
+            output_file.write(f"  Mínimo en la muestra: ${sample[col].min():,.2f}\n")
+            output_file.write(f"  Máximo en la muestra: ${sample[col].max():,.2f}\n")
+            output_file.write(f"  Desviación estándar: ${estimator.std(sample[col]):,.2f}\n")
+    
+    output_file.write("\n")
+    
+    # Análisis por área de servicio
+    if 'area_servicio' in columns:
+        output_file.write("7. ANÁLISIS POR ÁREA DE SERVICIO\n")
+        output_file.write("-" * 50 + "\n")
+        output_file.write("Distribución por área de servicio:\n")
+        write_estimated_frequencies(output_file, estimator, sample['area_servicio'], 10,
+                                    "  - {value}: {count} registros ({percent}%)\n")
+        output_file.write("\n")
+    
+    # Análisis por origen
+    if 'origen' in columns:
+        output_file.write("8. ANÁLISIS POR ORIGEN\n")
+        output_file.write("-" * 50 + "\n")
+        output_file.write("Distribución por origen:\n")
+        write_estimated_frequencies(output_file, estimator, sample['origen'], None,
+                                    "  - {value}: {count} registros ({percent}%)\n")
+        output_file.write("\n")
+    
+    # Análisis de pacientes: los únicos no se pueden estimar desde la muestra
+    if 'paciente' in columns:
+        output_file.write("9. ANÁLISIS DE PACIENTES\n")
+        output_file.write("-" * 50 + "\n")
+        output_file.write(f"Pacientes distintos en la muestra: {sample['paciente'].nunique():,} "
+                          "(el total de pacientes únicos no se estima por muestreo)\n")
+        output_file.write(f"\nTop 10 pacientes con más registros:\n")
+        write_estimated_frequencies(output_file, estimator, sample['paciente'], 10,
+                                    "  - Paciente {value}: {count} registros\n")
         output_file.write("\n")
     
     output_file.write("\n" + "="*80 + "\n\n")
 
-def main():
+@profiled
+def main(chunksize=DEFAULT_CHUNKSIZE, approximate=False, sample_size=DEFAULT_SAMPLE_SIZE, seed=SAMPLE_SEED):
     # Crear directorio de resultados
     resultados_path = Path("resultados")
     resultados_path.mkdir(exist_ok=True)
     
+    # Ambos modos analizan el dataset combinado
+    if not dataset_exists(COMBINED_DATASET):
+        print("Error: No se encontró el dataset combinado. Ejecuta primero join.py")
+        sys.exit(1)
+    
+    if approximate:
+        main_approximate(resultados_path, sample_size, seed)
+        return
+    
     # Archivo de salida
     output_file_path = resultados_path / "eda_resultados.txt"
     
     print("Iniciando análisis exploratorio de datos...")
     
+    # Resúmenes guardados por archivo de origen: solo se recorren las particiones nuevas o modificadas
+    manifest = read_manifest()
+    stored = stored_sketches(manifest, chunksize)
+    
+    # Resúmenes de cada dataset analizado, para el resumen ejecutivo
+    sketches = []
+    
     with open(output_file_path, 'w', encoding='utf-8') as output_file:
         output_file.write("ANÁLISIS EXPLORATORIO DE DATOS - RESULTADOS DE PACIENTES\n")
         output_file.write("="*80 + "\n")
         output_file.write(f"Fecha de análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
         output_file.write("Este archivo contiene el análisis detallado de cada dataset individual y el combinado.\n\n")
         
-        # Lista de archivos a analizar
-        files_to_analyze = [
-            ("data/raw/Resultados Pacientes Jan 2024 - Jul 2024.csv", "Jan 2024 - Jul 2024"),
-            ("data/raw/Resultados Pacientes Jan-Jun 2025.csv", "Jan-Jun 2025"),
-            ("data/raw/Resultados Pacientes Jul 2024 - Ene 2025.csv", "Jul 2024 - Ene 2025"),
-            ("data/processed/resultados_pacientes_combinados.csv", "DATASET COMBINADO")
-        ]
-        
         # Analizar cada archivo
-        for file_path, dataset_name in files_to_analyze:
-            file_path = Path(file_path)
-            if file_path.exists():
-                print(f"Analizando: {dataset_name}")
-                try:
-                    # Leer el archivo
-                    df = pd.read_csv(file_path, low_memory=False)
-                    
-                    # Analizar el dataset
-                    analyze_dataset(df, dataset_name, output_file)
-                    
-                except Exception as e:
-                    output_file.write(f"\nError analizando {dataset_name}: {str(e)}\n\n")
-                    print(f"Error: {str(e)}")
-            else:
+        for file_path, dataset_name in data_sources(manifest):
+            try:
+                sketch = source_sketch(file_path, manifest, stored, chunksize)
+            except Exception as e:
+                output_file.write(f"\nError analizando {dataset_name}: {str(e)}\n\n")
+                print(f"Error: {str(e)}")
+                sketches.append((file_path, dataset_name, e))
+                continue
+            if sketch is None:
                 output_file.write(f"\nArchivo no encontrado: {file_path}\n\n")
                 print(f"Archivo no encontrado: {file_path}")
+                continue
+            print(f"Analizando: {dataset_name}")
+            analyze_dataset(sketch, dataset_name, output_file)
+            sketches.append((file_path, dataset_name, sketch))
         
         # Resumen final
         output_file.write("\n" + "="*80 + "\n")
@@ -201,10 +454,43 @@ def main():
     print(f"\nAnálisis completado. Resultados guardados en: {output_file_path}")
     
     # Crear también un resumen ejecutivo
-    create_executive_summary(resultados_path)
+    create_executive_summary(resultados_path, sketches)
+
+def main_approximate(resultados_path, sample_size=DEFAULT_SAMPLE_SIZE, seed=SAMPLE_SEED):
+    """
+    Análisis aproximado sobre una muestra estratificada del dataset combinado. Escribe en
+    archivos propios, sin reemplazar los resultados exactos del pipeline.
+    """
+    output_file_path = resultados_path / "eda_resultados_aproximado.txt"
+    
+    print(f"Iniciando análisis exploratorio aproximado (muestra de {sample_size:,} filas)...")
+    sample, sizes = stratified_sample(read_manifest(), sample_size=sample_size, seed=seed)
+    combined = StratifiedEstimator(sample, sizes)
+    
+    # Estimadores de cada archivo de período (sus estratos) y del dataset combinado
+    estimators = []
+    for filename in sizes[PARTITION_COLUMN].unique():
+        estimator = combined.subset(sizes[PARTITION_COLUMN] == filename)
+        estimator.sample = estimator.sample.drop(columns=[PARTITION_COLUMN])
+        estimators.append((Path(filename).stem.removeprefix(PERIOD_PREFIX), estimator))
+    estimators.append(("DATASET COMBINADO", combined))
+    
+    with open(output_file_path, 'w', encoding='utf-8') as output_file:
+        output_file.write("ANÁLISIS EXPLORATORIO APROXIMADO - RESULTADOS DE PACIENTES\n")
+        output_file.write("="*80 + "\n")
+        output_file.write(f"Fecha de análisis: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        output_file.write(f"Muestra estratificada por archivo de origen y origen: {len(sample):,} de "
+                          f"{combined.population:,} filas (semilla {seed}).\n\n")
+        
+        for dataset_name, estimator in estimators:
+            print(f"Analizando: {dataset_name}")
+            analyze_sample(estimator, dataset_name, output_file)
+    
+    print(f"\nAnálisis aproximado completado. Resultados guardados en: {output_file_path}")
+    create_approximate_summary(resultados_path, estimators)
 
-def create_executive_summary(resultados_path):
-    """Crea un resumen ejecutivo con las métricas más importantes."""
+def create_executive_summary(resultados_path, sketches):
+    """Crea un resumen ejecutivo con las métricas más importantes, a partir de los resúmenes del análisis."""
     
     summary_path = resultados_path / "resumen_ejecutivo.txt"
     
@@ -213,46 +499,77 @@ def create_executive_summary(resultados_path):
         summary_file.write("="*50 + "\n")
         summary_file.write(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
         
-        # Analizar archivos para el resumen
-        files_info = [
-            ("data/raw/Resultados Pacientes Jan 2024 - Jul 2024.csv", "Jan 2024 - Jul 2024"),
-            ("data/raw/Resultados Pacientes Jan-Jun 2025.csv", "Jan-Jun 2025"),
-            ("data/raw/Resultados Pacientes Jul 2024 - Ene 2025.csv", "Jul 2024 - Ene 2025"),
-            ("data/processed/resultados_pacientes_combinados.csv", "COMBINADO")
-        ]
-        
         summary_file.write("MÉTRICAS PRINCIPALES POR DATASET:\n")
         summary_file.write("-" * 40 + "\n\n")
         
-        for file_path, dataset_name in files_info:
-            file_path = Path(file_path)
-            if file_path.exists():
-                try:
-                    df = pd.read_csv(file_path, low_memory=False)
-                    
-                    summary_file.write(f"{dataset_name}:\n")
-                    summary_file.write(f"  - Registros: {len(df):,}\n")
-                    summary_file.write(f"  - Columnas: {len(df.columns)}\n")
-                    
-                    if 'paciente' in df.columns:
-                        unique_patients = df['paciente'].nunique()
-                        summary_file.write(f"  - Pacientes únicos: {unique_patients:,}\n")
-                        summary_file.write(f"  - Promedio registros/paciente: {len(df)/unique_patients:.1f}\n")
-                    
-                    if 'costo_nivel_6' in df.columns:
-                        total_cost = df['costo_nivel_6'].sum()
-                        summary_file.write(f"  - Total costo nivel 6: ${total_cost:,.0f}\n")
-                    
-                    if 'monto_nivel_6' in df.columns:
-                        total_amount = df['monto_nivel_6'].sum()
-                        summary_file.write(f"  - Total monto nivel 6: ${total_amount:,.0f}\n")
-                    
-                    summary_file.write("\n")
-                    
-                except Exception as e:
-                    summary_file.write(f"  Error: {str(e)}\n\n")
+        for file_path, dataset_name, sketch in sketches:
+            if isinstance(sketch, Exception):
+                summary_file.write(f"  Error: {str(sketch)}\n\n")
+                continue
+            
+            summary_file.write(f"{'COMBINADO' if file_path == COMBINED_DATASET else dataset_name}:\n")
+            summary_file.write(f"  - Registros: {sketch.rows:,}\n")
+            summary_file.write(f"  - Columnas: {len(sketch.dtypes)}\n")
+            
+            if 'paciente' in sketch.categorical:
+                patients = sketch.categorical['paciente']
+                unique_patients = patients.nunique()
+                summary_file.write(f"  - Pacientes únicos: {unique_patients:,}{'' if patients.exact else ' (aprox.)'}\n")
+                summary_file.write(f"  - Promedio registros/paciente: {sketch.rows/unique_patients:.1f}\n")
+            
+            if 'costo_nivel_6' in sketch.numeric:
+                total_cost = sketch.numeric['costo_nivel_6'].moments.total
+                summary_file.write(f"  - Total costo nivel 6: ${total_cost:,.0f}\n")
+            
+            if 'monto_nivel_6' in sketch.numeric:
+                total_amount = sketch.numeric['monto_nivel_6'].moments.total
+                summary_file.write(f"  - Total monto nivel 6: ${total_amount:,.0f}\n")
+            
+            summary_file.write("\n")
     
     print(f"Resumen ejecutivo guardado en: {summary_path}")
 
+def create_approximate_summary(resultados_path, estimators):
+    """Resumen ejecutivo del análisis aproximado, con los intervalos de confianza de cada total."""
+    
+    summary_path = resultados_path / "resumen_ejecutivo_aproximado.txt"
+    
+    with open(summary_path, 'w', encoding='utf-8') as summary_file:
+        summary_file.write("RESUMEN EJECUTIVO APROXIMADO - ANÁLISIS DE DATOS\n")
+        summary_file.write("="*50 + "\n")
+        summary_file.write(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        summary_file.write("Totales estimados por muestreo estratificado (± IC 95%).\n\n")
+        
+        summary_file.write("MÉTRICAS PRINCIPALES POR DATASET:\n")
+        summary_file.write("-" * 40 + "\n\n")
+        
+        for dataset_name, estimator in estimators:
+            sample = estimator.sample
+            summary_file.write(f"{'COMBINADO' if dataset_name == 'DATASET COMBINADO' else dataset_name}:\n")
+            summary_file.write(f"  - Registros: {estimator.population:,}\n")
+            summary_file.write(f"  - Filas en la muestra: {len(sample):,}\n")
+            
+            if 'costo_nivel_6' in sample.columns:
+                summary_file.write(f"  - Total costo nivel 6: ${interval(*estimator.total(sample['costo_nivel_6']))}\n")
+            
+            if 'monto_nivel_6' in sample.columns:
+                summary_file.write(f"  - Total monto nivel 6: ${interval(*estimator.total(sample['monto_nivel_6']))}\n")
+            
+            summary_file.write("\n")
+    
+    print(f"Resumen ejecutivo aproximado guardado en: {summary_path}")
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Análisis exploratorio de los datos de pacientes.")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Filas por bloque al recorrer cada dataset (por defecto {DEFAULT_CHUNKSIZE:,})")
+    parser.add_argument("--aproximado", "--approximate", action="store_true",
+                        help="Analiza una muestra estratificada del dataset combinado, con intervalos de confianza")
+    parser.add_argument("--tamano-muestra", "--sample-size", type=int, default=DEFAULT_SAMPLE_SIZE,
+                        help=f"Filas de la muestra del modo aproximado (por defecto {DEFAULT_SAMPLE_SIZE:,})")
+    parser.add_argument("--semilla", "--seed", type=int, default=SAMPLE_SEED,
+                        help=f"Semilla del sorteo de la muestra (por defecto {SAMPLE_SEED})")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    main(chunksize=args.chunksize, approximate=args.aproximado, sample_size=args.tamano_muestra,
+         seed=args.semilla, profile=args.perfil)
@@ -1,87 +1,262 @@
 #!/usr/bin/env python3
 """
 Script para unir archivos CSV de resultados de pacientes.
-Combina los archivos de diferentes períodos en un solo archivo procesado.
+Combina los archivos de diferentes períodos en un dataset columnar (Parquet) particionado
+por archivo de origen. El CSV combinado se genera solo como exportación opcional.
+
+Cada archivo de período se escribe directamente en su partición, sin concatenar todo en memoria.
+Con --streaming cada archivo se lee por bloques, de modo que la memoria usada no crece con
+el tamaño ni con el número de archivos de período.
+Con --workers N los archivos de período se procesan en paralelo en un pool de procesos.
+El encoding de cada archivo se detecta con una muestra de bytes antes de parsearlo y queda
+registrado en el manifiesto de ingesta.
+
+La ingesta es incremental: el manifiesto guarda tamaño, fecha de modificación y hash de cada
+archivo, y solo se procesan los archivos nuevos o modificados. --completo reconstruye todo.
 """
 
+import argparse
+import shutil
+import sys
 import pandas as pd
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
-def main():
-    # Definir las rutas de los archivos
-    base_path = Path("data/raw")
-    output_path = Path("data/processed")
-    
-    # Lista de archivos a unir
-    files_to_join = [
-        "Resultados Pacientes Jan 2024 - Jul 2024.csv",
-        "Resultados Pacientes Jan-Jun 2025.csv", 
-        "Resultados Pacientes Jul 2024 - Ene 2025.csv"
-    ]
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import (
+    COMBINED_DATASET, PartitionWriter, csv_export_path, export_csv, file_sha256, partition_name,
+    partition_path, read_csv_file, read_manifest, write_manifest
+)
+from utils.encoding import FALLBACK_ENCODING, detect_encoding
+from utils.profiling import add_profile_argument, profiled
+from utils.schema import normalize_money
+
+DEFAULT_CHUNKSIZE = 250_000
+PERIOD_FILE_PATTERN = "Resultados Pacientes *.csv"
+
+def discover_period_files(base_path, known_files):
+    """Devuelve los archivos conocidos seguidos de cualquier archivo de período nuevo en data/raw."""
+    new_files = sorted(f.name for f in base_path.glob(PERIOD_FILE_PATTERN) if f.name not in known_files)
+    return list(known_files) + new_files
+
+def file_fingerprint(file_path):
+    """Tamaño y fecha de modificación de un archivo, para detectar cambios sin leerlo."""
+    stat = file_path.stat()
+    return {'tamano_bytes': stat.st_size, 'mtime': stat.st_mtime}
+
+def plan_ingestion(base_path, filenames, manifest, cents=False):
+    """
+    Separa los archivos en (pendientes, sin cambios) comparando con el manifiesto.
+    El hash solo se calcula cuando cambian el tamaño o la fecha de modificación.
+    Un archivo guardado con otra representación de montos (pesos o centavos) se vuelve a procesar,
+    para que todas las particiones usen la misma.
+    """
+    pending = []
+    unchanged = {}
+    for filename in filenames:
+        file_path = base_path / filename
+        entry = manifest.get(filename)
+        fingerprint = file_fingerprint(file_path)
+        if (entry is None or not partition_path(COMBINED_DATASET, filename).exists()
+                or entry.get('centavos', False) != cents):
+            pending.append((filename, fingerprint, None))
+            continue
+        if (entry.get('tamano_bytes'), entry.get('mtime')) == (fingerprint['tamano_bytes'], fingerprint['mtime']):
+            unchanged[filename] = entry
+            continue
+        sha256 = file_sha256(file_path)
+        if sha256 == entry.get('sha256'):
+            # Mismo contenido con otra fecha de modificación: solo se actualiza el manifiesto
+            unchanged[filename] = {**entry, **fingerprint}
+        else:
+            pending.append((filename, fingerprint, sha256))
+    return pending, unchanged
+
+def ingest_period_file(file_path, filename, chunksize=None, sha256=None, cents=False):
+    """
+    Lee un archivo de período (completo o por bloques) y lo escribe en su partición.
+    Se ejecuta en un proceso del pool cuando hay varios workers, por lo que los mensajes
+    se devuelven en 'log' en lugar de imprimirse. El hash se calcula aquí si no se conoce.
+    Con cents los montos se guardan como centavos enteros (Int64).
+    """
+    log = [f"Leyendo: {filename}"]
     
-    # Crear directorio de salida si no existe
-    output_path.mkdir(parents=True, exist_ok=True)
+    # Elegir el encoding antes del parseo completo
+    detected = detect_encoding(file_path)
+    log.append(f"  - Encoding detectado: {detected}")
     
-    # Lista para almacenar todos los DataFrames
-    dataframes = []
+    # latin-1 queda como respaldo por si la muestra no alcanzó un byte inválido
+    encodings = [detected] if detected == FALLBACK_ENCODING else [detected, FALLBACK_ENCODING]
+    for encoding in encodings:
+        try:
+            columns = None
+            with PartitionWriter(COMBINED_DATASET, filename) as writer:
+                if chunksize:
+                    reader = read_csv_file(file_path, encoding=encoding, on_bad_lines='skip', chunksize=chunksize)
+                else:
+                    reader = [read_csv_file(file_path, encoding=encoding, on_bad_lines='skip')]
+                for chunk in reader:
+                    # Agregar una columna para identificar el archivo de origen
+                    chunk['archivo_origen'] = pd.Series(filename, index=chunk.index, dtype='category')
+                    if cents:
+                        chunk = normalize_money(chunk, cents=True)
+                    writer.write(chunk)
+                    if columns is None:
+                        columns = list(chunk.columns)
+            log.append(f"  - Filas leídas: {writer.rows}")
+            log.append(f"  - Columnas: {columns}")
+            return {'archivo': filename, 'filas': writer.rows, 'columnas': columns,
+                    'encoding': encoding, 'sha256': sha256 or file_sha256(file_path), 'log': log}
+        except Exception as e:
+            # La partición incompleta se descarta; se intenta con el encoding de respaldo
+            log.append(f"Error leyendo {filename} ({encoding}): {e}")
+    return {'archivo': filename, 'filas': None, 'columnas': None, 'encoding': None, 'log': log}
+
+def join_partitions(base_path, files_to_join, chunksize=None, workers=1, export_csv_copy=False, full_rebuild=False,
+                    cents=False):
+    """
+    Une los archivos escribiendo cada uno directamente en su partición.
+    Solo se procesan los archivos nuevos o modificados según el manifiesto de ingesta.
+    Con chunksize la memoria queda acotada por el tamaño de bloque; con workers > 1 los
+    archivos se procesan en paralelo y los resultados se reportan en el orden de files_to_join.
+    Con cents los montos se guardan como centavos enteros.
+    """
+    mode = f"por bloques de {chunksize:,} filas" if chunksize else "por archivo completo"
+    print(f"Iniciando proceso de unión de archivos CSV {mode} con {workers} proceso(s)...")
+    print(f"Montos guardados en {'centavos enteros' if cents else 'pesos'}")
     
-    print("Iniciando proceso de unión de archivos CSV...")
+    if full_rebuild and COMBINED_DATASET.exists():
+        # Reconstruir el dataset desde cero
+        shutil.rmtree(COMBINED_DATASET)
+    COMBINED_DATASET.mkdir(parents=True, exist_ok=True)
+    previous_manifest = {} if full_rebuild else read_manifest()
     
-    # Leer cada archivo
+    available_files = []
     for filename in files_to_join:
-        file_path = base_path / filename
-        if file_path.exists():
-            print(f"Leyendo: {filename}")
-            try:
-                # Leer el CSV con encoding utf-8 y manejo de errores
-                df = pd.read_csv(file_path, encoding='utf-8', on_bad_lines='skip')
-                print(f"  - Filas leídas: {len(df)}")
-                print(f"  - Columnas: {list(df.columns)}")
-                
-                # Agregar una columna para identificar el archivo de origen
-                df['archivo_origen'] = filename
-                
-                dataframes.append(df)
-                
-            except Exception as e:
-                print(f"Error leyendo {filename}: {e}")
-                # Intentar con encoding diferente
-                try:
-                    df = pd.read_csv(file_path, encoding='latin-1', on_bad_lines='skip')
-                    print(f"  - Filas leídas (latin-1): {len(df)}")
-                    df['archivo_origen'] = filename
-                    dataframes.append(df)
-                except Exception as e2:
-                    print(f"Error con encoding alternativo: {e2}")
+        if (base_path / filename).exists():
+            available_files.append(filename)
         else:
             print(f"Archivo no encontrado: {filename}")
     
-    if not dataframes:
-        print("No se pudieron leer archivos. Verificar que los archivos existan.")
-        return
+    pending, unchanged = plan_ingestion(base_path, available_files, previous_manifest, cents)
+    for filename in unchanged:
+        print(f"Sin cambios (se conserva la partición): {filename}")
     
-    # Unir todos los DataFrames
-    print("\nUniendo archivos...")
-    combined_df = pd.concat(dataframes, ignore_index=True)
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as executor:
+            futures = [executor.submit(ingest_period_file, base_path / filename, filename, chunksize, sha256, cents)
+                       for filename, _, sha256 in pending]
+            # Recolectar en orden fijo, independientemente de cuál termine primero
+            results = [future.result() for future in futures]
+    else:
+        results = [ingest_period_file(base_path / filename, filename, chunksize, sha256, cents)
+                   for filename, _, sha256 in pending]
     
-    print(f"Total de filas combinadas: {len(combined_df)}")
-    print(f"Total de columnas: {len(combined_df.columns)}")
+    ingested = {}
+    for (filename, fingerprint, _), result in zip(pending, results):
+        print("\n".join(result['log']))
+        if result['filas'] is not None:
+            ingested[filename] = {
+                'particion': partition_name(filename),
+                'encoding': result['encoding'],
+                'filas': result['filas'],
+                'columnas': result['columnas'],
+                **fingerprint,
+                'sha256': result['sha256'],
+                'centavos': cents
+            }
     
-    # Guardar el archivo combinado
-    output_file = output_path / "resultados_pacientes_combinados.csv"
-    combined_df.to_csv(output_file, index=False, encoding='utf-8')
+    # Manifiesto final en el orden de files_to_join
+    manifest = {}
+    for filename in available_files:
+        entry = ingested.get(filename) or unchanged.get(filename)
+        if entry is None:
+            # Archivo presente que no se pudo leer: la partición anterior se conserva solo si
+            # guarda los montos en la misma representación que esta ejecución
+            previous = previous_manifest.get(filename)
+            if (previous and previous.get('centavos', False) == cents
+                    and partition_path(COMBINED_DATASET, filename).exists()):
+                print(f"Se conserva la partición anterior de: {filename}")
+                entry = previous
+        if entry:
+            manifest[filename] = entry
+    # Eliminar las particiones de archivos retirados de data/raw o que no se pudieron leer
+    current = {partition_name(filename) for filename in manifest}
+    for partition_dir in sorted(COMBINED_DATASET.iterdir()):
+        if partition_dir.is_dir() and not partition_dir.name.startswith('.') and partition_dir.name not in current:
+            shutil.rmtree(partition_dir)
+            print(f"Partición eliminada (archivo retirado o sin leer): {partition_dir.name}")
+    
+    if not manifest:
+        print("No se pudieron leer archivos. Verificar que los archivos existan.")
+        sys.exit(1)
     
-    print(f"\nArchivo guardado exitosamente en: {output_file}")
+    manifest_file = write_manifest(manifest)
+    row_counts = {filename: entry['filas'] for filename, entry in manifest.items()}
+    columns = next(iter(manifest.values()))['columnas']
+    print(f"\nArchivos procesados en esta ejecución: {len(ingested)} de {len(available_files)}")
+    
+    print(f"\nDataset guardado exitosamente en: {COMBINED_DATASET}")
+    print(f"Manifiesto de ingesta guardado en: {manifest_file}")
+    print(f"Total de filas combinadas: {sum(row_counts.values())}")
+    print(f"Total de columnas: {len(columns)}")
+    
+    # Exportación CSV opcional, en el mismo orden de files_to_join
+    if export_csv_copy:
+        csv_file = export_csv(COMBINED_DATASET, csv_export_path(COMBINED_DATASET),
+                              partition_order=list(row_counts))
+        print(f"Exportación CSV guardada en: {csv_file}")
     
     # Mostrar información adicional
     print("\nInformación del dataset combinado:")
-    print(f"- Forma del dataset: {combined_df.shape}")
-    print(f"- Columnas: {list(combined_df.columns)}")
+    print(f"- Forma del dataset: ({sum(row_counts.values())}, {len(columns)})")
+    print(f"- Columnas: {columns}")
     
-    # Mostrar conteo por archivo de origen
+    # Mostrar conteo y encoding por archivo de origen
     print("\nConteo por archivo de origen:")
-    print(combined_df['archivo_origen'].value_counts())
+    for filename, entry in manifest.items():
+        status = "nuevo/actualizado" if filename in ingested else "sin cambios"
+        print(f"  - {filename}: {entry['filas']:,} filas (encoding: {entry['encoding']}, {status})")
+
+@profiled
+def main(export_csv_copy=False, streaming=False, chunksize=DEFAULT_CHUNKSIZE, workers=1, full_rebuild=False,
+         cents=False):
+    # Definir las rutas de los archivos
+    base_path = Path("data/raw")
+    output_path = Path("data/processed")
+    
+    # Lista de archivos a unir (más cualquier archivo de período nuevo en data/raw)
+    files_to_join = discover_period_files(base_path, [
+        "Resultados Pacientes Jan 2024 - Jul 2024.csv",
+        "Resultados Pacientes Jan-Jun 2025.csv",
+        "Resultados Pacientes Jul 2024 - Ene 2025.csv"
+    ])
+    
+    # Crear directorio de salida si no existe
+    output_path.mkdir(parents=True, exist_ok=True)
+    
+    join_partitions(base_path, files_to_join, chunksize if streaming else None, workers, export_csv_copy,
+                    full_rebuild, cents)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Une los archivos CSV de resultados de pacientes.")
+    parser.add_argument("--exportar-csv", action="store_true",
+                        help="Genera además resultados_pacientes_combinados.csv")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Lee cada archivo por bloques con memoria acotada")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Filas por bloque en modo streaming (por defecto {DEFAULT_CHUNKSIZE:,})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos para leer archivos de período en paralelo (0 = todos los núcleos)")
+    parser.add_argument("--completo", action="store_true",
+                        help="Ignora el manifiesto y reconstruye todas las particiones")
+    parser.add_argument("--centavos", action="store_true",
+                        help="Guarda los montos como centavos enteros (sumas exactas); cambiar la opción reprocesa los archivos")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    main(export_csv_copy=args.exportar_csv, streaming=args.streaming, chunksize=args.chunksize,
+         workers=workers, full_rebuild=args.completo, cents=args.centavos, profile=args.perfil)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Script para resolver la identidad de los pacientes a partir del dataset combinado.
+Une paciente, expediente e IAN en componentes conexas y guarda una tabla compacta por paciente
+(identidad resuelta, número de expedientes y de IAN) que reutilizan los scripts de análisis.
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import COMBINED_DATASET, IDENTITY_TABLE, dataset_exists, manifest_signature, read_dataset
+from utils.identity import IDENTITY_COLUMNS, resolve_identities, write_identities
+from utils.profiling import add_profile_argument, profiled
+
+@profiled
+def main():
+    print("Iniciando resolución de identidades de pacientes...")
+    
+    if not dataset_exists(COMBINED_DATASET):
+        print("Error: No se encontró el dataset combinado. Ejecuta primero join.py")
+        sys.exit(1)
+    
+    print("Leyendo dataset combinado...")
+    df = read_dataset(COMBINED_DATASET, columns=IDENTITY_COLUMNS)
+    print(f"Registros leídos: {len(df):,}")
+    
+    identities = resolve_identities(df)
+    write_identities(identities, manifest_signature())
+    
+    shared = identities[identities['pacientes_en_identidad'] > 1]
+    print(f"\nTabla de identidades guardada en: {IDENTITY_TABLE}")
+    print(f"Pacientes: {len(identities):,}")
+    print(f"Identidades resueltas: {identities['identidad'].nunique():,}")
+    print(f"Identidades que agrupan más de un paciente: {shared['identidad'].nunique():,} ({len(shared):,} pacientes)")
+    print(f"Pacientes con múltiples expedientes: {(identities['num_expedientes'] > 1).sum():,}")
+    print(f"Pacientes con múltiples IAN: {(identities['num_ians'] > 1).sum():,}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resuelve las identidades de pacientes (paciente, expediente, IAN).")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    main(profile=args.perfil)
@@ -4,46 +4,158 @@ Script para estandarizar expedientes eliminando el prefijo "000" y generar un da
 Esto resuelve el problema de pacientes con múltiples expedientes debido a formatos inconsistentes.
 """
 
+import argparse
+import shutil
+import sys
+from contextlib import ExitStack
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
-def standardize_expedient_number(expedient, ian):
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import (
+    COMBINED_DATASET, EXPEDIENT_MAPPING, PARTITION_COLUMN, STANDARDIZED_DATASET, PartitionWriter,
+    csv_export_path, dataset_exists, dataset_size_bytes, export_csv, iter_dataset, read_dataset, stores_cents,
+    write_dataset
+)
+from utils.expedients import (
+    empty_mapping, read_expedient_mapping, standardize_expedient_number, standardize_expedients,
+    standardize_with_mapping, write_expedient_mapping
+)
+from utils.profiling import add_profile_argument, profiled
+from utils.standardization_stats import StandardizationStats
+
+DEFAULT_CHUNKSIZE = 250_000
+
+def verify_parity(df, mapping=None):
+    """
+    Compara la versión vectorizada y la memoizada por pares (usando mapping si se indica)
+    con la función fila por fila sobre todo el dataset.
+    Devuelve las filas que difieren (vacío si todas producen el mismo resultado).
+    """
+    expected = df.apply(
+        lambda row: standardize_expedient_number(row['n_expediente_hosp'], row['ian_expediente_hosp']), axis=1
+    ).astype('string')
+    result = standardize_expedients(df['n_expediente_hosp'], df['ian_expediente_hosp'])
+    memoized, _ = standardize_with_mapping(df['n_expediente_hosp'], df['ian_expediente_hosp'], mapping)
+    different = ((expected != result) | (expected != memoized)).fillna(True)
+    return pd.DataFrame({
+        'n_expediente_hosp': df['n_expediente_hosp'][different],
+        'ian_expediente_hosp': df['ian_expediente_hosp'][different],
+        'esperado': expected[different],
+        'vectorizado': result[different],
+        'memoizado': memoized[different]
+    })
+
+def check_parity():
+    """Verifica la paridad de la estandarización vectorizada sobre el dataset combinado."""
+    if not dataset_exists(COMBINED_DATASET):
+        print("Error: No se encontró el dataset combinado. Ejecuta primero join.py")
+        return False
+    
+    df = read_dataset(COMBINED_DATASET, columns=['n_expediente_hosp', 'ian_expediente_hosp'])
+    mapping = read_expedient_mapping()
+    print(f"Verificando paridad sobre {len(df):,} registros (mapa de expedientes: {len(mapping):,} pares)...")
+    mismatches = verify_parity(df, mapping)
+    if len(mismatches) == 0:
+        print("Paridad verificada: las versiones vectorizada y memoizada producen el mismo resultado en todas las filas")
+        return True
+    
+    print(f"Diferencias encontradas: {len(mismatches):,} filas")
+    print(mismatches.head(10).to_string(index=False))
+    return False
+
+def standardize_chunk(df, mapping, stats):
     """
-    Si el expediente es igual al IAN (o empieza igual que el IAN), lo deja igual.
-    Si no, agrega el prefijo '000' (si no lo tiene).
-    Siempre devuelve string.
+    Estandariza los expedientes de un bloque en el mismo DataFrame y acumula sus métricas.
+    Devuelve los pares (expediente, IAN) que no estaban en el mapa.
     """
-    if pd.isna(expedient) or expedient == '':
-        return ''
-    expedient_str = str(expedient).strip()
-    ian_str = str(ian).strip() if not pd.isna(ian) else ''
-    # Si el expediente empieza con el IAN o es igual al IAN, lo dejamos igual
-    if ian_str and (expedient_str == ian_str or expedient_str.startswith(ian_str)):
-        return expedient_str
-    # Si ya empieza con '000', lo dejamos igual
-    if expedient_str.startswith('000'):
-        return expedient_str
-    # Si no, agregamos '000'
-    return '000' + expedient_str
+    # La regla se evalúa una vez por par (expediente, IAN); los pares del mapa guardado se reutilizan
+    expedients_original = df['n_expediente_hosp']
+    standardized, new_pairs = standardize_with_mapping(expedients_original, df['ian_expediente_hosp'], mapping)
+    stats.update(df['paciente'], expedients_original, standardized)
+    
+    # Se reemplaza la columna en el mismo DataFrame conservando la original
+    df['n_expediente_hosp_original'] = expedients_original
+    df['n_expediente_hosp'] = standardized
+    return new_pairs
 
-def analyze_and_standardize():
-    """Analiza y estandariza los expedientes."""
+def standardize_in_memory(mapping, stats):
+    """Estandariza el dataset combinado completo en memoria y lo guarda."""
+    print("Leyendo dataset combinado...")
+    # Los montos se conservan en la misma representación que el dataset combinado
+    df = read_dataset(COMBINED_DATASET, cents=stores_cents(COMBINED_DATASET))
+    print(f"Total de registros: {len(df):,}")
+    
+    new_pairs = standardize_chunk(df, mapping, stats)
+    write_dataset(df, STANDARDIZED_DATASET)
+    return new_pairs
+
+def standardize_streaming(mapping, stats, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Estandariza el dataset combinado por bloques y escribe cada bloque en su partición,
+    de modo que la memoria queda acotada por chunksize y no por el tamaño del dataset.
+    Si hay un error el dataset estandarizado anterior queda intacto.
+    """
+    print(f"Leyendo dataset combinado por bloques de {chunksize:,} filas...")
+    STANDARDIZED_DATASET.mkdir(parents=True, exist_ok=True)
+    
+    new_pairs = []
+    with ExitStack() as stack:
+        # Un escritor por partición; al final cada uno reemplaza solo su partición
+        # (o todos se descartan si hay un error)
+        writers = {}
+        for chunk in iter_dataset(COMBINED_DATASET, chunksize=chunksize, cents=stores_cents(COMBINED_DATASET)):
+            pairs = standardize_chunk(chunk, mapping, stats)
+            if len(pairs) > 0:
+                # Los pares nuevos se reutilizan en los bloques siguientes
+                mapping = pd.concat([mapping, pairs], ignore_index=True)
+                new_pairs.append(pairs)
+            for value, part in chunk.groupby(PARTITION_COLUMN, sort=False, observed=True):
+                if value not in writers:
+                    writers[value] = stack.enter_context(PartitionWriter(STANDARDIZED_DATASET, value))
+                writers[value].write(part)
+    
+    # Con todas las particiones confirmadas, eliminar las de archivos que ya no están en el dataset combinado
+    current = {writer.target_dir.name for writer in writers.values()}
+    for partition_dir in STANDARDIZED_DATASET.iterdir():
+        if partition_dir.is_dir() and not partition_dir.name.startswith('.') and partition_dir.name not in current:
+            shutil.rmtree(partition_dir)
+    print(f"Total de registros: {stats.rows:,}")
+    
+    return pd.concat(new_pairs, ignore_index=True) if new_pairs else empty_mapping()
+
+@profiled
+def analyze_and_standardize(export_csv_copy=False, chunksize=None):
+    """
+    Analiza y estandariza los expedientes.
+    Con chunksize el dataset se procesa por bloques sin cargarlo completo en memoria.
+    """
     
     # Crear directorio de resultados si no existe
     resultados_path = Path("resultados")
     resultados_path.mkdir(exist_ok=True)
     
-    # Leer el archivo combinado
-    combined_file = Path("data/processed/resultados_pacientes_combinados.csv")
-    if not combined_file.exists():
-        print("Error: No se encontró el archivo combinado. Ejecuta primero join.py")
-        return
+    # Leer el dataset combinado
+    if not dataset_exists(COMBINED_DATASET):
+        print("Error: No se encontró el dataset combinado. Ejecuta primero join.py")
+        sys.exit(1)
     
-    print("Leyendo archivo combinado...")
-    df = pd.read_csv(combined_file, low_memory=False)
-    print(f"Total de registros: {len(df):,}")
+    # Todas las métricas de los reportes salen de conteos agrupados, sin copiar el dataset
+    mapping = read_expedient_mapping()
+    stats = StandardizationStats()
+    if chunksize:
+        new_pairs = standardize_streaming(mapping, stats, chunksize)
+    else:
+        new_pairs = standardize_in_memory(mapping, stats)
+    if len(new_pairs) > 0:
+        mapping = pd.concat([mapping, new_pairs], ignore_index=True)
+        write_expedient_mapping(mapping)
+    summary = stats.summary()
+    total_rows = summary['registros']
     
     # Crear archivo de análisis
     output_file = resultados_path / "estandarizacion_expedientes.txt"
@@ -59,15 +171,15 @@ def analyze_and_standardize():
         f.write("-" * 50 + "\n")
         
         # Contar expedientes únicos
-        expedients_before = df['n_expediente_hosp'].nunique()
+        expedients_before = summary['expedientes_antes']
         f.write(f"Expedientes únicos antes: {expedients_before:,}\n")
         
         # Contar pacientes únicos
-        patients_before = df['paciente'].nunique()
+        patients_before = summary['pacientes']
         f.write(f"Pacientes únicos antes: {patients_before:,}\n")
         
         # Contar combinaciones paciente + expediente
-        patient_expedient_before = df.groupby(['paciente', 'n_expediente_hosp']).size().reset_index().shape[0]
+        patient_expedient_before = summary['combinaciones_antes']
         f.write(f"Combinaciones paciente + expediente antes: {patient_expedient_before:,}\n\n")
         
         # 2. Análisis de patrones en expedientes
@@ -75,55 +187,44 @@ def analyze_and_standardize():
         f.write("-" * 50 + "\n")
         
         # Expedientes que empiezan con "000"
-        expedients_with_000 = df[df['n_expediente_hosp'].astype(str).str.startswith('000', na=False)]
-        expedients_without_000 = df[~df['n_expediente_hosp'].astype(str).str.startswith('000', na=False)]
+        rows_with_000 = summary['filas_con_000']
+        rows_without_000 = summary['filas_sin_000']
         
-        f.write(f"Expedientes que empiezan con '000': {len(expedients_with_000):,} ({len(expedients_with_000)/len(df)*100:.2f}%)\n")
-        f.write(f"Expedientes sin '000': {len(expedients_without_000):,} ({len(expedients_without_000)/len(df)*100:.2f}%)\n\n")
+        f.write(f"Expedientes que empiezan con '000': {rows_with_000:,} ({rows_with_000/total_rows*100:.2f}%)\n")
+        f.write(f"Expedientes sin '000': {rows_without_000:,} ({rows_without_000/total_rows*100:.2f}%)\n\n")
         
         # Mostrar algunos ejemplos
         f.write("Ejemplos de expedientes con '000':\n")
-        examples_with_000 = expedients_with_000['n_expediente_hosp'].unique()[:10]
-        for exp in examples_with_000:
+        for exp in summary['ejemplos_con_000']:
             f.write(f"  - {exp}\n")
         f.write("\n")
         
         f.write("Ejemplos de expedientes sin '000':\n")
-        examples_without_000 = expedients_without_000['n_expediente_hosp'].unique()[:10]
-        for exp in examples_without_000:
+        for exp in summary['ejemplos_sin_000']:
             f.write(f"  - {exp}\n")
         f.write("\n")
         
         # 3. Estandarización
         f.write("3. PROCESO DE ESTANDARIZACIÓN\n")
         f.write("-" * 50 + "\n")
-        
-        # Crear copia del dataframe para estandarizar
-        df_standardized = df.copy()
-        
-        # Aplicar estandarización
-        df_standardized['n_expediente_hosp_original'] = df_standardized['n_expediente_hosp']
-        df_standardized['n_expediente_hosp'] = df_standardized.apply(
-            lambda row: standardize_expedient_number(row['n_expediente_hosp'], row['ian_expediente_hosp']), axis=1
-        )
-        # Convertir a string explícitamente
-        df_standardized['n_expediente_hosp'] = df_standardized['n_expediente_hosp'].astype(str)
+        f.write(f"Pares (expediente, IAN) en el mapa: {len(mapping):,} ({len(new_pairs):,} nuevos en esta ejecución)\n")
+        f.write(f"Mapa de expedientes guardado en: {EXPEDIENT_MAPPING}\n")
         
         # Contar cambios realizados
-        changes_made = (df['n_expediente_hosp'] != df_standardized['n_expediente_hosp']).sum()
-        f.write(f"Expedientes estandarizados: {changes_made:,} ({changes_made/len(df)*100:.2f}%)\n\n")
+        changes_made = summary['cambios']
+        f.write(f"Expedientes estandarizados: {changes_made:,} ({changes_made/total_rows*100:.2f}%)\n\n")
         
         # 4. Análisis después de la estandarización
         f.write("4. ANÁLISIS DESPUÉS DE LA ESTANDARIZACIÓN\n")
         f.write("-" * 50 + "\n")
         
         # Contar expedientes únicos después
-        expedients_after = df_standardized['n_expediente_hosp'].nunique()
+        expedients_after = summary['expedientes_despues']
         f.write(f"Expedientes únicos después: {expedients_after:,}\n")
         f.write(f"Reducción en expedientes únicos: {expedients_before - expedients_after:,} ({((expedients_before-expedients_after)/expedients_before)*100:.2f}%)\n\n")
         
         # Contar combinaciones paciente + expediente después
-        patient_expedient_after = df_standardized.groupby(['paciente', 'n_expediente_hosp']).size().reset_index().shape[0]
+        patient_expedient_after = summary['combinaciones_despues']
         f.write(f"Combinaciones paciente + expediente después: {patient_expedient_after:,}\n")
         f.write(f"Reducción en combinaciones: {patient_expedient_before - patient_expedient_after:,} ({((patient_expedient_before-patient_expedient_after)/patient_expedient_before)*100:.2f}%)\n\n")
         
@@ -132,8 +233,7 @@ def analyze_and_standardize():
         f.write("-" * 50 + "\n")
         
         # Contar pacientes con múltiples expedientes después de estandarización
-        patient_expedient_counts_after = df_standardized.groupby('paciente')['n_expediente_hosp'].nunique()
-        patients_multiple_after = patient_expedient_counts_after[patient_expedient_counts_after > 1]
+        patients_multiple_after = stats.patients_with_multiple_expedients()
         
         f.write(f"Pacientes con múltiples expedientes después: {len(patients_multiple_after):,}\n")
         f.write(f"Porcentaje del total: {len(patients_multiple_after)/patients_before*100:.2f}%\n\n")
@@ -141,25 +241,23 @@ def analyze_and_standardize():
         # Mostrar algunos ejemplos de pacientes que aún tienen múltiples expedientes
         if len(patients_multiple_after) > 0:
             f.write("Ejemplos de pacientes que aún tienen múltiples expedientes:\n")
-            for i, (patient, num_expedients) in enumerate(patients_multiple_after.head(5).items()):
-                patient_data = df_standardized[df_standardized['paciente'] == patient]
-                expedients = patient_data['n_expediente_hosp'].unique()
-                f.write(f"  - Paciente {patient}: {num_expedients} expedientes {list(expedients)}\n")
+            for patient, num_expedients in patients_multiple_after.head(5).items():
+                expedients = stats.patient_expedients(patient)
+                f.write(f"  - Paciente {patient}: {num_expedients} expedientes {expedients}\n")
             f.write("\n")
         
         # 6. Guardar dataset estandarizado
         f.write("6. GUARDADO DE DATASET ESTANDARIZADO\n")
         f.write("-" * 50 + "\n")
         
-        # Guardar en processed
-        output_path = Path("data/processed")
-        output_path.mkdir(exist_ok=True)
+        f.write(f"Dataset estandarizado guardado en: {STANDARDIZED_DATASET}\n")
+        f.write(f"Tamaño del dataset: {dataset_size_bytes(STANDARDIZED_DATASET) / 1024**2:.2f} MB\n")
         
-        standardized_file = output_path / "resultados_pacientes_estandarizados.csv"
-        df_standardized.to_csv(standardized_file, index=False, encoding='utf-8')
-        
-        f.write(f"Dataset estandarizado guardado en: {standardized_file}\n")
-        f.write(f"Tamaño del archivo: {standardized_file.stat().st_size / 1024**2:.2f} MB\n\n")
+        # Exportación CSV opcional
+        if export_csv_copy:
+            csv_file = export_csv(STANDARDIZED_DATASET, csv_export_path(STANDARDIZED_DATASET))
+            f.write(f"Exportación CSV guardada en: {csv_file}\n")
+        f.write("\n")
         
         # 7. Resumen de mejoras
         f.write("7. RESUMEN DE MEJORAS\n")
@@ -175,13 +273,13 @@ def analyze_and_standardize():
         f.write("Estandarización completada exitosamente.\n")
     
     print(f"Análisis de estandarización completado. Resultados guardados en: {output_file}")
-    print(f"Dataset estandarizado guardado en: data/processed/resultados_pacientes_estandarizados.csv")
+    print(f"Dataset estandarizado guardado en: {STANDARDIZED_DATASET}")
     
     # Crear también un resumen de los cambios
-    create_standardization_summary(df, df_standardized, resultados_path)
+    create_standardization_summary(summary, resultados_path)
 
-def create_standardization_summary(df_original, df_standardized, resultados_path):
-    """Crea un resumen de los cambios realizados."""
+def create_standardization_summary(summary, resultados_path):
+    """Crea un resumen de los cambios realizados a partir de las métricas de StandardizationStats."""
     
     summary_file = resultados_path / "resumen_estandarizacion.txt"
     
@@ -193,31 +291,41 @@ def create_standardization_summary(df_original, df_standardized, resultados_path
         # Métricas principales
         f.write("MÉTRICAS PRINCIPALES:\n")
         f.write("-" * 30 + "\n")
-        f.write(f"Registros totales: {len(df_original):,}\n")
-        f.write(f"Expedientes únicos antes: {df_original['n_expediente_hosp'].nunique():,}\n")
-        f.write(f"Expedientes únicos después: {df_standardized['n_expediente_hosp'].nunique():,}\n")
-        f.write(f"Pacientes únicos: {df_original['paciente'].nunique():,}\n")
-        f.write(f"Combinaciones paciente+expediente antes: {df_original.groupby(['paciente', 'n_expediente_hosp']).size().reset_index().shape[0]:,}\n")
-        f.write(f"Combinaciones paciente+expediente después: {df_standardized.groupby(['paciente', 'n_expediente_hosp']).size().reset_index().shape[0]:,}\n\n")
+        f.write(f"Registros totales: {summary['registros']:,}\n")
+        f.write(f"Expedientes únicos antes: {summary['expedientes_antes']:,}\n")
+        f.write(f"Expedientes únicos después: {summary['expedientes_despues']:,}\n")
+        f.write(f"Pacientes únicos: {summary['pacientes']:,}\n")
+        f.write(f"Combinaciones paciente+expediente antes: {summary['combinaciones_antes']:,}\n")
+        f.write(f"Combinaciones paciente+expediente después: {summary['combinaciones_despues']:,}\n\n")
         
         # Cambios realizados
-        changes = (df_original['n_expediente_hosp'] != df_standardized['n_expediente_hosp']).sum()
-        f.write(f"Expedientes estandarizados: {changes:,} ({changes/len(df_original)*100:.2f}%)\n")
+        changes = summary['cambios']
+        f.write(f"Expedientes estandarizados: {changes:,} ({changes/summary['registros']*100:.2f}%)\n")
         
         # Ejemplos de cambios
         f.write("\nEJEMPLOS DE CAMBIOS:\n")
         f.write("-" * 30 + "\n")
         
         # Mostrar algunos ejemplos de expedientes que cambiaron
-        changed_mask = df_original['n_expediente_hosp'] != df_standardized['n_expediente_hosp']
-        changed_examples = df_original[changed_mask].head(10)
-        
-        for _, row in changed_examples.iterrows():
-            original = row['n_expediente_hosp']
-            standardized = df_standardized.loc[row.name, 'n_expediente_hosp']
+        for original, standardized in summary['ejemplos_cambios']:
             f.write(f"  {original} → {standardized}\n")
     
     print(f"Resumen de estandarización guardado en: {summary_file}")
 
 if __name__ == "__main__":
-    analyze_and_standardize() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Estandariza los expedientes del dataset combinado.")
+    parser.add_argument("--exportar-csv", action="store_true",
+                        help="Genera además resultados_pacientes_estandarizados.csv")
+    parser.add_argument("--verificar-paridad", action="store_true",
+                        help="Compara la estandarización vectorizada con la versión fila por fila y termina")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Procesa el dataset combinado por bloques con memoria acotada")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help=f"Filas por bloque en modo streaming (por defecto {DEFAULT_CHUNKSIZE:,})")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    if args.verificar_paridad:
+        sys.exit(0 if check_parity() else 1)
+    analyze_and_standardize(export_csv_copy=args.exportar_csv,
+                            chunksize=args.chunksize if args.streaming else None,
+                            profile=args.perfil) 
\ No newline at end of file
@@ -4,11 +4,28 @@ Script para generar resumen de pacientes y comparar con el archivo de resumen or
 Suma los totales del archivo combinado y genera estadísticas comparables.
 """
 
+import argparse
+import sys
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
 
+# Agregar el directorio scripts al path para importar módulos compartidos
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.data_store import COMBINED_DATASET, dataset_exists, manifest_signature, read_dataset, read_manifest, read_summary_file
+from utils.episodes import (
+    EPISODE_SOURCE_COLUMNS, aggregate_episodes, complete_episodes, update_episodes, write_episodes
+)
+from utils.profiling import add_profile_argument, profiled
+from utils.reconciliation import reconcile, status_counts
+
+# Columnas que usa el resumen
+COLUMNS = EPISODE_SOURCE_COLUMNS
+SUMMARY_COLUMNS = ['paciente', 'gasto_nivel_6', 'gasto_nivel_1', 'dias_hopit']
+
+@profiled
 def main():
     # Definir las rutas de los archivos
     processed_path = Path("data/processed")
@@ -16,56 +33,44 @@ def main():
     
     print("Iniciando proceso de generación de resumen...")
     
-    # Leer el archivo combinado
-    combined_file = processed_path / "resultados_pacientes_combinados.csv"
-    if not combined_file.exists():
-        print("Error: No se encontró el archivo combinado. Ejecuta primero join.py")
-        return
-    
-    print("Leyendo archivo combinado...")
-    df_combined = pd.read_csv(combined_file, low_memory=False)
-    print(f"Registros leídos: {len(df_combined):,}")
+    # Leer el dataset combinado
+    if not dataset_exists(COMBINED_DATASET):
+        print("Error: No se encontró el dataset combinado. Ejecuta primero join.py")
+        sys.exit(1)
     
     # Leer el archivo de resumen original
     summary_file = raw_path / "Resumen Pacientes 2024-2025.csv"
     if not summary_file.exists():
         print("Error: No se encontró el archivo de resumen original")
-        return
+        sys.exit(1)
     
     print("Leyendo archivo de resumen original...")
-    df_summary = pd.read_csv(summary_file, low_memory=False)
+    df_summary = read_summary_file(summary_file, columns=SUMMARY_COLUMNS, low_memory=False)
     print(f"Registros en resumen original: {len(df_summary):,}")
     
     # Generar resumen del archivo combinado
     print("\nGenerando resumen del archivo combinado...")
     
-    # Agrupar por paciente y expediente para obtener totales únicos
-    summary_combined = df_combined.groupby(['paciente', 'n_expediente_hosp', 'ian_expediente_hosp']).agg({
-        'fecha': ['min', 'max'],  # Primera y última fecha
-        'cantidad': 'sum',        # Total de cantidad
-        'costo_nivel_6': 'sum',   # Total costo nivel 6
-        'monto_nivel_1': 'sum',   # Total monto nivel 1
-        'monto_nivel_6': 'sum',   # Total monto nivel 6
-        'archivo_origen': 'first' # Archivo de origen
-    }).reset_index()
-    
-    # Renombrar columnas
-    summary_combined.columns = [
-        'paciente', 'n_expediente_hosp', 'ian_expediente_hosp',
-        'fecha_inicio', 'fecha_fin', 'total_cantidad',
-        'total_costo_nivel_6', 'total_monto_nivel_1', 'total_monto_nivel_6',
-        'archivo_origen'
-    ]
-    
-    # Convertir fechas
-    summary_combined['fecha_inicio'] = pd.to_datetime(summary_combined['fecha_inicio'])
-    summary_combined['fecha_fin'] = pd.to_datetime(summary_combined['fecha_fin'])
-    
-    # Calcular días de estancia
-    summary_combined['dias_estancia'] = (summary_combined['fecha_fin'] - summary_combined['fecha_inicio']).dt.days + 1
-    
-    # Agregar información adicional
-    summary_combined['total_registros'] = df_combined.groupby(['paciente', 'n_expediente_hosp', 'ian_expediente_hosp']).size().values
+    manifest = read_manifest()
+    if manifest:
+        # Solo se agrupan las particiones nuevas o modificadas; el resto sale de los agregados guardados
+        aggregates, refreshed = update_episodes(manifest)
+        total_rows = sum(entry['filas'] for entry in manifest.values())
+        print(f"Archivos agrupados en esta ejecución: {len(refreshed)} de {len(manifest)}")
+        for filename in refreshed:
+            print(f"  - {filename}")
+    else:
+        # Dataset sin manifiesto (CSV de una versión anterior): una sola agrupación de todo el detalle
+        print("Leyendo dataset combinado...")
+        df_combined = read_dataset(COMBINED_DATASET, columns=COLUMNS)
+        aggregates = aggregate_episodes(df_combined, dropna=False)
+        total_rows = len(df_combined)
+    print(f"Registros en dataset combinado: {total_rows:,}")
+    summary_combined = complete_episodes(aggregates)
+    
+    # Guardar la tabla de episodios para los scripts de análisis
+    episode_file = write_episodes(summary_combined, manifest_signature())
+    print(f"Tabla de episodios guardada en: {episode_file}")
     
     # Ordenar por paciente
     summary_combined = summary_combined.sort_values('paciente')
@@ -118,6 +123,13 @@ def main():
     
     print(f"Comparación guardada en: {comparison_file}")
     
+    # Conciliación por paciente del gasto nivel 6 contra los agregados del detalle
+    reconciliation = reconcile(df_summary, 'gasto_nivel_6', aggregates, 'total_monto_nivel_6',
+                               detail_count_column='total_registros')
+    reconciliation_file = processed_path / "conciliacion_pacientes.csv"
+    reconciliation.to_csv(reconciliation_file, index=False, encoding='utf-8')
+    print(f"Conciliación por paciente guardada en: {reconciliation_file}")
+    
     # Mostrar resumen de la comparación
     print("\n" + "="*60)
     print("RESUMEN DE COMPARACIÓN")
@@ -131,9 +143,16 @@ def main():
     
     # Información adicional
     print(f"\nInformación adicional:")
-    print(f"- Total de registros en archivo combinado: {len(df_combined):,}")
+    print(f"- Total de registros en archivo combinado: {total_rows:,}")
     print(f"- Total de registros únicos por paciente/expediente: {stats_generated['total_registros']:,}")
     print(f"- Promedio de registros por paciente: {stats_generated['total_registros'] / stats_generated['total_pacientes']:.2f}")
+    
+    print("\nConciliación por paciente (gasto nivel 6 vs monto nivel 6):")
+    for status, count in status_counts(reconciliation).items():
+        print(f"- {status}: {count:,} pacientes")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Genera los resúmenes y la conciliación con el resumen original.")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    main(profile=args.perfil)
@@ -2,10 +2,24 @@
 """
 Script principal para ejecutar todo el pipeline de análisis de datos hospitalarios.
 Este script ejecuta todos los pasos del procesamiento y análisis de manera ordenada.
+Cada paso se importa y se ejecuta como función dentro de este mismo proceso, compartiendo
+una caché de datasets: el dataset combinado y el estandarizado se leen una sola vez por
+ejecución en lugar de una vez por script. Con --subprocesos cada paso corre en su propio intérprete.
+Cada paso declara los artefactos que lee y genera; con --workers N los pasos cuyas entradas
+ya están listas se ejecutan en paralelo.
+Las salidas de cada paso se guardan en una caché direccionada por contenido (entradas, código
+y parámetros): al repetir la ejecución solo se recalculan los pasos afectados por un cambio.
+Las métricas de cada paso (tiempo, CPU, memoria, filas y bytes) se guardan en un registro JSON
+en resultados/ejecuciones/ y, con --metricas-prometheus, en un archivo para Prometheus.
+Después de cada paso se guarda un checkpoint; con --reanudar la ejecución continúa desde el
+primer paso pendiente usando las salidas ya guardadas. Con --no-interactivo (o sin terminal)
+el pipeline nunca pide confirmación: si un paso falla, siguen los que no dependen de él.
+Con --perfil cada paso se ejecuta bajo cProfile y su perfil se guarda en resultados/perfiles/.
 """
 
-import sys
+import argparse
 import os
+import sys
 import time
 from pathlib import Path
 from datetime import datetime
@@ -13,36 +27,156 @@ from datetime import datetime
 # Agregar el directorio scripts al path para importar módulos
 sys.path.append(str(Path(__file__).parent))
 
-def run_step(step_name, script_path, description):
-    """Ejecuta un paso del pipeline con logging detallado."""
+from utils.data_store import (
+    COMBINED_DATASET, EDA_SKETCHES, EPISODE_PARTIALS, EPISODE_TABLE, EXPEDIENT_MAPPING, IDENTITY_TABLE, INGESTION_MANIFEST,
+    PROCESSED_PATH, STANDARDIZED_DATASET, DatasetCache
+)
+from utils.checkpoint import Checkpoint
+from utils.metrics import write_prometheus_textfile, write_run_log
+from utils.pipeline import (
+    COMPLETED, FAILED, RESTORED, RESUMED, SKIPPED, critical_path, run_steps, step_dependencies
+)
+from utils.profiling import add_profile_argument
+from utils.step_cache import StepCache
+
+RAW_PATH = Path("data/raw")
+PERIOD_FILES = RAW_PATH / "Resultados Pacientes *.csv"
+SUMMARY_FILE = RAW_PATH / "Resumen Pacientes 2024-2025.csv"
+RESULTS_PATH = Path("resultados")
+
+# Pasos del pipeline con los artefactos que leen y generan
+PIPELINE_STEPS = [
+    {
+        "name": "Unión de Archivos CSV",
+        "script": "scripts/data_processing/join.py",
+        "function": "main",
+        "inputs": [PERIOD_FILES],
+        "outputs": [COMBINED_DATASET, INGESTION_MANIFEST],
+        "description": "Combina los archivos CSV de diferentes períodos en un solo dataset"
+    },
+    {
+        "name": "Estandarización de Expedientes",
+        "script": "scripts/data_processing/standardize_expedients.py",
+        "function": "analyze_and_standardize",
+        "inputs": [COMBINED_DATASET],
+        "outputs": [STANDARDIZED_DATASET, EXPEDIENT_MAPPING,
+                    RESULTS_PATH / "estandarizacion_expedientes.txt", RESULTS_PATH / "resumen_estandarizacion.txt"],
+        "description": "Normaliza los expedientes y elimina duplicados por formato inconsistente"
+    },
+    {
+        "name": "Resolución de Identidades",
+        "script": "scripts/data_processing/resolve_identities.py",
+        "function": "main",
+        "inputs": [COMBINED_DATASET, INGESTION_MANIFEST],
+        "outputs": [IDENTITY_TABLE],
+        "description": "Une paciente, expediente e IAN y guarda la tabla de identidades por paciente"
+    },
+    {
+        "name": "Generación de Resúmenes",
+        "script": "scripts/data_processing/summarize.py",
+        "function": "main",
+        "inputs": [COMBINED_DATASET, INGESTION_MANIFEST, SUMMARY_FILE],
+        "outputs": [EPISODE_TABLE, EPISODE_PARTIALS, PROCESSED_PATH / "resumen_generado_2024_2025.csv",
+                    PROCESSED_PATH / "comparacion_resumenes.csv", PROCESSED_PATH / "conciliacion_pacientes.csv"],
+        "description": "Genera resúmenes y comparaciones de los datos procesados"
+    },
+    {
+        "name": "Análisis Exploratorio de Datos (EDA)",
+        "script": "scripts/analysis/eda.py",
+        "function": "main",
+        "inputs": [PERIOD_FILES, COMBINED_DATASET, INGESTION_MANIFEST],
+        "outputs": [EDA_SKETCHES, RESULTS_PATH / "eda_resultados.txt", RESULTS_PATH / "resumen_ejecutivo.txt"],
+        "description": "Realiza análisis exploratorio completo de todos los datasets"
+    },
+    {
+        "name": "Análisis IAN vs Expedientes",
+        "script": "scripts/analysis/analyze_ian_vs_expedients.py",
+        "function": "analyze_ian_vs_expedients",
+        "inputs": [STANDARDIZED_DATASET],
+        "outputs": [RESULTS_PATH / "analisis_ian_vs_expedientes.txt", RESULTS_PATH / "resumen_pacientes_por_categoria.csv"],
+        "description": "Analiza la distribución de pacientes por tipo de identificación"
+    },
+    {
+        "name": "Análisis Detallado de Diferencias IAN-Expediente",
+        "script": "scripts/analysis/analyze_ian_expedient_differences.py",
+        "function": "analyze_ian_expedient_differences",
+        "inputs": [STANDARDIZED_DATASET],
+        "outputs": [RESULTS_PATH / "analisis_diferencias_ian_expediente.txt",
+                    RESULTS_PATH / "resumen_diferencias_ian_expediente.csv"],
+        "description": "Análisis profundo de las diferencias entre IAN y expedientes"
+    },
+    {
+        "name": "Análisis de Diferencias de Costos",
+        "script": "scripts/analysis/analyze_cost_differences.py",
+        "function": "analyze_cost_differences",
+        "inputs": [STANDARDIZED_DATASET, SUMMARY_FILE],
+        "outputs": [RESULTS_PATH / "analisis_diferencias_costos.txt", RESULTS_PATH / "diferencias_costos_por_paciente.csv"],
+        "description": "Analiza las diferencias de costos entre diferentes categorías"
+    },
+    {
+        "name": "Análisis de Múltiples Expedientes",
+        "script": "scripts/analysis/analyze_multiple_expedients.py",
+        "function": "analyze_multiple_expedients",
+        "inputs": [COMBINED_DATASET, INGESTION_MANIFEST, IDENTITY_TABLE, EPISODE_TABLE],
+        "outputs": [RESULTS_PATH / "analisis_multiples_expedientes.txt", RESULTS_PATH / "pacientes_multiples_expedientes.csv"],
+        "description": "Identifica y analiza pacientes con múltiples expedientes"
+    },
+    {
+        "name": "Análisis de Paciente Específico",
+        "script": "scripts/analysis/analyze_specific_patient.py",
+        "function": "analyze_specific_patient",
+        "inputs": [STANDARDIZED_DATASET, SUMMARY_FILE],
+        "outputs": [RESULTS_PATH / "analisis_paciente_677598.txt", RESULTS_PATH / "datos_detallados_paciente_677598.csv"],
+        "description": "Análisis detallado de un paciente específico como ejemplo"
+    },
+    {
+        "name": "Análisis del Archivo de Resumen",
+        "script": "scripts/analysis/analyze_summary_file.py",
+        "function": "analyze_summary_file",
+        "inputs": [STANDARDIZED_DATASET, SUMMARY_FILE],
+        "outputs": [RESULTS_PATH / "analisis_archivo_resumen.txt", RESULTS_PATH / "resumen_ejecutivo_archivo_resumen.txt"],
+        "description": "Analiza el archivo de resumen original y compara con el generado"
+    }
+]
+
+def print_step_header(step, number, total):
+    """Encabezado de un paso del pipeline."""
+    print(f"\n📋 Paso {number}/{total}")
     print(f"\n{'='*60}")
-    print(f"🚀 EJECUTANDO: {step_name}")
-    print(f"📝 Descripción: {description}")
+    print(f"🚀 EJECUTANDO: {step['name']}")
+    print(f"📝 Descripción: {step['description']}")
     print(f"⏰ Inicio: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*60}")
-    
-    start_time = time.time()
-    
-    try:
-        # Ejecutar el script
-        result = os.system(f"python {script_path}")
-        
-        if result == 0:
-            end_time = time.time()
-            duration = end_time - start_time
-            print(f"\n✅ {step_name} completado exitosamente")
-            print(f"⏱️  Duración: {duration:.2f} segundos")
-            return True
-        else:
-            print(f"\n❌ Error en {step_name}")
-            return False
-            
-    except Exception as e:
-        print(f"\n❌ Excepción en {step_name}: {str(e)}")
-        return False
 
-def main():
-    """Función principal que ejecuta todo el pipeline."""
+def format_bytes(value):
+    """Cantidad de bytes legible (MB), o 'n/d' si no se pudo medir."""
+    return f"{value / 1024**2:,.1f} MB" if value is not None else "n/d"
+
+def format_count(value):
+    return f"{value:,}" if value is not None else "n/d"
+
+def print_step_result(step, result, metrics):
+    """Resultado de un paso del pipeline con sus métricas."""
+    if result == RESTORED:
+        print(f"\n♻️  {step['name']} restaurado desde la caché de pasos")
+    elif result != FAILED:
+        print(f"\n✅ {step['name']} completado exitosamente")
+    else:
+        print(f"\n❌ Error en {step['name']}")
+        return
+    print(f"⏱️  Duración: {metrics['tiempo_s']:.2f} segundos (CPU {metrics['cpu_s']:.2f} s)")
+    print(f"📏 Memoria pico: {format_bytes(metrics['pico_rss_bytes'])} | "
+          f"Filas leídas: {format_count(metrics['filas_leidas'])} | "
+          f"Filas generadas: {format_count(metrics['filas_generadas'])} | "
+          f"Leído: {format_bytes(metrics['bytes_leidos'])} | Escrito: {format_bytes(metrics['bytes_escritos'])}")
+
+def main(in_process=True, use_cache=True, workers=1, use_step_cache=True, prometheus_file=None,
+         interactive=True, resume=False, profile=False):
+    """
+    Función principal que ejecuta todo el pipeline. Devuelve True si todos los pasos terminaron.
+    Sin interactive nunca se pide confirmación; con resume se retoma la ejecución anterior.
+    Con profile cada paso se perfila (ver utils.profiling).
+    """
     
     print("🏥 PROYECTO ECONOMÍA SALUD - PIPELINE COMPLETO")
     print("="*60)
@@ -50,78 +184,68 @@ def main():
     print(f"🐍 Python version: {sys.version}")
     print("="*60)
     
-    # Definir los pasos del pipeline
-    pipeline_steps = [
-        {
-            "name": "Unión de Archivos CSV",
-            "script": "scripts/data_processing/join.py",
-            "description": "Combina los archivos CSV de diferentes períodos en un solo dataset"
-        },
-        {
-            "name": "Estandarización de Expedientes",
-            "script": "scripts/data_processing/standardize_expedients.py",
-            "description": "Normaliza los expedientes y elimina duplicados por formato inconsistente"
-        },
-        {
-            "name": "Generación de Resúmenes",
-            "script": "scripts/data_processing/summarize.py",
-            "description": "Genera resúmenes y comparaciones de los datos procesados"
-        },
-        {
-            "name": "Análisis Exploratorio de Datos (EDA)",
-            "script": "scripts/analysis/eda.py",
-            "description": "Realiza análisis exploratorio completo de todos los datasets"
-        },
-        {
-            "name": "Análisis IAN vs Expedientes",
-            "script": "scripts/analysis/analyze_ian_vs_expedients.py",
-            "description": "Analiza la distribución de pacientes por tipo de identificación"
-        },
-        {
-            "name": "Análisis Detallado de Diferencias IAN-Expediente",
-            "script": "scripts/analysis/analyze_ian_expedient_differences.py",
-            "description": "Análisis profundo de las diferencias entre IAN y expedientes"
-        },
-        {
-            "name": "Análisis de Diferencias de Costos",
-            "script": "scripts/analysis/analyze_cost_differences.py",
-            "description": "Analiza las diferencias de costos entre diferentes categorías"
-        },
-        {
-            "name": "Análisis de Múltiples Expedientes",
-            "script": "scripts/analysis/analyze_multiple_expedients.py",
-            "description": "Identifica y analiza pacientes con múltiples expedientes"
-        },
-        {
-            "name": "Análisis de Paciente Específico",
-            "script": "scripts/analysis/analyze_specific_patient.py",
-            "description": "Análisis detallado de un paciente específico como ejemplo"
-        },
-        {
-            "name": "Análisis del Archivo de Resumen",
-            "script": "scripts/analysis/analyze_summary_file.py",
-            "description": "Analiza el archivo de resumen original y compara con el generado"
-        }
-    ]
-    
-    # Contadores para el resumen final
-    successful_steps = 0
-    failed_steps = 0
+    pipeline_steps = PIPELINE_STEPS
+    total_steps = len(pipeline_steps)
     total_start_time = time.time()
+    start_iso = datetime.now().isoformat(timespec='seconds')
+    
+    # Caché compartida por los pasos (solo en modo en proceso; con workers, una por proceso)
+    cache = DatasetCache() if in_process and use_cache else None
+    step_cache = StepCache() if use_step_cache else None
+    print(f"⚙️  Modo: {'en proceso' if in_process else 'un subproceso por paso'}"
+          f"{', con caché de datasets' if cache is not None else ''}"
+          f"{', con caché de pasos' if step_cache is not None else ''}, {workers} proceso(s)"
+          f"{'' if interactive else ', sin confirmaciones'}{', con perfilado' if profile else ''}")
     
-    # Ejecutar cada paso del pipeline
-    for i, step in enumerate(pipeline_steps, 1):
-        print(f"\n📋 Paso {i}/{len(pipeline_steps)}")
+    # Checkpoint: con resume, los pasos completados cuyas salidas siguen en disco no se repiten
+    checkpoint = Checkpoint(resume=resume)
+    completed = checkpoint.completed(pipeline_steps, COMPLETED) if resume else []
+    checkpoint.save()
+    if resume:
+        print(f"⏩ Reanudando la ejecución iniciada el {checkpoint.state['inicio']}: "
+              f"{len(completed)} de {total_steps} pasos ya completados")
+        for i in completed:
+            print(f"  - {pipeline_steps[i]['name']}")
+    
+    if workers <= 1:
+        def on_start(i):
+            print_step_header(pipeline_steps[i], i + 1, total_steps)
         
-        if run_step(step["name"], step["script"], step["description"]):
-            successful_steps += 1
-        else:
-            failed_steps += 1
+        def on_finish(i, result, metrics, output):
+            checkpoint.record(pipeline_steps[i], result)
+            print_step_result(pipeline_steps[i], result, metrics)
+            if result != FAILED:
+                return True
+            if not interactive:
+                print("⏭️  Se continúa con los pasos que no dependen de él")
+                return True
             print(f"\n⚠️  ¿Deseas continuar con el siguiente paso? (s/n): ", end="")
             response = input().lower()
             if response != 's':
                 print("🛑 Pipeline interrumpido por el usuario")
-                break
+                return False
+            return True
+    else:
+        def on_start(i):
+            print(f"▶️  Lanzado: {pipeline_steps[i]['name']}")
+        
+        def on_finish(i, result, metrics, output):
+            checkpoint.record(pipeline_steps[i], result)
+            # La salida de cada paso se muestra completa al terminar, sin mezclarse con las demás
+            print_step_header(pipeline_steps[i], i + 1, total_steps)
+            print(output, end="")
+            print_step_result(pipeline_steps[i], result, metrics)
+            return True
+    
+    # Ejecutar los pasos según sus dependencias
+    status, step_metrics = run_steps(pipeline_steps, workers=workers, cache=cache, in_process=in_process,
+                                  step_cache=step_cache, on_start=on_start, on_finish=on_finish,
+                                  completed=completed, profile=profile)
+    failed_steps = sum(1 for value in status.values() if value == FAILED)
+    skipped_steps = sum(1 for value in status.values() if value == SKIPPED)
+    restored_steps = sum(1 for value in status.values() if value == RESTORED)
+    resumed_steps = sum(1 for value in status.values() if value == RESUMED)
+    successful_steps = total_steps - failed_steps - skipped_steps
     
     # Resumen final
     total_end_time = time.time()
@@ -131,20 +255,82 @@ def main():
     print("📊 RESUMEN FINAL DEL PIPELINE")
     print(f"{'='*60}")
     print(f"✅ Pasos exitosos: {successful_steps}")
+    if restored_steps:
+        print(f"♻️  Restaurados desde la caché de pasos: {restored_steps}")
+    if resumed_steps:
+        print(f"⏩ Completados en la ejecución anterior: {resumed_steps}")
     print(f"❌ Pasos fallidos: {failed_steps}")
-    print(f"📈 Tasa de éxito: {(successful_steps/len(pipeline_steps)*100):.1f}%")
+    if skipped_steps:
+        print(f"⏭️  Pasos omitidos: {skipped_steps}")
+        for i in sorted(status):
+            if status[i] == SKIPPED:
+                print(f"  - {pipeline_steps[i]['name']}")
+    print(f"📈 Tasa de éxito: {(successful_steps/total_steps*100):.1f}%")
     print(f"⏱️  Tiempo total: {total_duration:.2f} segundos ({total_duration/60:.1f} minutos)")
+    durations = {i: metrics['tiempo_s'] for i, metrics in step_metrics.items()}
+    critical_duration, critical_steps = critical_path(step_dependencies(pipeline_steps), durations)
+    print(f"🧭 Ruta crítica: {critical_duration:.2f} segundos "
+          f"({' → '.join(pipeline_steps[i]['name'] for i in critical_steps)})")
+    if cache is not None and workers <= 1:
+        print(f"🗄️  Caché de datasets: {cache.reads} lecturas servidas, {cache.columns_loaded} columnas leídas del disco")
     print(f"📅 Finalizado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     
-    if failed_steps == 0:
+    # Registro de la ejecución con las métricas de cada paso
+    run = {
+        'inicio': start_iso,
+        'fin': datetime.now().isoformat(timespec='seconds'),
+        'fin_epoch': total_end_time,
+        'tiempo_total_s': total_duration,
+        'modo': 'en_proceso' if in_process else 'subprocesos',
+        'workers': workers,
+        'reanudada': resume,
+        'perfilada': profile,
+        'pasos_fallidos': failed_steps,
+        'ruta_critica_s': critical_duration,
+        'ruta_critica': [pipeline_steps[i]['name'] for i in critical_steps],
+        'pasos': [{'paso': step['name'], 'script': step['script'], 'estado': status[i], **step_metrics.get(i, {})}
+                  for i, step in enumerate(pipeline_steps)]
+    }
+    print(f"🧾 Registro de la ejecución: {write_run_log(run)}")
+    if prometheus_file is not None:
+        if write_prometheus_textfile(run, prometheus_file):
+            print(f"📡 Métricas para Prometheus: {prometheus_file}")
+        else:
+            print("⚠️  prometheus-client no está instalado: no se escribieron las métricas para Prometheus")
+    
+    if failed_steps == 0 and skipped_steps == 0:
         print("\n🎉 ¡Pipeline completado exitosamente!")
         print("📁 Los resultados están disponibles en la carpeta 'resultados/'")
         print("📖 Revisa el README.md para más información sobre los outputs")
     else:
         print(f"\n⚠️  Pipeline completado con {failed_steps} errores")
         print("🔍 Revisa los logs anteriores para identificar los problemas")
+        print("🔁 Corrige el problema y usa --reanudar para continuar desde el primer paso pendiente")
     
     print(f"{'='*60}")
+    return failed_steps == 0 and skipped_steps == 0
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ejecuta el pipeline completo de procesamiento y análisis.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Pasos independientes a ejecutar en paralelo (0 = todos los núcleos)")
+    parser.add_argument("--subprocesos", action="store_true",
+                        help="Ejecuta cada paso en un intérprete aparte (sin caché compartida)")
+    parser.add_argument("--sin-cache", action="store_true",
+                        help="Ejecuta los pasos en proceso pero leyendo los datasets del disco en cada paso")
+    parser.add_argument("--sin-cache-pasos", action="store_true",
+                        help="Ejecuta todos los pasos sin consultar ni actualizar la caché de pasos")
+    parser.add_argument("--metricas-prometheus", metavar="ARCHIVO",
+                        help="Escribe las métricas de la ejecución en ARCHIVO (formato textfile de Prometheus, .prom)")
+    parser.add_argument("--no-interactivo", "--batch", action="store_true",
+                        help="Nunca pide confirmación: si un paso falla, continúa con los que no dependen de él "
+                             "(es el comportamiento por defecto si la entrada no es una terminal)")
+    parser.add_argument("--reanudar", "--resume", action="store_true",
+                        help="Continúa la ejecución anterior desde el primer paso pendiente según el checkpoint")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    success = main(in_process=not args.subprocesos, use_cache=not args.sin_cache, workers=workers,
+                   use_step_cache=not args.sin_cache_pasos, prometheus_file=args.metricas_prometheus,
+                   interactive=not args.no_interactivo and sys.stdin.isatty(), resume=args.reanudar, profile=args.perfil)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Checkpoint de la ejecución del pipeline: después de cada paso se guarda su estado y la huella
+de sus salidas. Una ejecución reanudada (--reanudar) da por terminados los pasos que se
+completaron y cuyas salidas siguen en disco sin cambios, y continúa desde el primero pendiente.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from utils.data_store import PIPELINE_CHECKPOINT
+from utils.step_cache import fingerprint
+
+class Checkpoint:
+    """Estado por paso de la última ejecución del pipeline, guardado tras cada paso."""
+    
+    def __init__(self, path=PIPELINE_CHECKPOINT, resume=False):
+        self.path = Path(path)
+        self.state = None
+        if resume and self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        if self.state is None:
+            self.state = {'inicio': datetime.now().isoformat(timespec='seconds'), 'pasos': {}}
+    
+    def record(self, step, status):
+        """Guarda el estado del paso y la huella de sus salidas."""
+        self.state['pasos'][step["script"]] = {
+            'paso': step["name"],
+            'estado': status,
+            'fin': datetime.now().isoformat(timespec='seconds'),
+            'salidas': {str(output): fingerprint(output) for output in step.get("outputs", [])}
+        }
+        self.save()
+    
+    def completed(self, steps, statuses):
+        """
+        Índices de los pasos que el checkpoint registra con uno de statuses y cuyas salidas
+        existen y no cambiaron desde entonces; los demás deben volver a ejecutarse.
+        """
+        done = []
+        for i, step in enumerate(steps):
+            entry = self.state['pasos'].get(step["script"])
+            if entry is None or entry['estado'] not in statuses:
+                continue
+            current = {str(output): fingerprint(output) for output in step.get("outputs", [])}
+            # Una salida vacía (sin archivos) no cuenta como persistida
+            if all(current.values()) and current == entry['salidas']:
+                done.append(i)
+        return done
+    
+    def save(self):
+        """Escribe el checkpoint de forma atómica (un corte a mitad no deja un archivo truncado)."""
+        self.state['actualizado'] = datetime.now().isoformat(timespec='seconds')
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_file, self.path)
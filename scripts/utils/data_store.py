@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+"""
+Almacenamiento columnar de los datasets procesados.
+Cada dataset es un directorio de archivos Parquet con una partición por archivo de origen,
+de modo que los scripts de análisis leen datos tipados y comprimidos en lugar de re-parsear CSV.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from utils.metrics import count_rows_read
+from utils.schema import MONEY_COLUMNS, apply_schema, normalize_money, read_csv_typed, read_summary_csv
+
+PROCESSED_PATH = Path("data/processed")
+COMBINED_DATASET = PROCESSED_PATH / "resultados_pacientes_combinados"
+STANDARDIZED_DATASET = PROCESSED_PATH / "resultados_pacientes_estandarizados"
+INGESTION_MANIFEST = PROCESSED_PATH / "manifiesto_ingesta.json"
+EXPEDIENT_MAPPING = PROCESSED_PATH / "mapa_expedientes.parquet"
+IDENTITY_TABLE = PROCESSED_PATH / "identidades_pacientes.parquet"
+EPISODE_TABLE = PROCESSED_PATH / "episodios_pacientes.parquet"
+EPISODE_PARTIALS = PROCESSED_PATH / "episodios_por_archivo"
+EDA_SKETCHES = PROCESSED_PATH / "resumenes_eda_por_archivo"
+STEP_CACHE = Path("data/cache/pasos")
+PIPELINE_CHECKPOINT = Path("data/cache/checkpoint_pipeline.json")
+
+PARTITION_COLUMN = "archivo_origen"
+PARQUET_COMPRESSION = "zstd"
+
+# Caché que usa read_dataset mientras está activa (ver use_dataset_cache)
+_active_cache = None
+
+def partition_name(value):
+    """Convierte el nombre de un archivo de origen en un nombre de partición seguro."""
+    stem = Path(str(value)).stem
+    return re.sub(r'[^0-9A-Za-z]+', '_', stem).strip('_').lower()
+
+def partition_path(dataset_path, value):
+    """Devuelve el directorio de la partición correspondiente a un archivo de origen."""
+    return Path(dataset_path) / partition_name(value)
+
+def csv_export_path(dataset_path):
+    """Ruta del CSV equivalente (exportación opcional o formato anterior)."""
+    return Path(dataset_path).with_suffix('.csv')
+
+def dataset_exists(dataset_path):
+    """Indica si el dataset existe en formato Parquet o como CSV anterior."""
+    return _has_parquet(dataset_path) or csv_export_path(dataset_path).exists()
+
+def _parquet_files(dataset_path):
+    """Archivos Parquet visibles del dataset (ignora escrituras en curso)."""
+    dataset_path = Path(dataset_path)
+    if not dataset_path.is_dir():
+        return []
+    return [f for f in dataset_path.glob('*/*.parquet')
+            if not f.parent.name.startswith('.') and not f.name.startswith('.')]
+
+def _has_parquet(dataset_path):
+    return len(_parquet_files(dataset_path)) > 0
+
+class PartitionWriter:
+    """
+    Escribe una partición por bloques: cada bloque se guarda como un archivo Parquet
+    independiente, de modo que la memoria usada no depende del tamaño total del archivo de origen.
+    La partición anterior solo se reemplaza al cerrar el escritor sin errores.
+    """
+    
+    def __init__(self, dataset_path, value, schema=None):
+        self.target_dir = partition_path(dataset_path, value)
+        # Los directorios que empiezan con '.' son ignorados al leer el dataset
+        self.tmp_dir = self.target_dir.with_name(f".{self.target_dir.name}.tmp")
+        self.schema = schema
+        self.parts = 0
+        self.rows = 0
+    
+    def __enter__(self):
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.tmp_dir.mkdir(parents=True)
+        return self
+    
+    def write(self, df):
+        """Agrega un bloque de filas a la partición."""
+        table = pa.Table.from_pandas(df, schema=self.schema, preserve_index=False)
+        pq.write_table(table, self.tmp_dir / f"part-{self.parts:05d}.parquet",
+                       compression=PARQUET_COMPRESSION)
+        self.parts += 1
+        self.rows += len(df)
+    
+    def abort(self):
+        """Descarta lo escrito y conserva la partición anterior."""
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+    
+    def commit(self):
+        """Reemplaza la partición anterior por la recién escrita."""
+        if self.target_dir.exists():
+            shutil.rmtree(self.target_dir)
+        os.replace(self.tmp_dir, self.target_dir)
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None and self.tmp_dir.exists():
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+def write_partition(df, dataset_path, value, schema=None):
+    """Escribe (o reemplaza) la partición de un archivo de origen."""
+    with PartitionWriter(dataset_path, value, schema=schema) as writer:
+        writer.write(df)
+    return writer.target_dir
+
+def write_dataset(df, dataset_path):
+    """Escribe un DataFrame completo como dataset particionado por archivo de origen."""
+    dataset_path = Path(dataset_path)
+    if dataset_path.exists():
+        shutil.rmtree(dataset_path)
+    dataset_path.mkdir(parents=True, exist_ok=True)
+    
+    # Un solo esquema para todas las particiones, aunque alguna tenga columnas vacías
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for value, part in df.groupby(PARTITION_COLUMN, sort=False, observed=True):
+        write_partition(part, dataset_path, value, schema=schema)
+    return dataset_path
+
+def _unify_schemas(schemas):
+    """Unifica los esquemas de los archivos; las columnas con tipos incompatibles se leen como texto."""
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    
+    fields = {}
+    for schema in schemas:
+        for field in schema:
+            previous = fields.get(field.name)
+            if previous is None or previous == field.type:
+                fields[field.name] = field.type
+                continue
+            try:
+                merged = pa.unify_schemas(
+                    [pa.schema([(field.name, previous)]), pa.schema([(field.name, field.type)])],
+                    promote_options="permissive"
+                )
+                fields[field.name] = merged.field(field.name).type
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                fields[field.name] = pa.string()
+    return pa.schema(list(fields.items()))
+
+def open_dataset(dataset_path):
+    """Abre el dataset Parquet unificando los esquemas de sus archivos."""
+    dataset = ds.dataset(Path(dataset_path), format="parquet")
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    if len(schemas) > 1 and any(schema != schemas[0] for schema in schemas[1:]):
+        dataset = ds.dataset(Path(dataset_path), format="parquet", schema=_unify_schemas(schemas))
+    return dataset
+
+def stores_cents(dataset_path):
+    """Indica si el dataset Parquet guarda los montos como centavos enteros."""
+    if not _has_parquet(dataset_path):
+        return False
+    schema = open_dataset(dataset_path).schema
+    return any(pa.types.is_integer(schema.field(col).type) for col in MONEY_COLUMNS if col in schema.names)
+
+def _dataset_signature(dataset_path):
+    """Archivos del dataset con su tamaño y fecha de modificación: cambia si se reescribe."""
+    return tuple(sorted((str(f), f.stat().st_size, f.stat().st_mtime_ns) for f in _parquet_files(dataset_path)))
+
+class DatasetCache:
+    """
+    Caché en memoria de los datasets Parquet para ejecutar varios pasos en un mismo proceso.
+    Cada columna se lee del disco una sola vez, cuando algún paso la pide; si los archivos
+    del dataset cambian (un paso lo reescribe) se descarta lo guardado de ese dataset.
+    Cada lectura devuelve un DataFrame nuevo, así que los pasos pueden modificarlo.
+    """
+    
+    def __init__(self):
+        self.entries = {}
+        self.reads = 0
+        self.columns_loaded = 0
+    
+    def read(self, dataset_path, columns=None, cents=False):
+        """Igual que read_dataset, sirviendo desde memoria las columnas ya leídas."""
+        dataset = open_dataset(dataset_path)
+        names = dataset.schema.names
+        columns = names if columns is None else [col for col in columns if col in names]
+        
+        key = (str(Path(dataset_path).resolve()), cents)
+        signature = _dataset_signature(dataset_path)
+        entry = self.entries.get(key)
+        if entry is None or entry['firma'] != signature:
+            entry = self.entries[key] = {'firma': signature, 'columnas': {}}
+        
+        loaded = entry['columnas']
+        missing = [col for col in columns if col not in loaded]
+        if missing:
+            df = apply_schema(dataset.to_table(columns=missing).to_pandas(), cents=cents)
+            loaded.update(df.items())
+            self.columns_loaded += len(missing)
+        self.reads += 1
+        # Construir el DataFrame desde un dict copia las columnas
+        return pd.DataFrame({col: loaded[col] for col in columns})
+    
+    def clear(self):
+        self.entries.clear()
+
+@contextmanager
+def use_dataset_cache(cache):
+    """Hace que read_dataset lea a través de cache mientras dure el bloque (None la desactiva)."""
+    global _active_cache
+    previous = _active_cache
+    _active_cache = cache
+    try:
+        yield cache
+    finally:
+        _active_cache = previous
+
+def read_dataset(dataset_path, columns=None, cents=False):
+    """
+    Lee un dataset procesado como DataFrame con los tipos del registro de esquemas.
+    Usa el dataset Parquet si existe; si no, recurre al CSV del formato anterior.
+    Con columns solo se leen esas columnas; las que no existan en el dataset se ignoran.
+    Los montos se devuelven en pesos o, con cents=True, en centavos enteros.
+    Dentro de use_dataset_cache las lecturas Parquet pasan por la caché activa.
+    """
+    if _has_parquet(dataset_path):
+        if _active_cache is not None:
+            df = _active_cache.read(dataset_path, columns, cents)
+        else:
+            dataset = open_dataset(dataset_path)
+            if columns is not None:
+                columns = [col for col in columns if col in dataset.schema.names]
+            df = apply_schema(dataset.to_table(columns=columns).to_pandas(), cents=cents)
+        count_rows_read(len(df))
+        return df
+    
+    csv_file = csv_export_path(dataset_path)
+    if csv_file.exists():
+        return normalize_money(read_csv_file(csv_file, columns=columns, low_memory=False), cents)
+    
+    raise FileNotFoundError(f"No se encontró el dataset: {dataset_path}")
+
+def _counted_chunks(chunks):
+    for chunk in chunks:
+        count_rows_read(len(chunk))
+        yield chunk
+
+def read_csv_file(file_path, reader=read_csv_typed, **kwargs):
+    """
+    Lee un CSV con los tipos del registro (reader: read_csv_typed o read_summary_csv) y suma
+    sus filas al contador de lectura. Con chunksize devuelve un iterador de bloques.
+    """
+    if kwargs.get('chunksize'):
+        return _counted_chunks(reader(file_path, **kwargs))
+    df = reader(file_path, **kwargs)
+    count_rows_read(len(df))
+    return df
+
+def read_summary_file(file_path, **kwargs):
+    """Lee el archivo de resumen original con sus tipos (ver read_csv_file)."""
+    return read_csv_file(file_path, read_summary_csv, **kwargs)
+
+def read_partition(dataset_path, value, columns=None, cents=False):
+    """Lee solo la partición de un archivo de origen, con los tipos del registro de esquemas."""
+    dataset = open_dataset(partition_path(dataset_path, value))
+    if columns is not None:
+        columns = [col for col in columns if col in dataset.schema.names]
+    df = apply_schema(dataset.to_table(columns=columns).to_pandas(), cents=cents)
+    count_rows_read(len(df))
+    return df
+
+def take_partition_rows(dataset_path, value, positions, columns=None, cents=False):
+    """Lee solo las filas de esas posiciones de la partición de un archivo de origen."""
+    dataset = open_dataset(partition_path(dataset_path, value))
+    if columns is not None:
+        columns = [col for col in columns if col in dataset.schema.names]
+    df = apply_schema(dataset.take(positions, columns=columns).to_pandas(), cents=cents)
+    count_rows_read(len(df))
+    return df
+
+def _iter_batches(dataset, columns, chunksize, cents):
+    if columns is not None:
+        columns = [col for col in columns if col in dataset.schema.names]
+    for fragment in dataset.get_fragments():
+        for batch in fragment.to_batches(schema=dataset.schema, columns=columns, batch_size=chunksize):
+            if batch.num_rows > 0:
+                count_rows_read(batch.num_rows)
+                yield apply_schema(batch.to_pandas(), cents=cents)
+
+def iter_partition(dataset_path, value, columns=None, chunksize=250_000, cents=False):
+    """Recorre por bloques tipados solo la partición de un archivo de origen."""
+    yield from _iter_batches(open_dataset(partition_path(dataset_path, value)), columns, chunksize, cents)
+
+def iter_dataset(dataset_path, columns=None, chunksize=250_000, cents=False):
+    """
+    Recorre un dataset procesado por bloques tipados de a lo sumo chunksize filas,
+    partición por partición, sin cargarlo completo en memoria.
+    """
+    if _has_parquet(dataset_path):
+        yield from _iter_batches(open_dataset(dataset_path), columns, chunksize, cents)
+        return
+    
+    csv_file = csv_export_path(dataset_path)
+    if csv_file.exists():
+        for chunk in read_csv_file(csv_file, columns=columns, chunksize=chunksize):
+            yield normalize_money(chunk, cents)
+        return
+    
+    raise FileNotFoundError(f"No se encontró el dataset: {dataset_path}")
+
+def dataset_size_bytes(dataset_path):
+    """Tamaño en disco del dataset (todas sus particiones)."""
+    dataset_path = Path(dataset_path)
+    if _has_parquet(dataset_path):
+        return sum(f.stat().st_size for f in _parquet_files(dataset_path))
+    csv_file = csv_export_path(dataset_path)
+    return csv_file.stat().st_size if csv_file.exists() else 0
+
+def export_csv(dataset_path, csv_path=None, partition_order=None):
+    """
+    Exporta el dataset a CSV partición por partición, sin cargarlo completo en memoria.
+    partition_order (valores de archivo_origen) fija el orden de las filas exportadas.
+    """
+    csv_path = Path(csv_path) if csv_path else csv_export_path(dataset_path)
+    dataset = open_dataset(dataset_path)
+    
+    fragments = list(dataset.get_fragments())
+    if partition_order is not None:
+        rank = {partition_name(value): i for i, value in enumerate(partition_order)}
+        fragments.sort(key=lambda fragment: (rank.get(Path(fragment.path).parent.name, len(rank)),
+                                             fragment.path))
+    
+    tmp_file = csv_path.with_name(f".{csv_path.name}.tmp")
+    header = True
+    with open(tmp_file, 'w', encoding='utf-8', newline='') as f:
+        for fragment in fragments:
+            for batch in fragment.to_batches(schema=dataset.schema):
+                # El CSV siempre lleva los montos en pesos
+                normalize_money(batch.to_pandas()).to_csv(f, index=False, header=header)
+                header = False
+    os.replace(tmp_file, csv_path)
+    return csv_path
+
+def write_parquet_file(df, file_path, metadata=None):
+    """
+    Guarda una tabla auxiliar como un único archivo Parquet, de forma atómica.
+    metadata (dict de texto) se guarda en el esquema del archivo.
+    """
+    file_path = Path(file_path)
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if metadata:
+        extra = {str(k).encode(): str(v).encode() for k, v in metadata.items()}
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **extra})
+    tmp_file = file_path.with_name(f".{file_path.name}.tmp")
+    pq.write_table(table, tmp_file, compression=PARQUET_COMPRESSION)
+    os.replace(tmp_file, file_path)
+    return file_path
+
+def read_parquet_file(file_path, columns=None):
+    """Lee una tabla auxiliar guardada con write_parquet_file."""
+    table = pq.read_table(file_path, columns=columns)
+    count_rows_read(table.num_rows)
+    return table.to_pandas()
+
+def read_parquet_metadata(file_path):
+    """Metadatos de texto guardados con write_parquet_file (sin los metadatos internos de pandas)."""
+    metadata = pq.read_schema(file_path).metadata or {}
+    return {k.decode(): v.decode() for k, v in metadata.items() if k != b'pandas'}
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """Hash SHA-256 del contenido de un archivo, leído por bloques."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_manifest(manifest_path=INGESTION_MANIFEST):
+    """Lee el manifiesto de ingesta: archivo de origen -> metadatos de su partición."""
+    manifest_path = Path(manifest_path)
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('archivos', {})
+
+def manifest_signature(manifest_path=INGESTION_MANIFEST):
+    """
+    Firma del contenido ingerido (hash de los hashes de cada archivo de origen).
+    Permite saber si una tabla derivada del dataset combinado sigue vigente.
+    """
+    entries = read_manifest(manifest_path)
+    content = json.dumps({filename: entry.get('sha256') for filename, entry in entries.items()}, sort_keys=True)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def write_manifest(entries, manifest_path=INGESTION_MANIFEST):
+    """Guarda el manifiesto de ingesta de forma atómica."""
+    manifest_path = Path(manifest_path)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    content = {
+        'actualizado': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'archivos': entries
+    }
+    tmp_file = manifest_path.with_name(f".{manifest_path.name}.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(content, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, manifest_path)
+    return manifest_path
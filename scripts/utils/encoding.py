@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Detección del encoding de archivos CSV a partir de una muestra de bytes.
+Permite elegir el encoding antes del parseo completo en lugar de descubrirlo
+al fallar a mitad de la lectura y tener que leer el archivo de nuevo.
+"""
+
+import codecs
+from pathlib import Path
+
+HEAD_SIZE = 1024 * 1024
+SAMPLE_BLOCK_SIZE = 64 * 1024
+SAMPLE_BLOCKS = 16
+FALLBACK_ENCODING = 'latin-1'
+
+def _is_valid_utf8(block, at_start):
+    """Indica si un bloque de bytes es UTF-8 válido, tolerando caracteres cortados en los bordes."""
+    if not at_start:
+        # El bloque puede empezar a mitad de un carácter multibyte: saltar bytes de continuación
+        skip = 0
+        while skip < 3 and skip < len(block) and (block[skip] & 0xC0) == 0x80:
+            skip += 1
+        block = block[skip:]
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        # final=False tolera un carácter incompleto al final del bloque
+        decoder.decode(block, final=False)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+def detect_encoding(file_path, head_size=HEAD_SIZE, block_size=SAMPLE_BLOCK_SIZE, blocks=SAMPLE_BLOCKS):
+    """
+    Detecta el encoding de un archivo revisando el encabezado y bloques distribuidos a lo largo
+    del archivo. Devuelve 'utf-8-sig', 'utf-8' o 'latin-1'.
+    """
+    file_path = Path(file_path)
+    size = file_path.stat().st_size
+    
+    with open(file_path, 'rb') as f:
+        head = f.read(head_size)
+        if head.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if not _is_valid_utf8(head, at_start=True):
+            return FALLBACK_ENCODING
+        
+        remaining = size - head_size
+        if remaining > 0:
+            step = max(remaining // blocks, block_size)
+            for offset in range(head_size, size, step):
+                f.seek(offset)
+                if not _is_valid_utf8(f.read(block_size), at_start=False):
+                    return FALLBACK_ENCODING
+    
+    return 'utf-8'
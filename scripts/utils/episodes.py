@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tabla de episodios de pacientes: una fila por (paciente, expediente, IAN) con sus conteos,
+totales y fechas. Se calcula en una sola agrupación sobre fechas ya tipadas y se guarda
+para que los scripts no vuelvan a agrupar las filas de detalle.
+Expedientes e IAN se agrupan por su clave sin ceros a la izquierda (utils.expedients.expedient_key).
+Se mantiene por archivo de origen: solo se agrupan las filas de los archivos nuevos o modificados
+y los agregados parciales se combinan con sumas, mínimos, máximos y conteos.
+"""
+
+import pandas as pd
+
+from utils.data_store import (
+    COMBINED_DATASET, EPISODE_PARTIALS, EPISODE_TABLE, partition_name, read_parquet_file,
+    read_parquet_metadata, read_partition, write_parquet_file
+)
+from utils.expedients import normalize_expedient_columns
+from utils.schema import from_cents, normalize_money
+
+EPISODE_KEYS = ['paciente', 'n_expediente_hosp', 'ian_expediente_hosp']
+EPISODE_SOURCE_COLUMNS = EPISODE_KEYS + [
+    'fecha', 'cantidad', 'costo_nivel_6', 'monto_nivel_1', 'monto_nivel_6', 'archivo_origen'
+]
+EPISODE_COLUMNS = EPISODE_KEYS + [
+    'fecha_inicio', 'fecha_fin', 'total_cantidad', 'total_costo_nivel_6', 'total_monto_nivel_1',
+    'total_monto_nivel_6', 'archivo_origen', 'dias_estancia', 'total_registros'
+]
+
+# Montos del detalle y su total por episodio
+MONEY_TOTALS = {
+    'costo_nivel_6': 'total_costo_nivel_6',
+    'monto_nivel_1': 'total_monto_nivel_1',
+    'monto_nivel_6': 'total_monto_nivel_6'
+}
+
+# Cambiar si cambia el contenido de los agregados por archivo: invalida los guardados
+PARTIALS_VERSION = '4'
+
+def _finish(episodes, cents):
+    if not cents:
+        for total in MONEY_TOTALS.values():
+            episodes[total] = from_cents(episodes[total])
+    # Días de estancia
+    episodes['dias_estancia'] = (episodes['fecha_fin'] - episodes['fecha_inicio']).dt.days + 1
+    return episodes[EPISODE_COLUMNS]
+
+def aggregate_episodes(df, dropna=True, cents=False):
+    """
+    Agrupa las filas de detalle por episodio en una sola pasada (ordenado por episodio).
+    Con dropna=False se conservan también las filas con expediente o IAN vacío.
+    Los montos se suman en centavos enteros, así que los totales son exactos sin importar
+    el orden de la suma; se devuelven en pesos salvo con cents=True.
+    """
+    source = normalize_expedient_columns(normalize_money(df[EPISODE_SOURCE_COLUMNS].copy(), cents=True))
+    episodes = source.groupby(EPISODE_KEYS, dropna=dropna).agg(
+        fecha_inicio=('fecha', 'min'),
+        fecha_fin=('fecha', 'max'),
+        total_cantidad=('cantidad', 'sum'),
+        **{total: (col, 'sum') for col, total in MONEY_TOTALS.items()},
+        archivo_origen=('archivo_origen', 'first'),
+        total_registros=('fecha', 'size')
+    ).reset_index()
+    return _finish(episodes, cents)
+
+def merge_episodes(partials, dropna=True, cents=False):
+    """
+    Combina agregados de episodios calculados sobre partes distintas del detalle.
+    partials tiene los montos en centavos (cents=True) y va en el orden de las filas del dataset,
+    para que archivo_origen sea el primero.
+    """
+    combined = pd.concat(partials, ignore_index=True)
+    episodes = combined.groupby(EPISODE_KEYS, dropna=dropna).agg(
+        fecha_inicio=('fecha_inicio', 'min'),
+        fecha_fin=('fecha_fin', 'max'),
+        total_cantidad=('total_cantidad', 'sum'),
+        **{total: (total, 'sum') for total in MONEY_TOTALS.values()},
+        archivo_origen=('archivo_origen', 'first'),
+        total_registros=('total_registros', 'sum')
+    ).reset_index()
+    return _finish(episodes, cents)
+
+def complete_episodes(episodes):
+    """Descarta los agregados con expediente o IAN vacío (no forman un episodio)."""
+    return episodes.dropna(subset=EPISODE_KEYS).reset_index(drop=True)
+
+def _partial_path(filename, partials_path=EPISODE_PARTIALS):
+    return partials_path / f"{partition_name(filename)}.parquet"
+
+def update_episodes(manifest, dataset_path=COMBINED_DATASET, partials_path=EPISODE_PARTIALS):
+    """
+    Actualiza los agregados de episodios por archivo de origen según el manifiesto de ingesta:
+    solo se agrupan las particiones cuyo hash no coincide con el del agregado guardado.
+    Devuelve los agregados combinados y los archivos que se volvieron a agrupar. Los agregados
+    incluyen las filas con expediente o IAN vacío, para que los totales por paciente cubran
+    todo el detalle; complete_episodes deja solo los episodios.
+    """
+    partials = []
+    refreshed = []
+    # Mismo orden que las particiones al leer el dataset completo
+    for filename in sorted(manifest, key=partition_name):
+        sha256 = manifest[filename].get('sha256')
+        partial_file = _partial_path(filename, partials_path)
+        if partial_file.exists():
+            metadata = read_parquet_metadata(partial_file)
+            if (metadata.get('sha256'), metadata.get('version')) == (sha256, PARTIALS_VERSION):
+                partials.append(read_parquet_file(partial_file))
+                continue
+        detail = read_partition(dataset_path, filename, columns=EPISODE_SOURCE_COLUMNS, cents=True)
+        partial = aggregate_episodes(detail, dropna=False, cents=True)
+        write_parquet_file(partial, partial_file,
+                           metadata={'archivo': filename, 'sha256': sha256, 'version': PARTIALS_VERSION})
+        partials.append(partial)
+        refreshed.append(filename)
+    
+    # Agregados de archivos que ya no forman parte del dataset
+    current = {_partial_path(filename, partials_path).name for filename in manifest}
+    if partials_path.exists():
+        for partial_file in partials_path.glob('*.parquet'):
+            if partial_file.name not in current:
+                partial_file.unlink()
+    
+    return merge_episodes(partials, dropna=False), refreshed
+
+def write_episodes(episodes, source_signature, episode_path=EPISODE_TABLE):
+    """Guarda la tabla de episodios junto con la firma del dataset del que se derivó."""
+    return write_parquet_file(episodes, episode_path, metadata={'firma_origen': source_signature})
+
+def read_episodes(source_signature=None, episode_path=EPISODE_TABLE):
+    """
+    Lee la tabla de episodios. Devuelve None si no existe o si se generó a partir de
+    datos distintos a los indicados por source_signature.
+    """
+    if not episode_path.exists():
+        return None
+    if source_signature is not None and read_parquet_metadata(episode_path).get('firma_origen') != source_signature:
+        return None
+    return read_parquet_file(episode_path)
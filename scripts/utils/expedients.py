@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Reglas de estandarización de expedientes y mapa persistido de pares ya estandarizados.
+Hay pocos pares (expediente, IAN) distintos frente a millones de filas, así que la regla
+se evalúa una vez por par y el resultado se propaga a las filas por código.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import EXPEDIENT_MAPPING, read_parquet_file, read_parquet_metadata, write_parquet_file
+
+EXPEDIENT_COLUMN = 'n_expediente_hosp'
+IAN_COLUMN = 'ian_expediente_hosp'
+STANDARDIZED_COLUMN = 'n_expediente_hosp_estandarizado'
+
+# Cambiar si se modifican las reglas: invalida los mapas guardados con la versión anterior
+RULES_VERSION = '1'
+
+def standardize_expedient_number(expedient, ian):
+    """
+    Si el expediente es igual al IAN (o empieza igual que el IAN), lo deja igual.
+    Si no, agrega el prefijo '000' (si no lo tiene).
+    Siempre devuelve string.
+    """
+    if pd.isna(expedient) or expedient == '':
+        return ''
+    expedient_str = str(expedient).strip()
+    ian_str = str(ian).strip() if not pd.isna(ian) else ''
+    # Si el expediente empieza con el IAN o es igual al IAN, lo dejamos igual
+    if ian_str and (expedient_str == ian_str or expedient_str.startswith(ian_str)):
+        return expedient_str
+    # Si ya empieza con '000', lo dejamos igual
+    if expedient_str.startswith('000'):
+        return expedient_str
+    # Si no, agregamos '000'
+    return '000' + expedient_str
+
+def expedient_key(values):
+    """
+    Clave para comparar expedientes o IAN por su valor: sin espacios ni ceros a la izquierda,
+    de modo que '00052586' y '52586' son el mismo expediente (como cuando se leían como float).
+    Los nulos quedan nulos.
+    """
+    return values.astype('string').str.strip().str.replace(r'^0+(?=.)', '', regex=True)
+
+def normalize_expedient_columns(df, columns=(EXPEDIENT_COLUMN, IAN_COLUMN)):
+    """Reemplaza las columnas de expediente e IAN presentes en df por su clave (expedient_key)."""
+    for col in columns:
+        if col in df.columns:
+            df[col] = expedient_key(df[col])
+    return df
+
+def standardize_expedients(expedients, ians):
+    """
+    Versión vectorizada de standardize_expedient_number: aplica las mismas reglas a columnas
+    completas con operaciones de texto de pandas. Devuelve una serie de tipo string.
+    """
+    expedients = expedients.astype('string')
+    expedient_str = expedients.str.strip()
+    ian_str = ians.astype('string').str.strip().fillna('')
+    
+    # "Empieza con el IAN" se compara por grupos de igual largo de IAN (son pocos largos distintos)
+    ian_len = ian_str.str.len()
+    starts_with_ian = np.zeros(len(expedients), dtype=bool)
+    for length in ian_len[ian_len > 0].unique():
+        mask = (ian_len == length).to_numpy(dtype=bool)
+        prefix = expedient_str[mask].str.slice(0, length)
+        starts_with_ian[mask] = (prefix == ian_str[mask]).fillna(False).to_numpy(dtype=bool)
+    
+    keep = starts_with_ian | expedient_str.str.startswith('000').fillna(False).to_numpy(dtype=bool)
+    standardized = expedient_str.where(keep, '000' + expedient_str)
+    
+    # Expedientes vacíos o nulos quedan como ''
+    empty = (expedients.isna() | (expedients == '')).fillna(True)
+    return standardized.mask(empty, '').astype('string')
+
+def factorize_pairs(expedients, ians):
+    """
+    Factoriza los pares (expediente, IAN), incluidos los nulos.
+    Devuelve el código de par de cada fila y un DataFrame con los pares distintos.
+    """
+    expedient_codes, expedient_values = pd.factorize(expedients.astype('string'), use_na_sentinel=False)
+    ian_codes, ian_values = pd.factorize(ians.astype('string'), use_na_sentinel=False)
+    n_ians = max(len(ian_values), 1)
+    codes, pair_keys = pd.factorize(expedient_codes.astype(np.int64) * n_ians + ian_codes)
+    pairs = pd.DataFrame({
+        EXPEDIENT_COLUMN: expedient_values.take(pair_keys // n_ians),
+        IAN_COLUMN: ian_values.take(pair_keys % n_ians)
+    })
+    return codes, pairs
+
+def empty_mapping():
+    """Mapa de expedientes sin pares."""
+    return pd.DataFrame({
+        EXPEDIENT_COLUMN: pd.Series(dtype='string'),
+        IAN_COLUMN: pd.Series(dtype='string'),
+        STANDARDIZED_COLUMN: pd.Series(dtype='string')
+    })
+
+def read_expedient_mapping(mapping_path=EXPEDIENT_MAPPING):
+    """
+    Lee el mapa persistido (expediente, IAN) -> expediente estandarizado.
+    Devuelve un mapa vacío si no existe o si se generó con otra versión de las reglas.
+    """
+    if not mapping_path.exists():
+        return empty_mapping()
+    if read_parquet_metadata(mapping_path).get('version_reglas') != RULES_VERSION:
+        return empty_mapping()
+    mapping = read_parquet_file(mapping_path)
+    return mapping[[EXPEDIENT_COLUMN, IAN_COLUMN, STANDARDIZED_COLUMN]].astype('string')
+
+def write_expedient_mapping(mapping, mapping_path=EXPEDIENT_MAPPING):
+    """Guarda el mapa de expedientes junto con la versión de las reglas que lo generó."""
+    return write_parquet_file(mapping, mapping_path, metadata={'version_reglas': RULES_VERSION})
+
+def standardize_with_mapping(expedients, ians, mapping=None):
+    """
+    Estandariza evaluando la regla una sola vez por par distinto (expediente, IAN).
+    Los pares presentes en mapping se reutilizan sin recalcular.
+    Devuelve la serie estandarizada (mismo índice que expedients) y los pares nuevos.
+    """
+    codes, pairs = factorize_pairs(expedients, ians)
+    if mapping is not None and len(mapping) > 0:
+        # Left merge: conserva el orden de los pares, que es el orden de los códigos
+        pairs = pairs.merge(mapping, how='left', on=[EXPEDIENT_COLUMN, IAN_COLUMN])
+    else:
+        pairs[STANDARDIZED_COLUMN] = pd.Series(pd.NA, index=pairs.index, dtype='string')
+    
+    new_pairs = pairs[STANDARDIZED_COLUMN].isna().to_numpy()
+    pairs.loc[new_pairs, STANDARDIZED_COLUMN] = standardize_expedients(
+        pairs.loc[new_pairs, EXPEDIENT_COLUMN], pairs.loc[new_pairs, IAN_COLUMN]
+    )
+    
+    standardized = pd.Series(pairs[STANDARDIZED_COLUMN].to_numpy()[codes], index=expedients.index, dtype='string')
+    return standardized, pairs[new_pairs].reset_index(drop=True)
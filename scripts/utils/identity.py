@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Resolución de identidad de pacientes.
+Une paciente, expediente e IAN en componentes conexas (union-find) y resume cada paciente
+en una tabla compacta, para que los scripts no recalculen los conteos por paciente.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import IDENTITY_TABLE, read_parquet_file, read_parquet_metadata, write_parquet_file
+from utils.expedients import normalize_expedient_columns
+
+IDENTITY_COLUMNS = ['paciente', 'n_expediente_hosp', 'ian_expediente_hosp']
+
+class UnionFind:
+    """Conjuntos disjuntos sobre nodos 0..n-1 con unión por tamaño y compresión de caminos."""
+    
+    def __init__(self, n):
+        self.parent = np.arange(n)
+        self.size = np.ones(n, dtype=np.int64)
+    
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a == root_b:
+            return
+        if self.size[root_a] < self.size[root_b]:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.size[root_a] += self.size[root_b]
+    
+    def roots(self):
+        """Raíz de cada nodo."""
+        return np.array([self.find(x) for x in range(len(self.parent))])
+
+def _link_codes(links, column, offset):
+    """Códigos de nodo para los valores no vacíos de una columna de enlace."""
+    values = links[column]
+    valid = (values.notna() & (values != '')).fillna(False).to_numpy(dtype=bool)
+    codes, uniques = pd.factorize(values[valid])
+    return valid, codes + offset, len(uniques)
+
+def resolve_identities(df):
+    """
+    Construye la tabla de identidades a partir de las columnas paciente, expediente e IAN.
+    Devuelve una fila por paciente con su identidad resuelta y sus conteos de expedientes e IAN.
+    """
+    # Los enlaces distintos son pocos comparados con las filas; expedientes e IAN se comparan
+    # sin ceros a la izquierda
+    links = normalize_expedient_columns(df[IDENTITY_COLUMNS].drop_duplicates()).drop_duplicates()
+    links = links[links['paciente'].notna()]
+    
+    patient_codes, patients = pd.factorize(links['paciente'])
+    n_patients = len(patients)
+    expedient_valid, expedient_nodes, n_expedients = _link_codes(links, 'n_expediente_hosp', n_patients)
+    ian_valid, ian_nodes, n_ians = _link_codes(links, 'ian_expediente_hosp', n_patients + n_expedients)
+    
+    # Expedientes e IAN vacíos no enlazan pacientes (agruparían a todos los que no lo tienen)
+    components = UnionFind(n_patients + n_expedients + n_ians)
+    for a, b in zip(patient_codes[expedient_valid], expedient_nodes):
+        components.union(a, b)
+    for a, b in zip(patient_codes[ian_valid], ian_nodes):
+        components.union(a, b)
+    
+    identities = pd.DataFrame({
+        'paciente': patients,
+        'raiz': components.roots()[:n_patients]
+    }).sort_values('paciente', ignore_index=True)
+    # Identidades numeradas según el menor paciente de cada componente
+    identities['identidad'] = (pd.factorize(identities['raiz'])[0] + 1).astype(np.int32)
+    identities['pacientes_en_identidad'] = identities.groupby('identidad')['paciente'].transform('size').astype(np.int32)
+    
+    # Mismos conteos que groupby('paciente')[col].nunique() sobre el dataset completo
+    for column, count_column in [('n_expediente_hosp', 'num_expedientes'), ('ian_expediente_hosp', 'num_ians')]:
+        counts = links.groupby('paciente')[column].nunique()
+        identities[count_column] = identities['paciente'].map(counts).fillna(0).astype(np.int32)
+    
+    return identities.drop(columns='raiz')
+
+def write_identities(identities, source_signature, identity_path=IDENTITY_TABLE):
+    """Guarda la tabla de identidades junto con la firma del dataset del que se derivó."""
+    return write_parquet_file(identities, identity_path, metadata={'firma_origen': source_signature})
+
+def read_identities(source_signature=None, identity_path=IDENTITY_TABLE):
+    """
+    Lee la tabla de identidades. Devuelve None si no existe o si se generó a partir de
+    datos distintos a los indicados por source_signature.
+    """
+    if not identity_path.exists():
+        return None
+    if source_signature is not None and read_parquet_metadata(identity_path).get('firma_origen') != source_signature:
+        return None
+    return read_parquet_file(identity_path)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Métricas por paso del pipeline: tiempo de reloj y de CPU, pico de memoria (RSS), filas
+leídas y generadas y bytes leídos y escritos. Se guardan en un registro JSON por ejecución
+y, opcionalmente, en un archivo de texto para el textfile collector de Prometheus, de modo
+que se pueda seguir qué etapa empeora a medida que crece el volumen de datos.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import pyarrow.parquet as pq
+
+RUN_LOG_PATH = Path("resultados/ejecuciones")
+
+# Filas leídas por las funciones compartidas de lectura (datasets, tablas y CSV) en este proceso
+_rows_read = 0
+
+def count_rows_read(rows):
+    """Suma filas al contador de lectura del proceso."""
+    global _rows_read
+    _rows_read += rows
+
+def _proc_io():
+    """Bytes leídos y escritos por este proceso (rchar/wchar de /proc/self/io), o None si no hay /proc."""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            values = dict(line.split(': ') for line in f.read().splitlines())
+        return int(values['rchar']), int(values['wchar'])
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _reset_peak_rss():
+    """Reinicia el pico de RSS del proceso (VmHWM, solo Linux)."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+def _maxrss_bytes(children=False):
+    """Pico de RSS de este proceso (o del mayor subproceso terminado) desde su inicio."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa kilobytes; macOS, bytes
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+def _peak_rss():
+    """Pico de RSS desde el último reinicio o, sin /proc, desde el inicio del proceso."""
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return _maxrss_bytes()
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+@contextmanager
+def measure(in_process=True):
+    """
+    Mide el bloque y completa al salir el dict que entrega: tiempo_s, cpu_s, pico_rss_bytes,
+    filas_leidas, bytes_leidos y bytes_escritos. El CPU incluye el de los subprocesos.
+    Si el paso corre en un intérprete aparte, las filas y bytes no se pueden medir (None)
+    y el pico de memoria es el mayor de los subprocesos terminados hasta ese momento.
+    """
+    metrics = {}
+    start = time.time()
+    cpu_start = time.process_time()
+    children_cpu_start = _children_cpu()
+    rows_start = _rows_read
+    io_start = _proc_io()
+    _reset_peak_rss()
+    try:
+        yield metrics
+    finally:
+        io_end = _proc_io()
+        measured_io = in_process and io_start is not None and io_end is not None
+        metrics.update({
+            'tiempo_s': time.time() - start,
+            'cpu_s': time.process_time() - cpu_start + _children_cpu() - children_cpu_start,
+            'pico_rss_bytes': _peak_rss() if in_process else _maxrss_bytes(children=True),
+            'filas_leidas': _rows_read - rows_start if in_process else None,
+            'bytes_leidos': io_end[0] - io_start[0] if measured_io else None,
+            'bytes_escritos': io_end[1] - io_start[1] if measured_io else None
+        })
+
+def _csv_rows(file_path):
+    """Filas de un CSV (líneas sin el encabezado), contadas por bloques."""
+    lines = 0
+    last = b'\n'
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            lines += block.count(b'\n')
+            last = block[-1:]
+    if last != b'\n':
+        lines += 1
+    return max(lines - 1, 0)
+
+def artifact_rows(path):
+    """Filas de un artefacto tabular (Parquet o CSV, archivo o directorio); None si no es una tabla."""
+    path = Path(path)
+    if path.is_dir():
+        files = [f for f in path.rglob('*') if f.is_file() and f.suffix in ('.parquet', '.csv') and
+                 not any(part.startswith('.') for part in f.relative_to(path).parts)]
+        counts = [artifact_rows(f) for f in files]
+        return sum(counts) if counts else None
+    if path.suffix == '.parquet' and path.exists():
+        return pq.read_metadata(path).num_rows
+    if path.suffix == '.csv' and path.exists():
+        return _csv_rows(path)
+    return None
+
+def output_rows(outputs):
+    """Filas generadas: suma de las filas de las salidas tabulares declaradas."""
+    counts = [rows for rows in (artifact_rows(output) for output in outputs) if rows is not None]
+    return sum(counts) if counts else None
+
+def write_run_log(run, log_path=RUN_LOG_PATH):
+    """Guarda el registro JSON de una ejecución del pipeline; devuelve su ruta."""
+    log_path = Path(log_path)
+    log_path.mkdir(parents=True, exist_ok=True)
+    log_file = log_path / f"ejecucion_{run['inicio'].replace(':', '').replace('-', '')[:15]}.json"
+    tmp_file = log_file.with_name(f".{log_file.name}.tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(run, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, log_file)
+    return log_file
+
+# Métricas por paso exportadas a Prometheus: (nombre, campo del registro, descripción)
+PROMETHEUS_STEP_METRICS = [
+    ('pipeline_step_wall_seconds', 'tiempo_s', 'Tiempo de reloj del paso'),
+    ('pipeline_step_cpu_seconds', 'cpu_s', 'Tiempo de CPU del paso'),
+    ('pipeline_step_peak_rss_bytes', 'pico_rss_bytes', 'Pico de memoria residente del paso'),
+    ('pipeline_step_rows_read', 'filas_leidas', 'Filas leídas por el paso'),
+    ('pipeline_step_rows_written', 'filas_generadas', 'Filas en las salidas tabulares del paso'),
+    ('pipeline_step_bytes_read', 'bytes_leidos', 'Bytes leídos por el paso'),
+    ('pipeline_step_bytes_written', 'bytes_escritos', 'Bytes escritos por el paso')
+]
+
+def write_prometheus_textfile(run, textfile_path):
+    """
+    Escribe las métricas de la ejecución en formato de texto de Prometheus (para el
+    textfile collector de node_exporter). Requiere prometheus-client; devuelve False si no está.
+    """
+    try:
+        from prometheus_client import CollectorRegistry, Gauge, write_to_textfile
+    except ImportError:
+        return False
+    
+    registry = CollectorRegistry()
+    for name, field, description in PROMETHEUS_STEP_METRICS:
+        gauge = Gauge(name, description, ['step', 'status'], registry=registry)
+        for step in run['pasos']:
+            if step.get(field) is not None:
+                gauge.labels(step=step['paso'], status=step['estado']).set(step[field])
+    Gauge('pipeline_wall_seconds', 'Tiempo total de la ejecución del pipeline',
+          registry=registry).set(run['tiempo_total_s'])
+    Gauge('pipeline_failed_steps', 'Pasos fallidos en la ejecución',
+          registry=registry).set(run['pasos_fallidos'])
+    Gauge('pipeline_last_run_timestamp_seconds', 'Fin de la última ejecución (epoch)',
+          registry=registry).set(run['fin_epoch'])
+    
+    textfile_path = Path(textfile_path)
+    textfile_path.parent.mkdir(parents=True, exist_ok=True)
+    write_to_textfile(str(textfile_path), registry)
+    return True
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Ejecución de los pasos del pipeline como grafo de dependencias.
+Cada paso declara los artefactos que lee ("inputs") y los que genera ("outputs"); un paso
+queda listo cuando terminaron los pasos que generan sus entradas. Con varios workers los
+pasos listos se ejecutan en paralelo en un pool de procesos, cada proceso con su propia
+caché de datasets, de modo que el tiempo total se acerca al de la ruta crítica.
+Con una caché de pasos (utils.step_cache), los pasos cuya clave ya está guardada restauran
+sus salidas en lugar de ejecutarse. Los pasos ya completados en una ejecución anterior
+(ver utils.checkpoint) se pueden dar por terminados sin ejecutarlos. Con profile cada paso
+se ejecuta bajo cProfile (ver utils.profiling).
+"""
+
+import importlib
+import io
+import subprocess
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+
+from utils.data_store import DatasetCache, use_dataset_cache
+from utils.metrics import measure, output_rows
+from utils.step_cache import StepCache
+
+OK = 'ok'
+RESTORED = 'cache'
+FAILED = 'error'
+SKIPPED = 'omitido'
+RESUMED = 'reanudado'
+# Estados con los que los pasos dependientes pueden ejecutarse
+COMPLETED = (OK, RESTORED, RESUMED)
+
+# Cachés de cada proceso del pool (ver _init_worker)
+_worker_cache = None
+_worker_step_cache = None
+
+def step_module(script_path):
+    """Nombre de módulo de un script del pipeline (scripts/analysis/eda.py -> analysis.eda)."""
+    return '.'.join(Path(script_path).relative_to('scripts').with_suffix('').parts)
+
+def execute_step(step, cache=None, in_process=True, capture=False, profile=False):
+    """
+    Ejecuta la función del paso en este proceso, o el script en un intérprete aparte.
+    Con capture la salida del intérprete aparte se reenvía a sys.stdout/sys.stderr.
+    Con profile la función de entrada (decorada con utils.profiling.profiled) se perfila.
+    """
+    if not in_process:
+        command = [sys.executable, step["script"]] + (["--perfil"] if profile else [])
+        result = subprocess.run(command, capture_output=capture, text=True)
+        if capture:
+            sys.stdout.write(result.stdout)
+            sys.stderr.write(result.stderr)
+        return result.returncode == 0
+    
+    module = importlib.import_module(step_module(step["script"]))
+    params = dict(step.get("params", {}))
+    if profile:
+        params["profile"] = True
+    with use_dataset_cache(cache):
+        try:
+            getattr(module, step["function"])(**params)
+        except SystemExit as e:
+            return e.code in (None, 0)
+    return True
+
+def step_dependencies(steps):
+    """
+    Para cada paso, los índices de los pasos que generan sus entradas.
+    Las entradas que ningún paso genera (datos raw) no crean dependencias.
+    """
+    producers = {}
+    for i, step in enumerate(steps):
+        for artifact in step.get("outputs", []):
+            if artifact in producers:
+                raise ValueError(f"{artifact} lo generan dos pasos: "
+                                 f"{steps[producers[artifact]]['name']} y {step['name']}")
+            producers[artifact] = i
+    
+    dependencies = []
+    for i, step in enumerate(steps):
+        required = {producers[artifact] for artifact in step.get("inputs", []) if artifact in producers}
+        dependencies.append(sorted(required - {i}))
+    topological_order(dependencies)
+    return dependencies
+
+def topological_order(dependencies):
+    """Orden de ejecución que respeta las dependencias (a igualdad, el orden de la lista)."""
+    order = []
+    done = set()
+    while len(order) < len(dependencies):
+        ready = [i for i, deps in enumerate(dependencies) if i not in done and all(d in done for d in deps)]
+        if not ready:
+            raise ValueError("Las dependencias entre pasos forman un ciclo")
+        order.append(ready[0])
+        done.add(ready[0])
+    return order
+
+def critical_path(dependencies, durations):
+    """Ruta crítica: la cadena de dependencias de mayor duración. Devuelve (duración, índices)."""
+    finish = {}
+    previous = {}
+    for i in topological_order(dependencies):
+        if i not in durations:
+            continue
+        start = 0.0
+        for d in dependencies[i]:
+            if d in finish and finish[d] > start:
+                start = finish[d]
+                previous[i] = d
+        finish[i] = start + durations[i]
+    if not finish:
+        return 0.0, []
+    
+    last = max(finish, key=finish.get)
+    path = [last]
+    while path[-1] in previous:
+        path.append(previous[path[-1]])
+    return finish[last], path[::-1]
+
+def _run(step, cache, in_process, step_cache=None, capture=False, profile=False):
+    """
+    Restaura el paso desde la caché de pasos o lo ejecuta (y guarda sus salidas). Devuelve el estado.
+    Al perfilar, el paso siempre se ejecuta: restaurarlo no diría nada de su costo.
+    """
+    try:
+        key = None
+        if step_cache is not None:
+            key = step_cache.key(step)
+            if not profile and step_cache.restore(step, key):
+                print(f"Salidas restauradas desde la caché de pasos ({key[:12]})")
+                return RESTORED
+        if not execute_step(step, cache, in_process, capture, profile):
+            return FAILED
+        if step_cache is not None:
+            step_cache.store(step, key)
+            step_cache.save_hashes()
+        return OK
+    except Exception:
+        traceback.print_exc()
+        return FAILED
+
+def _run_measured(step, cache, in_process, step_cache=None, capture=False, profile=False):
+    """Ejecuta _run midiendo el paso (ver utils.metrics.measure). Devuelve (estado, métricas)."""
+    with measure(in_process) as metrics:
+        result = _run(step, cache, in_process, step_cache, capture, profile)
+    metrics['filas_generadas'] = output_rows(step.get("outputs", [])) if result != FAILED else None
+    return result, metrics
+
+def _init_worker(use_cache, use_step_cache):
+    global _worker_cache, _worker_step_cache
+    _worker_cache = DatasetCache() if use_cache else None
+    _worker_step_cache = StepCache() if use_step_cache else None
+
+def _run_in_worker(step, in_process, profile):
+    """Ejecuta un paso en un proceso del pool capturando su salida, para mostrarla completa al terminar."""
+    output = io.StringIO()
+    with redirect_stdout(output), redirect_stderr(output):
+        result, metrics = _run_measured(step, _worker_cache, in_process, _worker_step_cache, capture=True,
+                                        profile=profile)
+    return result, metrics, output.getvalue()
+
+def run_steps(steps, workers=1, cache=None, in_process=True, step_cache=None, on_start=None, on_finish=None,
+              completed=(), profile=False):
+    """
+    Ejecuta los pasos respetando sus dependencias y devuelve (estado, métricas) por paso.
+    Con workers=1 los pasos corren uno tras otro en este proceso, con su salida en vivo
+    y compartiendo cache; con más workers, los pasos listos corren en paralelo (cada proceso
+    con su propia caché si se indicó cache) y su salida se entrega en on_finish.
+    Con step_cache, los pasos cuya clave está guardada se restauran en lugar de ejecutarse.
+    on_start(i) se llama al lanzar un paso y on_finish(i, estado, métricas, salida) al terminar;
+    si on_finish devuelve False no se lanzan más pasos. Los pasos que dependen de uno
+    fallido (o que no se lanzaron) quedan omitidos. Los pasos de completed (índices) no se
+    ejecutan: quedan como reanudados, con sus salidas de una ejecución anterior.
+    Con profile cada paso se ejecuta bajo cProfile, sin restaurarlo de la caché de pasos.
+    """
+    dependencies = step_dependencies(steps)
+    status = {i: RESUMED for i in completed}
+    step_metrics = {}
+    stop = False
+    
+    def ready_steps():
+        return [i for i in range(len(steps)) if i not in status and
+                all(status.get(d) in COMPLETED for d in dependencies[i])]
+    
+    def finish(i, result, metrics, output):
+        nonlocal stop
+        status[i] = result
+        step_metrics[i] = metrics
+        if on_finish is not None and on_finish(i, result, metrics, output) is False:
+            stop = True
+    
+    if workers <= 1:
+        while not stop:
+            ready = ready_steps()
+            if not ready:
+                break
+            i = ready[0]
+            if on_start is not None:
+                on_start(i)
+            result, metrics = _run_measured(steps[i], cache, in_process, step_cache, profile=profile)
+            finish(i, result, metrics, None)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(in_process and cache is not None, step_cache is not None)) as executor:
+            running = {}
+            while True:
+                if not stop:
+                    for i in ready_steps():
+                        if i not in running.values():
+                            if on_start is not None:
+                                on_start(i)
+                            running[executor.submit(_run_in_worker, steps[i], in_process, profile)] = i
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=running.get):
+                    i = running.pop(future)
+                    try:
+                        finish(i, *future.result())
+                    except Exception as e:
+                        # El proceso del pool terminó de forma anormal
+                        finish(i, FAILED, {'tiempo_s': 0.0}, f"{type(e).__name__}: {e}\n")
+    
+    return {i: status.get(i, SKIPPED) for i in range(len(steps))}, step_metrics
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Perfilado de los pasos del pipeline con cProfile.
+La función de entrada de cada script se decora con @profiled: con profile=True (o --perfil al
+ejecutar el script) se ejecuta bajo el perfilador y se guardan en resultados/perfiles/ el
+archivo pstats del paso y un resumen con las funciones de mayor tiempo acumulado.
+"""
+
+import cProfile
+import functools
+import inspect
+import io
+import pstats
+from datetime import datetime
+from pathlib import Path
+
+PROFILES_PATH = Path("resultados/perfiles")
+
+# Funciones incluidas en el resumen de cada paso
+TOP_N = 30
+
+def add_profile_argument(parser):
+    """Agrega la opción --perfil (alias --profile) al parser de un script."""
+    parser.add_argument("--perfil", "--profile", action="store_true",
+                        help=f"Perfila la ejecución y guarda el resultado en {PROFILES_PATH}/")
+
+def write_profile(profiler, name, profiles_path=PROFILES_PATH, top=TOP_N):
+    """Guarda el pstats del perfilador y su resumen por tiempo acumulado; devuelve sus rutas."""
+    profiles_path = Path(profiles_path)
+    profiles_path.mkdir(parents=True, exist_ok=True)
+    stats_file = profiles_path / f"{name}.pstats"
+    summary_file = profiles_path / f"{name}_top.txt"
+    profiler.dump_stats(stats_file)
+    
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+    with open(summary_file, 'w', encoding='utf-8') as f:
+        f.write(f"PERFIL DEL PASO: {name}\n")
+        f.write(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Funciones con mayor tiempo acumulado (top {top})\n")
+        f.write("=" * 60 + "\n")
+        f.write(output.getvalue())
+    return stats_file, summary_file
+
+def profiled(func):
+    """
+    Decora la función de entrada de un paso: acepta además profile=True para ejecutarla bajo
+    cProfile. Los archivos llevan el nombre del script (eda.pstats, eda_top.txt).
+    """
+    name = Path(inspect.getfile(func)).stem
+    
+    @functools.wraps(func)
+    def wrapper(*args, profile=False, **kwargs):
+        if not profile:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            stats_file, summary_file = write_profile(profiler, name)
+            print(f"🔬 Perfil guardado: {stats_file} (resumen: {summary_file})")
+    
+    return wrapper
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Conciliación por paciente entre el resumen original y los totales derivados del detalle.
+Ambos lados se agrupan por paciente y se alinean sobre la clave entera en una sola pasada
+vectorizada, sin merges externos ni recorridos por paciente.
+Los totales se suman y comparan en centavos enteros: la diferencia es exacta y una
+coincidencia significa diferencia cero, sin márgenes por redondeo de punto flotante.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.schema import from_cents, to_cents
+
+# Diferencia máxima (en pesos) para considerar que los totales coinciden
+TOLERANCE = 0.01
+
+MATCH = 'coincide'
+WITHIN_TOLERANCE = 'dentro_tolerancia'
+DIFFERENT = 'diferencia'
+ONLY_SUMMARY = 'solo_resumen'
+ONLY_DETAIL = 'solo_detalle'
+STATUSES = [MATCH, WITHIN_TOLERANCE, DIFFERENT, ONLY_SUMMARY, ONLY_DETAIL]
+
+def _align(totals, keys):
+    """Ubica los totales de un lado en el arreglo común de pacientes."""
+    positions = np.searchsorted(keys, totals.index.to_numpy(dtype=np.int64))
+    amounts = np.zeros(len(keys), dtype=np.int64)
+    amounts[positions] = totals['sum'].to_numpy(dtype=np.int64)
+    counts = np.zeros(len(keys), dtype=np.int64)
+    counts[positions] = totals['size'].to_numpy()
+    return amounts, counts
+
+def _to_pesos(cents, counts):
+    """Centavos a pesos; NaN donde el lado correspondiente no tiene registros."""
+    return np.where(counts > 0, from_cents(cents), np.nan)
+
+def _patient_totals(df, column, count_column=None):
+    """Total en centavos y número de registros por paciente."""
+    totals = pd.DataFrame({'paciente': df['paciente'], 'sum': to_cents(df[column])})
+    if count_column is None:
+        return totals.groupby('paciente')['sum'].agg(['sum', 'size'])
+    totals['size'] = df[count_column]
+    return totals.groupby('paciente')[['sum', 'size']].sum()
+
+def reconcile(summary, summary_column, detail, detail_column, tolerance=TOLERANCE, detail_count_column=None):
+    """
+    Concilia el total por paciente de summary[summary_column] contra detail[detail_column].
+    Devuelve una fila por paciente (ordenada por paciente) con ambos totales, la diferencia,
+    el número de registros de cada lado y el estado de la conciliación.
+    Si detail ya está agregado, detail_count_column indica cuántos registros representa cada fila.
+    """
+    summary_totals = _patient_totals(summary, summary_column)
+    detail_totals = _patient_totals(detail, detail_column, detail_count_column)
+    keys = np.union1d(summary_totals.index.to_numpy(dtype=np.int64), detail_totals.index.to_numpy(dtype=np.int64))
+    
+    summary_amounts, summary_counts = _align(summary_totals, keys)
+    detail_amounts, detail_counts = _align(detail_totals, keys)
+    difference = summary_amounts - detail_amounts
+    difference_abs = np.abs(difference)
+    
+    status = np.select(
+        [summary_counts == 0, detail_counts == 0, difference_abs == 0, difference_abs <= round(tolerance * 100)],
+        [ONLY_DETAIL, ONLY_SUMMARY, MATCH, WITHIN_TOLERANCE],
+        default=DIFFERENT
+    )
+    return pd.DataFrame({
+        'paciente': pd.array(keys, dtype='Int32'),
+        'gasto_resumen': _to_pesos(summary_amounts, summary_counts),
+        'gasto_procesado': _to_pesos(detail_amounts, detail_counts),
+        'diferencia': _to_pesos(difference, summary_counts * detail_counts),
+        'diferencia_abs': _to_pesos(difference_abs, summary_counts * detail_counts),
+        'registros_resumen': summary_counts,
+        'registros_procesado': detail_counts,
+        'estado': pd.Categorical(status, categories=STATUSES)
+    })
+
+def status_counts(reconciliation):
+    """Número de pacientes en cada estado, en el orden de STATUSES."""
+    return reconciliation['estado'].value_counts().reindex(STATUSES, fill_value=0)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Muestra estratificada del dataset combinado y estimadores con intervalos de confianza.
+Los estratos son (archivo_origen, origen): de cada partición solo se lee la columna origen
+para conocer el tamaño de cada estrato, y luego solo las filas sorteadas. Los totales,
+medias y proporciones se estiman por expansión dentro de cada estrato, con corrección por
+población finita, de modo que el costo depende del tamaño de la muestra y no del dataset.
+"""
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import (
+    COMBINED_DATASET, PARTITION_COLUMN, partition_name, partition_path, read_partition, take_partition_rows
+)
+
+DEFAULT_SAMPLE_SIZE = 10_000
+SAMPLE_SEED = 0
+STRATIFY_COLUMN = 'origen'
+# Columna agregada a la muestra con el número de estrato de cada fila
+STRATUM_COLUMN = 'estrato'
+# Mínimo de filas por estrato (con menos no se puede estimar su varianza)
+MIN_STRATUM_SAMPLE = 2
+# Cuantil normal del intervalo de confianza del 95%
+Z_95 = 1.959963984540054
+
+def allocate(sizes, sample_size):
+    """Filas a sortear por estrato: proporcional a su tamaño, al menos MIN_STRATUM_SAMPLE y a lo sumo todas."""
+    allocation = np.maximum(np.round(sizes * sample_size / sizes.sum()), MIN_STRATUM_SAMPLE)
+    return np.minimum(allocation, sizes).astype('int64')
+
+def stratified_sample(manifest, dataset_path=COMBINED_DATASET, sample_size=DEFAULT_SAMPLE_SIZE, seed=SAMPLE_SEED):
+    """
+    Muestra estratificada por (archivo_origen, origen) de las particiones del manifiesto.
+    Devuelve la muestra, con la columna STRATUM_COLUMN, y una tabla con el archivo, el origen
+    y el tamaño de cada estrato en la población (filas) y en la muestra (muestra).
+    """
+    files = [filename for filename in sorted(manifest, key=partition_name)
+             if any(partition_path(dataset_path, filename).glob('*.parquet'))]
+    
+    # Tamaño de cada estrato: solo se lee la columna de estratificación
+    positions = []
+    strata = []
+    for filename in files:
+        values = read_partition(dataset_path, filename, columns=[STRATIFY_COLUMN])[STRATIFY_COLUMN]
+        for value, rows in values.groupby(values, dropna=False, observed=True, sort=False).indices.items():
+            positions.append(rows)
+            strata.append((filename, value, len(rows)))
+    sizes = pd.DataFrame(strata, columns=[PARTITION_COLUMN, STRATIFY_COLUMN, 'filas'])
+    sizes['muestra'] = allocate(sizes['filas'].to_numpy(), sample_size) if len(sizes) else []
+    
+    # Sorteo dentro de cada estrato y lectura de solo esas filas, partición por partición
+    rng = np.random.default_rng(seed)
+    samples = []
+    for filename in files:
+        chosen = []
+        labels = []
+        for stratum in sizes.index[sizes[PARTITION_COLUMN] == filename]:
+            picked = rng.choice(positions[stratum], size=sizes.at[stratum, 'muestra'], replace=False)
+            chosen.append(picked)
+            labels.append(np.full(len(picked), stratum))
+        chosen = np.concatenate(chosen)
+        order = np.argsort(chosen)
+        sample = take_partition_rows(dataset_path, filename, chosen[order])
+        sample[STRATUM_COLUMN] = np.concatenate(labels)[order]
+        samples.append(sample)
+    sample = pd.concat(samples, ignore_index=True) if samples else pd.DataFrame(columns=[STRATUM_COLUMN])
+    return sample, sizes
+
+def weighted_quantile(values, weights, q):
+    """Cuantil de la población estimado con los pesos de expansión de la muestra."""
+    if len(values) == 0:
+        return np.nan
+    order = np.argsort(values, kind='stable')
+    values, weights = values[order], weights[order]
+    position = (np.cumsum(weights) - weights / 2) / weights.sum()
+    return float(np.interp(q, position, values))
+
+class StratifiedEstimator:
+    """
+    Estimaciones de la población a partir de una muestra estratificada. Cada método devuelve
+    (estimación, semiamplitud del intervalo de confianza del 95%).
+    """
+    
+    def __init__(self, sample, sizes):
+        self.sample = sample
+        self.sizes = sizes
+        self.strata = sample[STRATUM_COLUMN].to_numpy()
+        population = sizes['filas'].to_numpy(dtype='float64')
+        taken = sizes['muestra'].to_numpy(dtype='float64')
+        self.population = int(population.sum())
+        self.weights = (population / np.maximum(taken, 1))[self.strata]
+    
+    def subset(self, mask):
+        """Estimador restringido a los estratos de la tabla de tamaños indicados por mask."""
+        sizes = self.sizes[mask]
+        sample = self.sample[self.sample[STRATUM_COLUMN].isin(sizes.index)].copy()
+        renumber = pd.Series(np.arange(len(sizes)), index=sizes.index)
+        sample[STRATUM_COLUMN] = renumber[sample[STRATUM_COLUMN]].to_numpy()
+        return StratifiedEstimator(sample.reset_index(drop=True), sizes.reset_index(drop=True))
+    
+    def _total(self, values):
+        """Total por expansión y su varianza: sum N_h² (1 - n_h/N_h) s_h² / n_h."""
+        groups = pd.DataFrame({'y': values, 'h': self.strata}).groupby('h')['y']
+        stats = pd.DataFrame({'mean': groups.mean(), 'var': groups.var(ddof=1), 'n': groups.size()})
+        stats['N'] = self.sizes['filas'].reindex(stats.index).astype('float64')
+        stats['var'] = stats['var'].fillna(0.0)
+        total = float((stats['N'] * stats['mean']).sum())
+        variance = float((stats['N'] ** 2 * (1 - stats['n'] / stats['N']) * stats['var'] / stats['n']).sum())
+        return total, variance
+    
+    def total(self, values):
+        """Total de una columna (los nulos no suman, como en pandas)."""
+        total, variance = self._total(np.nan_to_num(values.to_numpy(dtype='float64', na_value=np.nan)))
+        return total, Z_95 * np.sqrt(variance)
+    
+    def count(self, mask):
+        """Filas de la población que cumplen la condición."""
+        total, variance = self._total(np.asarray(mask, dtype='float64'))
+        return total, Z_95 * np.sqrt(variance)
+    
+    def proportion(self, mask):
+        """Proporción de filas de la población que cumplen la condición."""
+        count, half_width = self.count(mask)
+        return count / self.population, half_width / self.population
+    
+    def mean(self, values):
+        """Media de los valores no nulos: estimador de razón, con varianza por linealización."""
+        y = values.to_numpy(dtype='float64', na_value=np.nan)
+        x = (~np.isnan(y)).astype('float64')
+        y = np.nan_to_num(y)
+        total_y, _ = self._total(y)
+        total_x, _ = self._total(x)
+        if total_x == 0:
+            return np.nan, np.nan
+        ratio = total_y / total_x
+        _, variance = self._total(y - ratio * x)
+        return ratio, Z_95 * np.sqrt(variance) / total_x
+    
+    def _values(self, values):
+        y = values.to_numpy(dtype='float64', na_value=np.nan)
+        valid = ~np.isnan(y)
+        return y[valid], self.weights[valid]
+    
+    def quantile(self, values, q):
+        return weighted_quantile(*self._values(values), q)
+    
+    def std(self, values):
+        """Desviación estándar de la población estimada con los pesos de la muestra."""
+        y, weights = self._values(values)
+        total = weights.sum()
+        if total <= 1:
+            return np.nan
+        mean = np.sum(weights * y) / total
+        return float(np.sqrt(np.sum(weights * (y - mean) ** 2) / (total - 1)))
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Registro de tipos de datos compartido por todos los scripts.
+Declara tipos compactos para las columnas conocidas (ids enteros, categorías, expedientes
+como texto y fechas), de modo que ningún script dependa de la inferencia de pandas.
+"""
+
+import pandas as pd
+
+# Detalle de resultados de pacientes (archivos de período y datasets procesados)
+RESULTS_DTYPES = {
+    'paciente': 'Int32',
+    'n_expediente_hosp': 'string',
+    'n_expediente_hosp_original': 'string',
+    'ian_expediente_hosp': 'string',
+    'origen': 'category',
+    'area_servicio': 'category',
+    'descripcion': 'string',
+    'cantidad': 'float64',
+    'costo_nivel_6': 'float64',
+    'monto_nivel_1': 'float64',
+    'monto_nivel_6': 'float64',
+    'archivo_origen': 'category'
+}
+RESULTS_DATE_COLUMNS = ['fecha', 'fecha_egreso_general']
+
+# Archivo de resumen original (Resumen Pacientes 2024-2025.csv)
+SUMMARY_DTYPES = {
+    'paciente': 'Int32',
+    'n_expediente_hosp': 'string',
+    'ian_expediente_hosp': 'string',
+    'gasto_nivel_6': 'float64',
+    'gasto_nivel_1': 'float64'
+}
+SUMMARY_DATE_COLUMNS = ['fecha_ingreso_hosp', 'fecha_egreso_hosp']
+
+# Columnas de dinero. Pueden guardarse como centavos enteros (Int64): una columna de dinero
+# entera siempre se interpreta en centavos
+MONEY_COLUMNS = ['costo_nivel_6', 'monto_nivel_1', 'monto_nivel_6', 'gasto_nivel_6', 'gasto_nivel_1']
+
+def parse_dates(df, date_columns):
+    """
+    Convierte a fecha las columnas presentes. Si el formato inferido no sirve para todas
+    las filas se interpreta cada valor por separado; los valores inválidos quedan como NaT.
+    """
+    for col in date_columns:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            try:
+                df[col] = pd.to_datetime(df[col])
+            except (ValueError, TypeError):
+                df[col] = pd.to_datetime(df[col], format='mixed', errors='coerce')
+    return df
+
+def _is_numeric(dtype):
+    return dtype not in ('string', 'category')
+
+def coerce_numeric(df, dtypes):
+    """
+    Convierte las columnas numéricas declaradas; los valores no numéricos quedan como nulos
+    en lugar de hacer fallar la lectura de todo el archivo.
+    """
+    for col, dtype in dtypes.items():
+        if col in df.columns and _is_numeric(dtype) and str(df[col].dtype) != dtype:
+            values = pd.to_numeric(df[col], errors='coerce')
+            try:
+                df[col] = values.astype(dtype)
+            except (ValueError, TypeError):
+                # Por ejemplo, decimales en una columna declarada entera
+                df[col] = values
+    return df
+
+def to_cents(values):
+    """Montos en pesos a centavos enteros (Int64), redondeando al centavo. Los enteros ya son centavos."""
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype('Int64')
+    return (values.astype('float64') * 100).round().astype('Int64')
+
+def from_cents(values):
+    """Centavos enteros a pesos (float64); los nulos quedan como NaN."""
+    return values.astype('float64') / 100
+
+def normalize_money(df, cents=False):
+    """
+    Deja las columnas de dinero presentes en pesos (float64) o, con cents=True,
+    en centavos enteros (Int64), sin importar cómo se hayan guardado.
+    """
+    for col in MONEY_COLUMNS:
+        if col not in df.columns:
+            continue
+        if cents:
+            df[col] = to_cents(df[col])
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = from_cents(df[col])
+    return df
+
+def apply_schema(df, dtypes=RESULTS_DTYPES, date_columns=RESULTS_DATE_COLUMNS, cents=False):
+    """
+    Ajusta al registro los tipos de un DataFrame ya cargado (solo columnas que difieran).
+    Las columnas de dinero quedan en pesos o, con cents=True, en centavos enteros.
+    """
+    df = normalize_money(df, cents)
+    for col, dtype in dtypes.items():
+        if cents and col in MONEY_COLUMNS:
+            continue
+        if col in df.columns and str(df[col].dtype) != dtype:
+            try:
+                df[col] = df[col].astype(dtype)
+            except (ValueError, TypeError):
+                # Se conserva el tipo original si los datos no admiten el declarado
+                pass
+    return parse_dates(df, date_columns)
+
+def read_csv_typed(file_path, dtypes=RESULTS_DTYPES, date_columns=RESULTS_DATE_COLUMNS, columns=None, **kwargs):
+    """
+    Lee un CSV con los tipos del registro. Acepta los mismos argumentos que pd.read_csv;
+    con chunksize devuelve un iterador de bloques ya tipados.
+    columns limita la lectura a esas columnas (las que no existan en el archivo se ignoran).
+    """
+    if columns is not None:
+        wanted = set(columns)
+        kwargs['usecols'] = lambda col: col in wanted
+    # Las columnas de texto se tipan al parsear; las numéricas se convierten después
+    text_dtypes = {col: dtype for col, dtype in dtypes.items() if not _is_numeric(dtype)}
+    reader = pd.read_csv(file_path, dtype=text_dtypes, **kwargs)
+    if kwargs.get('chunksize'):
+        return (parse_dates(coerce_numeric(chunk, dtypes), date_columns) for chunk in reader)
+    return parse_dates(coerce_numeric(reader, dtypes), date_columns)
+
+def read_summary_csv(file_path, **kwargs):
+    """Lee el archivo de resumen original con sus tipos."""
+    return read_csv_typed(file_path, SUMMARY_DTYPES, SUMMARY_DATE_COLUMNS, **kwargs)
@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+Resúmenes (sketches) de columnas que se calculan en una sola pasada por bloques y se pueden
+combinar entre bloques: conteos y momentos (suma, media, desviación, mínimo y máximo),
+cuantiles aproximados (t-digest), valores más frecuentes y conteo aproximado de valores
+distintos (HyperLogLog). Con ellos el EDA no necesita el dataset completo en memoria ni
+recorrer cada columna una vez por estadística.
+Los resúmenes se guardan por archivo de origen y se combinan al consultarlos: al agregar un
+archivo de período solo se recorre su partición. Se guardan como .npz (sin pickle): los
+arreglos de cada sketch (centroides, registros) y su estado como JSON.
+"""
+
+import copy
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.data_store import COMBINED_DATASET, EDA_SKETCHES, iter_partition, partition_name, partition_path
+
+# Centroides del t-digest: más compresión, cuantiles más precisos
+TDIGEST_COMPRESSION = 400
+# Registros del HyperLogLog: 2**14 registros, error típico ~0.8%
+HLL_PRECISION = 14
+# Valores que conserva el conteo de frecuentes; con menos valores distintos el conteo es exacto
+FREQUENT_ITEMS_CAPACITY = 10_000
+# Valores distintos hasta los que una columna numérica guarda sus conteos (cuantiles exactos)
+EXACT_VALUES_LIMIT = 1_000
+
+# Columnas numéricas con conteo de frecuencias y de distintos (identificadores)
+FREQUENCY_COLUMNS = ['paciente']
+
+# Cambiar si cambia el contenido de los resúmenes: invalida los guardados por archivo
+SKETCHES_VERSION = '2'
+
+class ArrayStore:
+    """Arreglos de un resumen guardado, referidos desde su estado JSON por nombre."""
+    
+    def __init__(self, arrays=None):
+        self.arrays = {} if arrays is None else arrays
+    
+    def add(self, array):
+        name = f"a{len(self.arrays)}"
+        self.arrays[name] = array
+        return name
+    
+    def get(self, name):
+        return self.arrays[name]
+
+class Moments:
+    """Conteo, suma, media, varianza (fórmula de Chan, estable al combinar), mínimo y máximo."""
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+    
+    def update(self, values):
+        """Agrega un arreglo float64 sin nulos."""
+        if len(values) == 0:
+            return
+        other = Moments()
+        other.count = len(values)
+        other.total = float(values.sum())
+        other.mean = other.total / other.count
+        other.m2 = float(((values - other.mean) ** 2).sum())
+        other.min = float(values.min())
+        other.max = float(values.max())
+        self.merge(other)
+    
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+    
+    def std(self):
+        """Desviación estándar muestral (ddof=1, como pandas)."""
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+    
+    def state(self, arrays):
+        return dict(self.__dict__)
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        moments = cls()
+        moments.__dict__.update(state)
+        return moments
+
+class TDigest:
+    """
+    t-digest de fusión: los valores se agrupan en centroides (media, peso) más finos en las
+    colas. Cada bloque se ordena junto con los centroides actuales y se comprime, todo vectorizado.
+    """
+    
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.nan
+        self.max = np.nan
+    
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        total = weights.sum()
+        # Escala k1: cada centroide abarca como mucho una unidad de k
+        q = (np.cumsum(weights) - weights / 2) / total
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+        buckets = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+    
+    def update(self, values):
+        """Agrega un arreglo float64 sin nulos."""
+        if len(values) == 0:
+            return
+        self.min = np.nanmin([self.min, values.min()])
+        self.max = np.nanmax([self.max, values.max()])
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, np.ones(len(values))]))
+    
+    def merge(self, other):
+        if len(other.means) == 0:
+            return
+        self.min = np.nanmin([self.min, other.min])
+        self.max = np.nanmax([self.max, other.max])
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+    
+    def quantile(self, q):
+        """Cuantil aproximado, interpolando entre los centros de los centroides."""
+        if len(self.means) == 0:
+            return np.nan
+        total = self.weights.sum()
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(q * total, np.r_[0.0, centers, total], np.r_[self.min, self.means, self.max]))
+    
+    def state(self, arrays):
+        return {'compression': self.compression, 'min': float(self.min), 'max': float(self.max),
+                'means': arrays.add(self.means), 'weights': arrays.add(self.weights)}
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        digest = cls(state['compression'])
+        digest.min, digest.max = state['min'], state['max']
+        digest.means, digest.weights = arrays.get(state['means']), arrays.get(state['weights'])
+        return digest
+
+def hash_values(values):
+    """Hash de 64 bits de los valores no nulos de una serie (igual para una categoría y su valor)."""
+    return pd.util.hash_pandas_object(values.dropna(), index=False).to_numpy()
+
+class HyperLogLog:
+    """Conteo aproximado de valores distintos a partir de sus hashes."""
+    
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+    
+    def update(self, hashes):
+        """Agrega un arreglo de hashes uint64."""
+        if len(hashes) == 0:
+            return
+        bits = 64 - self.precision
+        index = (hashes >> np.uint64(bits)).astype(np.int64)
+        rest = hashes & np.uint64((1 << bits) - 1)
+        # Posición del primer bit en 1 de los bits restantes (bits + 1 si son todos cero)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (bits - bit_length + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+    
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+    
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            # Conteo lineal para cardinalidades bajas
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+    
+    def state(self, arrays):
+        return {'precision': self.precision, 'registers': arrays.add(self.registers)}
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        hll = cls(state['precision'])
+        hll.registers = arrays.get(state['registers']).copy()
+        return hll
+
+class FrequentItems:
+    """
+    Conteos por valor. Mientras haya a lo sumo capacity * 2 valores distintos son exactos; al
+    superarlo se descartan los menos frecuentes y error acota cuánto puede faltarle a cada conteo.
+    A igual conteo, los valores quedan en orden de primera aparición.
+    """
+    
+    def __init__(self, capacity=FREQUENT_ITEMS_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.error = 0
+        self.pruned = False
+    
+    def update(self, values):
+        """Agrega los valores no nulos de una serie."""
+        counts = values.value_counts(sort=False, dropna=True)
+        self._add(zip(counts.index.tolist(), counts.to_numpy().tolist()))
+    
+    def merge(self, other):
+        self._add(other.counts.items())
+        self.error += other.error
+        self.pruned = self.pruned or other.pruned
+    
+    def _add(self, items):
+        for value, count in items:
+            if count > 0:
+                self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > 2 * self.capacity:
+            ranked = self.most_common()
+            self.error += ranked[self.capacity][1]
+            kept = {value for value, _ in ranked[:self.capacity]}
+            self.counts = {value: count for value, count in self.counts.items() if value in kept}
+            self.pruned = True
+    
+    def most_common(self, n=None):
+        """Valores con sus conteos, de mayor a menor."""
+        ranked = sorted(self.counts.items(), key=lambda item: -item[1])
+        return ranked if n is None else ranked[:n]
+    
+    def state(self, arrays):
+        # Valores y conteos como listas: las claves de un objeto JSON serían siempre texto
+        return {'capacity': self.capacity, 'error': self.error, 'pruned': self.pruned,
+                'values': list(self.counts), 'counts': list(self.counts.values())}
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        frequent = cls(state['capacity'])
+        frequent.counts = dict(zip(state['values'], state['counts']))
+        frequent.error, frequent.pruned = state['error'], state['pruned']
+        return frequent
+
+class CategoricalSketch:
+    """Valores frecuentes y distintos de una columna."""
+    
+    def __init__(self):
+        self.frequent = FrequentItems()
+        self.distinct = HyperLogLog()
+    
+    def update(self, values):
+        self.frequent.update(values)
+        self.distinct.update(hash_values(values))
+    
+    def merge(self, other):
+        self.frequent.merge(other.frequent)
+        self.distinct.merge(other.distinct)
+    
+    @property
+    def exact(self):
+        return not self.frequent.pruned
+    
+    def nunique(self):
+        """Valores distintos: exacto si no se descartaron valores, si no la estimación HyperLogLog."""
+        return len(self.frequent.counts) if self.exact else self.distinct.estimate()
+    
+    def state(self, arrays):
+        return {'frequent': self.frequent.state(arrays), 'distinct': self.distinct.state(arrays)}
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        sketch = cls()
+        sketch.frequent = FrequentItems.from_state(state['frequent'], arrays)
+        sketch.distinct = HyperLogLog.from_state(state['distinct'], arrays)
+        return sketch
+
+class NumericSketch:
+    """
+    Momentos y cuantiles de una columna numérica. Mientras la columna tenga pocos valores
+    distintos (EXACT_VALUES_LIMIT) se guardan sus conteos y los cuantiles son exactos.
+    """
+    
+    def __init__(self):
+        self.moments = Moments()
+        self.digest = TDigest()
+        self.values = {}
+    
+    def update(self, values):
+        values = values.to_numpy(dtype='float64', na_value=np.nan)
+        values = values[~np.isnan(values)]
+        self.moments.update(values)
+        self.digest.update(values)
+        if self.values is not None:
+            unique, counts = np.unique(values, return_counts=True)
+            if len(unique) > EXACT_VALUES_LIMIT:
+                self.values = None
+            else:
+                self._add_values(zip(unique.tolist(), counts.tolist()))
+    
+    def merge(self, other):
+        self.moments.merge(other.moments)
+        self.digest.merge(other.digest)
+        if self.values is not None and other.values is not None:
+            self._add_values(other.values.items())
+        else:
+            self.values = None
+    
+    def _add_values(self, items):
+        for value, count in items:
+            self.values[value] = self.values.get(value, 0) + count
+        if len(self.values) > EXACT_VALUES_LIMIT:
+            self.values = None
+    
+    @property
+    def exact(self):
+        return self.values is not None
+    
+    def quantile(self, q):
+        """Cuantil con interpolación lineal como pandas: exacto con pocos valores distintos, si no del t-digest."""
+        if not self.exact:
+            return self.digest.quantile(q)
+        if not self.values:
+            return np.nan
+        values = np.array(sorted(self.values))
+        ends = np.cumsum([self.values[value] for value in values])
+        position = q * (ends[-1] - 1)
+        low, high = values[np.searchsorted(ends, [np.floor(position), np.ceil(position)], side='right')]
+        return float(low + (high - low) * (position - np.floor(position)))
+    
+    def describe(self):
+        """Las mismas filas que DataFrame.describe() para la columna."""
+        moments = self.moments
+        mean = moments.total / moments.count if moments.count else np.nan
+        return pd.Series({
+            'count': float(moments.count), 'mean': mean, 'std': moments.std(), 'min': moments.min,
+            '25%': self.quantile(0.25), '50%': self.quantile(0.5), '75%': self.quantile(0.75), 'max': moments.max
+        })
+    
+    def state(self, arrays):
+        return {'moments': self.moments.state(arrays), 'digest': self.digest.state(arrays),
+                'values': None if self.values is None else [list(self.values), list(self.values.values())]}
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        sketch = cls()
+        sketch.moments = Moments.from_state(state['moments'], arrays)
+        sketch.digest = TDigest.from_state(state['digest'], arrays)
+        sketch.values = None if state['values'] is None else dict(zip(*state['values']))
+        return sketch
+
+class DateSketch:
+    """Rango y registros por año de una columna de fechas."""
+    
+    def __init__(self):
+        self.min = pd.NaT
+        self.max = pd.NaT
+        self.years = FrequentItems()
+    
+    def update(self, values):
+        if values.notna().any():
+            self.min = min(self.min, values.min()) if pd.notna(self.min) else values.min()
+            self.max = max(self.max, values.max()) if pd.notna(self.max) else values.max()
+        self.years.update(values.dt.year)
+    
+    def merge(self, other):
+        if pd.notna(other.min):
+            self.min = min(self.min, other.min) if pd.notna(self.min) else other.min
+            self.max = max(self.max, other.max) if pd.notna(self.max) else other.max
+        self.years.merge(other.years)
+    
+    def state(self, arrays):
+        return {'min': None if pd.isna(self.min) else self.min.isoformat(),
+                'max': None if pd.isna(self.max) else self.max.isoformat(),
+                'years': self.years.state(arrays)}
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        sketch = cls()
+        sketch.min = pd.NaT if state['min'] is None else pd.Timestamp(state['min'])
+        sketch.max = pd.NaT if state['max'] is None else pd.Timestamp(state['max'])
+        sketch.years = FrequentItems.from_state(state['years'], arrays)
+        return sketch
+
+class DatasetSketch:
+    """
+    Resumen de un dataset acumulado bloque a bloque: filas, tipos, memoria, nulos por columna
+    y el sketch de cada columna según su tipo. Dos resúmenes del mismo esquema se combinan con merge.
+    """
+    
+    def __init__(self, frequency_columns=FREQUENCY_COLUMNS):
+        self.frequency_columns = list(frequency_columns)
+        self.rows = 0
+        # Memoria por columna (y del índice, 'Index'), como DataFrame.memory_usage(deep=True)
+        self.memory = {}
+        self.dtypes = {}
+        self.nulls = {}
+        self.numeric = {}
+        self.categorical = {}
+        self.dates = {}
+    
+    def _sketches(self, col, dtype):
+        if pd.api.types.is_datetime64_any_dtype(dtype):
+            return [(self.dates, DateSketch)]
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            sketches = [(self.numeric, NumericSketch)]
+            if col in self.frequency_columns:
+                sketches.append((self.categorical, CategoricalSketch))
+            return sketches
+        return [(self.categorical, CategoricalSketch)]
+    
+    def update(self, chunk):
+        """Agrega un bloque de filas."""
+        if not self.dtypes:
+            self.dtypes = {col: str(dtype) for col, dtype in chunk.dtypes.items()}
+        self.rows += len(chunk)
+        for col, memory in chunk.memory_usage(deep=True).items():
+            self.memory[col] = self.memory.get(col, 0) + int(memory)
+        for col, dtype in chunk.dtypes.items():
+            self.nulls[col] = self.nulls.get(col, 0) + int(chunk[col].isna().sum())
+            for sketches, sketch_class in self._sketches(col, dtype):
+                sketches.setdefault(col, sketch_class()).update(chunk[col])
+    
+    def merge(self, other):
+        """Combina el resumen de otra parte del mismo dataset."""
+        if not self.dtypes:
+            self.dtypes = dict(other.dtypes)
+        self.rows += other.rows
+        for col, memory in other.memory.items():
+            self.memory[col] = self.memory.get(col, 0) + memory
+        for col, nulls in other.nulls.items():
+            self.nulls[col] = self.nulls.get(col, 0) + nulls
+        for mine, theirs in ((self.numeric, other.numeric), (self.categorical, other.categorical),
+                             (self.dates, other.dates)):
+            for col, sketch in theirs.items():
+                if col in mine:
+                    mine[col].merge(sketch)
+                else:
+                    mine[col] = copy.deepcopy(sketch)
+        return self
+    
+    @property
+    def memory_bytes(self):
+        return sum(self.memory.values())
+    
+    def without(self, columns):
+        """Copia del resumen sin esas columnas."""
+        sketch = copy.deepcopy(self)
+        for col in columns:
+            for values in (sketch.dtypes, sketch.memory, sketch.nulls, sketch.numeric, sketch.categorical,
+                           sketch.dates):
+                values.pop(col, None)
+        return sketch
+    
+    def state(self, arrays):
+        """Estado serializable como JSON; los arreglos de los sketches quedan en arrays."""
+        return {
+            'frequency_columns': self.frequency_columns, 'rows': self.rows, 'memory': self.memory,
+            'dtypes': self.dtypes, 'nulls': self.nulls,
+            'numeric': {col: sketch.state(arrays) for col, sketch in self.numeric.items()},
+            'categorical': {col: sketch.state(arrays) for col, sketch in self.categorical.items()},
+            'dates': {col: sketch.state(arrays) for col, sketch in self.dates.items()}
+        }
+    
+    @classmethod
+    def from_state(cls, state, arrays):
+        sketch = cls(state['frequency_columns'])
+        sketch.rows = state['rows']
+        sketch.memory, sketch.dtypes, sketch.nulls = state['memory'], state['dtypes'], state['nulls']
+        for name, sketch_class in (('numeric', NumericSketch), ('categorical', CategoricalSketch),
+                                   ('dates', DateSketch)):
+            setattr(sketch, name, {col: sketch_class.from_state(column_state, arrays)
+                                   for col, column_state in state[name].items()})
+        return sketch
+
+def merge_sketches(sketches):
+    """Resumen de la unión de varias partes (los resúmenes originales no cambian)."""
+    merged = DatasetSketch()
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+def write_sketch(sketch, sketch_file, metadata):
+    """
+    Guarda un resumen con sus metadatos en un .npz: los arreglos de los sketches y el estado
+    en JSON (escritura atómica).
+    """
+    sketch_file = Path(sketch_file)
+    sketch_file.parent.mkdir(parents=True, exist_ok=True)
+    arrays = ArrayStore()
+    state = json.dumps({'metadata': metadata, 'sketch': sketch.state(arrays)}, ensure_ascii=False)
+    tmp_file = sketch_file.with_name(f".{sketch_file.name}.tmp")
+    with open(tmp_file, 'wb') as f:
+        np.savez(f, state=np.array(state), **arrays.arrays)
+    os.replace(tmp_file, sketch_file)
+
+def read_sketch(sketch_file):
+    """Lee un resumen guardado; devuelve (metadatos, resumen). No ejecuta código (sin pickle)."""
+    with np.load(sketch_file, allow_pickle=False) as stored:
+        arrays = ArrayStore({name: stored[name] for name in stored.files if name != 'state'})
+        state = json.loads(str(stored['state']))
+    return state['metadata'], DatasetSketch.from_state(state['sketch'], arrays)
+
+def _sketch_path(filename, sketches_path=EDA_SKETCHES):
+    return sketches_path / f"{partition_name(filename)}.npz"
+
+def update_partition_sketches(manifest, dataset_path=COMBINED_DATASET, sketches_path=EDA_SKETCHES,
+                              chunksize=250_000):
+    """
+    Actualiza los resúmenes del EDA por archivo de origen según el manifiesto de ingesta: solo
+    se recorren las particiones cuyo hash no coincide con el del resumen guardado. Devuelve
+    {archivo: resumen} en el orden de las particiones y los archivos que se volvieron a recorrer.
+    Los archivos sin partición Parquet no se incluyen.
+    """
+    sketches = {}
+    refreshed = []
+    for filename in sorted(manifest, key=partition_name):
+        if not any(partition_path(dataset_path, filename).glob('*.parquet')):
+            continue
+        sha256 = manifest[filename].get('sha256')
+        sketch_file = _sketch_path(filename, sketches_path)
+        if sketch_file.exists():
+            metadata, sketch = read_sketch(sketch_file)
+            if (metadata.get('sha256'), metadata.get('version')) == (sha256, SKETCHES_VERSION):
+                sketches[filename] = sketch
+                continue
+        sketch = DatasetSketch()
+        for chunk in iter_partition(dataset_path, filename, chunksize=chunksize):
+            sketch.update(chunk)
+        write_sketch(sketch, sketch_file, {'archivo': filename, 'sha256': sha256, 'version': SKETCHES_VERSION})
+        sketches[filename] = sketch
+        refreshed.append(filename)
+    
+    # Resúmenes de archivos que ya no forman parte del dataset (y los de versiones anteriores)
+    current = {_sketch_path(filename, sketches_path).name for filename in manifest}
+    if sketches_path.exists():
+        for sketch_file in sketches_path.glob('*.*'):
+            if not sketch_file.name.startswith('.') and sketch_file.name not in current:
+                sketch_file.unlink()
+    
+    return sketches, refreshed
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Estadísticas de la estandarización de expedientes.
+Agrupa una sola vez las filas por (paciente, expediente antes, expediente después) y deriva de
+esos conteos todas las métricas de los reportes. Los conteos se pueden acumular bloque a bloque.
+"""
+
+import pandas as pd
+
+PATIENT = 'paciente'
+BEFORE = 'expediente_antes'
+AFTER = 'expediente_despues'
+ROWS = 'filas'
+
+# Cantidad de ejemplos de cambios que se conservan para los reportes
+CHANGE_EXAMPLES = 10
+
+class StandardizationStats:
+    """Conteos por (paciente, expediente antes, expediente después), combinables entre bloques."""
+    
+    def __init__(self):
+        self.groups = None
+        self.rows = 0
+        self.changed_examples = []
+    
+    def update(self, patients, before, after):
+        """Agrega un bloque de filas (series alineadas de paciente, expediente original y estandarizado)."""
+        # sort=False conserva el orden de primera aparición, que usan los ejemplos de los reportes
+        counts = before.groupby([patients, before, after], dropna=False, sort=False).size()
+        counts.index.names = [PATIENT, BEFORE, AFTER]
+        groups = counts.rename(ROWS).reset_index()
+        if self.groups is not None:
+            groups = pd.concat([self.groups, groups], ignore_index=True)
+            groups = groups.groupby([PATIENT, BEFORE, AFTER], dropna=False, sort=False)[ROWS].sum().reset_index()
+        self.groups = groups
+        self.rows += len(before)
+        
+        missing = CHANGE_EXAMPLES - len(self.changed_examples)
+        if missing > 0:
+            changed = (before != after).fillna(False).to_numpy(dtype=bool)
+            self.changed_examples += list(zip(before[changed].head(missing), after[changed].head(missing)))
+    
+    def _changed(self):
+        return (self.groups[BEFORE] != self.groups[AFTER]).fillna(False).to_numpy(dtype=bool)
+    
+    def _starts_with_000(self):
+        return self.groups[BEFORE].str.startswith('000', na=False).to_numpy(dtype=bool)
+    
+    def _combinations(self, column):
+        # Igual que groupby(['paciente', column]).size(): excluye las filas con nulos
+        pairs = self.groups[[PATIENT, column]].dropna()
+        return len(pairs.drop_duplicates())
+    
+    def patients_with_multiple_expedients(self):
+        """Número de expedientes estandarizados de cada paciente que tiene más de uno, ordenado por paciente."""
+        counts = self.groups.dropna(subset=[PATIENT]).groupby(PATIENT)[AFTER].nunique()
+        return counts[counts > 1]
+    
+    def patient_expedients(self, patient):
+        """Expedientes estandarizados del paciente en orden de aparición."""
+        return list(self.groups.loc[self.groups[PATIENT] == patient, AFTER].unique())
+    
+    def summary(self):
+        """Métricas de los reportes de estandarización."""
+        groups = self.groups
+        with_000 = self._starts_with_000()
+        return {
+            'registros': self.rows,
+            'expedientes_antes': groups[BEFORE].nunique(),
+            'expedientes_despues': groups[AFTER].nunique(),
+            'pacientes': groups[PATIENT].nunique(),
+            'combinaciones_antes': self._combinations(BEFORE),
+            'combinaciones_despues': self._combinations(AFTER),
+            'filas_con_000': int(groups.loc[with_000, ROWS].sum()),
+            'filas_sin_000': int(groups.loc[~with_000, ROWS].sum()),
+            'ejemplos_con_000': groups.loc[with_000, BEFORE].unique()[:10],
+            'ejemplos_sin_000': groups.loc[~with_000, BEFORE].unique()[:10],
+            'cambios': int(groups.loc[self._changed(), ROWS].sum()),
+            'ejemplos_cambios': self.changed_examples
+        }
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Caché de pasos del pipeline direccionada por contenido.
+La clave de un paso combina el hash de sus entradas, el del código del script (y de los
+módulos de utils que importa) y sus parámetros. Si la clave ya está en la caché, los
+artefactos de salida se restauran desde ella en lugar de volver a ejecutar el paso; así una
+nueva ejecución solo recalcula la parte del grafo cuyas entradas o código cambiaron.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from utils.data_store import STEP_CACHE, file_sha256
+
+SCRIPTS_PATH = Path(__file__).resolve().parent.parent
+UTILS_IMPORT = re.compile(r'^from utils\.(\w+) import', re.MULTILINE)
+
+# Entradas de caché que se conservan por paso (las más recientes)
+ENTRIES_PER_STEP = 3
+# Para pasos que generan archivos Parquet solo la última: las anteriores retienen versiones
+# completas de los datasets
+DATASET_ENTRIES_PER_STEP = 1
+
+# Archivos que se enlazan (hardlink) en lugar de copiarse: data_store los escribe siempre en un
+# archivo nuevo que reemplaza al anterior, así que reescribir la salida no altera la caché
+LINKED_SUFFIXES = ('.parquet',)
+
+def _link_or_copy(source, target):
+    """Enlaza los archivos de datasets (sin ocupar espacio extra) y copia el resto con sus fechas."""
+    if Path(source).suffix in LINKED_SUFFIXES:
+        try:
+            os.link(source, target)
+            return target
+        except OSError:
+            # Otro sistema de archivos o sin soporte de hardlinks
+            pass
+    return shutil.copy2(source, target)
+
+def _files(path):
+    """
+    Archivos de un artefacto como (nombre relativo, ruta): el archivo mismo, los de su
+    directorio (sin temporales ocultos) o los que coinciden con un patrón como "data/raw/*.csv".
+    """
+    path = Path(path)
+    if any(char in path.name for char in '*?['):
+        return [(f.name, f) for f in sorted(path.parent.glob(path.name)) if f.is_file()]
+    if path.is_file():
+        return [('', path)]
+    if not path.is_dir():
+        return []
+    return [(str(f.relative_to(path)), f) for f in sorted(path.rglob('*')) if f.is_file() and
+            not any(part.startswith('.') for part in f.relative_to(path).parts)]
+
+def fingerprint(path):
+    """Tamaño y fecha de modificación de los archivos de un artefacto: cambia si se reescribe."""
+    return [[name, f.stat().st_size, f.stat().st_mtime_ns] for name, f in _files(path)]
+
+def source_files(script_path):
+    """El script del paso y los módulos de utils que importa, directa o indirectamente."""
+    pending = [SCRIPTS_PATH / Path(script_path).relative_to('scripts')]
+    found = []
+    while pending:
+        source = pending.pop()
+        if source in found or not source.exists():
+            continue
+        found.append(source)
+        for module in UTILS_IMPORT.findall(source.read_text(encoding='utf-8')):
+            pending.append(SCRIPTS_PATH / 'utils' / f"{module}.py")
+    return sorted(found)
+
+class StepCache:
+    """
+    Guarda y restaura los artefactos de salida de cada paso bajo su clave.
+    Los hashes de archivos se recuerdan por (ruta, tamaño, fecha de modificación), de modo
+    que un artefacto sin cambios no se vuelve a leer completo en cada ejecución.
+    """
+    
+    def __init__(self, cache_path=STEP_CACHE):
+        self.cache_path = Path(cache_path)
+        self.hashes_file = self.cache_path / "hashes.json"
+        self.hashes = {}
+        if self.hashes_file.exists():
+            with open(self.hashes_file, 'r', encoding='utf-8') as f:
+                self.hashes = json.load(f)
+    
+    def _file_hash(self, file_path):
+        stat = file_path.stat()
+        memo_key = f"{file_path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}"
+        if memo_key not in self.hashes:
+            self.hashes[memo_key] = file_sha256(file_path)
+        return self.hashes[memo_key]
+    
+    def artifact_hash(self, path):
+        """Hash del contenido de un archivo, de los archivos de un directorio o de los de un patrón."""
+        digest = hashlib.sha256()
+        for name, f in _files(path):
+            digest.update(f"{name}\0{self._file_hash(f)}\n".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def key(self, step):
+        """Clave del paso: hash de entradas, código y parámetros."""
+        content = {
+            'paso': step["script"],
+            'funcion': step["function"],
+            'parametros': step.get("params", {}),
+            'codigo': {str(f.relative_to(SCRIPTS_PATH)): self._file_hash(f) for f in source_files(step["script"])},
+            'entradas': {str(path): self.artifact_hash(path) for path in step.get("inputs", [])}
+        }
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    
+    def _entry_path(self, key):
+        return self.cache_path / key
+    
+    def restore(self, step, key):
+        """
+        Restaura las salidas del paso si la clave está en la caché. Las salidas que ya
+        coinciden con las guardadas (mismos archivos, tamaños y fechas) no se copian.
+        """
+        entry = self._entry_path(key)
+        metadata_file = entry / "metadata.json"
+        if not metadata_file.exists():
+            return False
+        with open(metadata_file, 'r', encoding='utf-8') as f:
+            metadata = json.load(f)
+        
+        for i, output in enumerate(step.get("outputs", [])):
+            stored = metadata['salidas'].get(str(output))
+            if stored is None:
+                continue
+            if fingerprint(output) == stored:
+                continue
+            output = Path(output)
+            if output.is_dir():
+                shutil.rmtree(output)
+            elif output.exists():
+                output.unlink()
+            source = entry / str(i)
+            output.parent.mkdir(parents=True, exist_ok=True)
+            if source.is_dir():
+                shutil.copytree(source, output, copy_function=_link_or_copy)
+            else:
+                _link_or_copy(source, output)
+        return True
+    
+    def store(self, step, key):
+        """Guarda las salidas del paso bajo su clave (los archivos Parquet como hardlinks)."""
+        entry = self._entry_path(key)
+        tmp_entry = entry.with_name(f".{entry.name}.tmp")
+        if tmp_entry.exists():
+            shutil.rmtree(tmp_entry)
+        tmp_entry.mkdir(parents=True)
+        
+        outputs = {}
+        for i, output in enumerate(step.get("outputs", [])):
+            output = Path(output)
+            if output.is_dir():
+                shutil.copytree(output, tmp_entry / str(i),
+                                ignore=shutil.ignore_patterns('.*'), copy_function=_link_or_copy)
+            elif output.exists():
+                _link_or_copy(output, tmp_entry / str(i))
+            else:
+                continue
+            # Enlaces y copy2 conservan las fechas: al restaurar, la huella de la salida vuelve a ser esta
+            outputs[str(output)] = fingerprint(output)
+        
+        metadata = {'paso': step["name"], 'creado': datetime.now().isoformat(), 'salidas': outputs}
+        with open(tmp_entry / "metadata.json", 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        if entry.exists():
+            shutil.rmtree(entry)
+        os.replace(tmp_entry, entry)
+        has_datasets = any(Path(name or output).suffix in LINKED_SUFFIXES
+                           for output in step.get("outputs", []) for name, _ in _files(output))
+        self._prune(step["name"], DATASET_ENTRIES_PER_STEP if has_datasets else ENTRIES_PER_STEP)
+    
+    def _prune(self, step_name, keep=ENTRIES_PER_STEP):
+        """Descarta las entradas más antiguas del paso, dejando las keep más recientes."""
+        entries = []
+        for metadata_file in self.cache_path.glob('*/metadata.json'):
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if metadata.get('paso') == step_name:
+                entries.append((metadata.get('creado', ''), metadata_file.parent))
+        for _, entry in sorted(entries, reverse=True)[keep:]:
+            shutil.rmtree(entry, ignore_errors=True)
+    
+    def save_hashes(self):
+        """
+        Guarda los hashes calculados para reutilizarlos en la siguiente ejecución
+        (solo los de archivos que siguen existiendo sin cambios).
+        """
+        current = {}
+        for memo_key, sha256 in self.hashes.items():
+            path, size, mtime_ns = memo_key.rsplit('|', 2)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if (stat.st_size, stat.st_mtime_ns) == (int(size), int(mtime_ns)):
+                current[memo_key] = sha256
+        self.hashes = current
+        
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.hashes_file.with_name(f".{self.hashes_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.hashes, f)
+        os.replace(tmp_file, self.hashes_file)
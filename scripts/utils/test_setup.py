@@ -15,6 +15,7 @@ def test_dependencies():
     required_packages = [
         'pandas',
         'numpy',
+        'pyarrow',
         'matplotlib',
         'seaborn'
     ]
@@ -98,8 +99,8 @@ def test_data_files():
     
     # Verificar archivos procesados (opcionales, se generan durante el análisis)
     processed_files = [
-        'data/processed/resultados_pacientes_combinados.csv',
-        'data/processed/resultados_pacientes_estandarizados.csv'
+        'data/processed/resultados_pacientes_combinados',
+        'data/processed/resultados_pacientes_estandarizados'
     ]
     
     for file_path in processed_files: